@@ -1,25 +1,44 @@
 from functools import lru_cache
-from typing import Generator
+from typing import AsyncGenerator, Generator, List
 
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langgraph.prebuilt import create_react_agent
 
+from checkpoint import aresume_input, checkpointed_run, get_checkpointer, resume_input
 from constants import get_llm
-from tools import search_competitors, scrape_competitor_page, analyse_competitors
-
-_tools = [search_competitors, scrape_competitor_page, analyse_competitors]
+from result_cache import cached_analysis, cached_analysis_stream
+from streaming import custom_event_items
+from tracing import traced_analysis
+from tools import (
+    search_competitors,
+    scrape_competitor_pages,
+    analyse_competitors,
+    asearch_competitors,
+    ascrape_competitor_pages,
+    aanalyse_competitors,
+)
+
+_tools = [search_competitors, scrape_competitor_pages, analyse_competitors]
+# Same tools backed by coroutines and pooled HTTP clients, for ainvoke/astream
+_async_tools = [asearch_competitors, ascrape_competitor_pages, aanalyse_competitors]
 
 # Human-readable labels for each tool call shown in the UI
 _TOOL_LABELS = {
     "search_competitors": "🔎 Searching for competitors...",
-    "scrape_competitor_page": "🌐 Scraping {url}...",
+    "scrape_competitor_pages": "🌐 Scraping {count} pages...",
     "analyse_competitors": "🧠 Analysing competitors...",
 }
+_RESUMING_LABEL = "♻️ Resuming from the last completed step..."
 
 
 @lru_cache(maxsize=1)
 def _get_agent():
-    return create_react_agent(get_llm(), tools=_tools)
+    return create_react_agent(get_llm("planner"), tools=_tools, checkpointer=get_checkpointer())
+
+
+@lru_cache(maxsize=1)
+def _get_async_agent():
+    return create_react_agent(get_llm("planner"), tools=_async_tools, checkpointer=get_checkpointer())
 
 
 def _build_system_prompt(industry: str, product_summary: str) -> str:
@@ -28,67 +47,136 @@ def _build_system_prompt(industry: str, product_summary: str) -> str:
         f"Research competitors for a company in the '{industry}' industry. "
         f"Their product: {product_summary}\n\n"
         f"Steps:\n"
-        f"1. Call search_competitors to get candidate URLs.\n"
-        f"2. For each URL, decide whether it is worth scraping. "
-        f"Prefer official company homepages and pricing pages. "
-        f"Skip Wikipedia, LinkedIn, aggregator sites (G2, Capterra), and news articles. "
-        f"Call scrape_competitor_page once per URL you choose to scrape.\n"
-        f"3. Once you have scraped the pages you judge useful, call analyse_competitors "
-        f"with the industry, product summary, and the collected scrape results.\n\n"
-        f"Return only the JSON output from analyse_competitors."
+        f"1. Call search_competitors to get competitor URLs.\n"
+        f"2. Call scrape_competitor_pages once with all the returned URLs.\n"
+        f"3. Once the pages are scraped, call analyse_competitors "
+        f"with the industry, product summary, and the handles of the scraped pages. "
+        f"The page content stays server-side, so don't copy it into the call.\n"
+        f"4. If a tool call fails, fix its arguments and call it again.\n\n"
+        f"Once analyse_competitors has succeeded, reply with just DONE. "
+        f"Its output goes to the user as is, so don't repeat it."
     )
 
 
-def run_competitor_analysis(industry: str, product_summary: str) -> str:
-    """Run the competitor analysis agent and return the analysis JSON string."""
-    result = _get_agent().invoke({
-        "messages": [HumanMessage(content=_build_system_prompt(industry, product_summary))]
-    })
+def _initial_state(industry: str, product_summary: str) -> dict:
+    return {"messages": [HumanMessage(content=_build_system_prompt(industry, product_summary))]}
+
 
-    for msg in reversed(result["messages"]):
+def _final_content(messages: list) -> str:
+    """The analysis JSON from the last successful analyse_competitors call, else the agent's last reply."""
+    for msg in reversed(messages):
+        if isinstance(msg, ToolMessage) and msg.name == "analyse_competitors" and msg.status != "error":
+            return msg.content
+    for msg in reversed(messages):
         if hasattr(msg, "content") and msg.content:
             return msg.content
-
     return ""
 
 
+def _chunk_items(mode: str, chunk) -> List[tuple[str, str, str]]:
+    """UI items for one streamed chunk; the agent's answer comes back as a ("final", ...) item."""
+    # Completed parts of the analysis, streamed while analyse_competitors is running
+    if mode == "custom":
+        return custom_event_items(chunk)
+
+    messages = chunk.get("messages", [])
+    if not messages:
+        return []
+
+    last = messages[-1]
+    items = []
+
+    # Agent is about to call a tool
+    if isinstance(last, AIMessage) and last.tool_calls:
+        for tc in last.tool_calls:
+            name = tc["name"]
+            args = tc.get("args", {})
+            template = _TOOL_LABELS.get(name, f"⚙️ Calling {name}...")
+            # Inject the page count into the scrape label if available
+            label = template.format(count=len(args.get("urls", [])))
+            detail = ", ".join(f"{k}={v!r}" for k, v in args.items())
+            items.append(("step", label, detail))
+
+    # Tool has returned a result
+    elif isinstance(last, ToolMessage):
+        content_preview = str(last.content)[:120].replace("\n", " ")
+        items.append(("tool_result", f"✅ Got result from {last.name}", content_preview))
+
+    # Final AI message; the answer itself is the analyse_competitors result
+    elif isinstance(last, AIMessage) and last.content and not last.tool_calls:
+        items.append(("final", _final_content(messages), ""))
+
+    return items
+
+
+@cached_analysis
+@traced_analysis
+def run_competitor_analysis(industry: str, product_summary: str) -> str:
+    """Run the competitor analysis agent and return the analysis JSON string.
+
+    If an earlier run with the same inputs failed part-way, it resumes from that
+    run's last completed step instead of searching and scraping again.
+    """
+    agent = _get_agent()
+    with checkpointed_run("agent", industry, product_summary) as config:
+        result = agent.invoke(resume_input(agent, config, _initial_state(industry, product_summary)), config)
+    return _final_content(result["messages"])
+
+
+@cached_analysis
+@traced_analysis
+async def arun_competitor_analysis(industry: str, product_summary: str) -> str:
+    """Async run_competitor_analysis; tool calls share pooled HTTP clients across runs."""
+    agent = _get_async_agent()
+    with checkpointed_run("agent", industry, product_summary) as config:
+        result = await agent.ainvoke(await aresume_input(agent, config, _initial_state(industry, product_summary)), config)
+    return _final_content(result["messages"])
+
+
+@cached_analysis_stream
+@traced_analysis
 def stream_competitor_analysis(industry: str, product_summary: str) -> Generator[tuple[str, str], None, str]:
     """Stream agent steps as (label, detail) tuples, then yield the final JSON.
 
     Yields:
         ("step", "<human-readable description>") for each tool call
-        ("result", "<json string>") as the final item
+        ("competitor", "<name>") / ("strategic", "<field>") as parts of the analysis complete
+        ("result", "<json string>") once the analysis is done
+        ("timings", "<total>", "<per-step timings json>") as the final item
     """
     final_content = ""
+    agent = _get_agent()
+    with checkpointed_run("agent", industry, product_summary) as config:
+        graph_input = resume_input(agent, config, _initial_state(industry, product_summary))
+        if graph_input is None:
+            yield ("step", _RESUMING_LABEL, "")
+
+        for mode, chunk in agent.stream(graph_input, config, stream_mode=["values", "custom"]):
+            for item in _chunk_items(mode, chunk):
+                if item[0] == "final":
+                    final_content = item[1]
+                else:
+                    yield item
+
+    yield ("result", final_content, "")
+
 
-    for chunk in _get_agent().stream(
-        {"messages": [HumanMessage(content=_build_system_prompt(industry, product_summary))]},
-        stream_mode="values",
-    ):
-        messages = chunk.get("messages", [])
-        if not messages:
-            continue
-
-        last = messages[-1]
-
-        # Agent is about to call a tool
-        if isinstance(last, AIMessage) and last.tool_calls:
-            for tc in last.tool_calls:
-                name = tc["name"]
-                args = tc.get("args", {})
-                template = _TOOL_LABELS.get(name, f"⚙️ Calling {name}...")
-                # Inject URL into the scrape label if available
-                label = template.format(url=args.get("url", "")) if "{url}" in template else template
-                detail = ", ".join(f"{k}={v!r}" for k, v in args.items() if k != "competitor_data")
-                yield ("step", label, detail)
-
-        # Tool has returned a result
-        elif isinstance(last, ToolMessage):
-            content_preview = str(last.content)[:120].replace("\n", " ")
-            yield ("tool_result", f"✅ Got result from {last.name}", content_preview)
-
-        # Final AI message with the JSON answer
-        elif isinstance(last, AIMessage) and last.content and not last.tool_calls:
-            final_content = last.content
+@cached_analysis_stream
+@traced_analysis
+async def astream_competitor_analysis(industry: str, product_summary: str) -> AsyncGenerator[tuple[str, str], None]:
+    """Async stream_competitor_analysis, yielding the same items."""
+    final_content = ""
+    agent = _get_async_agent()
+    with checkpointed_run("agent", industry, product_summary) as config:
+        graph_input = await aresume_input(agent, config, _initial_state(industry, product_summary))
+        if graph_input is None:
+            yield ("step", _RESUMING_LABEL, "")
+
+        async for mode, chunk in agent.astream(graph_input, config, stream_mode=["values", "custom"]):
+            for item in _chunk_items(mode, chunk):
+                if item[0] == "final":
+                    final_content = item[1]
+                else:
+                    yield item
 
     yield ("result", final_content, "")
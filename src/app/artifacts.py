@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PATH = os.getenv("ARTIFACT_PATH", ".cache/artifacts.sqlite3")
+# Seconds an artifact is kept; at least CHECKPOINT_TTL, so a resumed run can still resolve its handles
+ARTIFACT_TTL = int(os.getenv("ARTIFACT_TTL", str(24 * 60 * 60)))
+# Characters of each page shown to the agent in place of its content
+ARTIFACT_PREVIEW_CHARS = int(os.getenv("ARTIFACT_PREVIEW_CHARS", "160"))
+# How often writes also drop expired artifacts, so a long-running process keeps applying ARTIFACT_TTL
+_PURGE_INTERVAL_SECONDS = 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    handle TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _title(content: str) -> str:
+    for line in content.splitlines():
+        line = line.strip().lstrip("#").strip()
+        if line:
+            return line[:80]
+    return ""
+
+
+def page_summary(handle: str, page: Dict) -> Dict:
+    """What the agent sees of a stored page: its handle, title, size, kinds of section found and a short preview."""
+    content = page.get("content", "")
+    return {
+        "url": page["url"],
+        "handle": handle,
+        "title": page.get("title") or _title(content),
+        "chars": len(content),
+        "sections": page.get("sections", []),
+        "preview": " ".join(content.split())[:ARTIFACT_PREVIEW_CHARS],
+    }
+
+
+class ArtifactStore:
+    """Side channel for tool outputs too large to pass through the agent's transcript.
+
+    Values are stored zstd-compressed under a content-addressed handle such as
+    ``scrape:3f2a9c...``. Tools return the handle and a short summary, and the
+    tool that needs the full value resolves the handles itself, so the content
+    is never resent to the LLM or re-emitted in its tool-call arguments.
+    """
+
+    def __init__(self, path: str, ttl: int = ARTIFACT_TTL):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._purge_expired()
+
+    def put(self, kind: str, value: Dict) -> str:
+        serialized = json.dumps(value, sort_keys=True, ensure_ascii=False).encode()
+        handle = f"{kind}:{hashlib.sha256(serialized).hexdigest()[:16]}"
+        body = zstandard.ZstdCompressor().compress(serialized)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", (handle, body, time.time()))
+            self._conn.commit()
+        if time.monotonic() - self._purged_at >= _PURGE_INTERVAL_SECONDS:
+            self._purge_expired()
+        return handle
+
+    def get(self, handle: str) -> Dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM artifacts WHERE handle = ? AND created_at >= ?",
+                (handle.strip(), time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(zstandard.ZstdDecompressor().decompress(row[0])) if row else None
+
+    def resolve(self, handles: List[str]) -> List[Dict]:
+        """Values for the given handles in order, skipping duplicates and unknown or expired handles.
+
+        Raises:
+            KeyError: If none of the handles resolve
+        """
+        values, missing = [], []
+        for handle in dict.fromkeys(handles):
+            value = self.get(handle)
+            if value is None:
+                missing.append(handle)
+            else:
+                values.append(value)
+        if missing:
+            logger.warning(f"Unknown or expired artifact handles: {missing}")
+        if handles and not values:
+            raise KeyError(f"Unknown or expired artifact handles: {', '.join(missing)}")
+        return values
+
+    def _purge_expired(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM artifacts WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+            self._purged_at = time.monotonic()
+
+
+@lru_cache(maxsize=1)
+def get_artifact_store() -> ArtifactStore:
+    # Handles must always resolve, so an empty path keeps artifacts in memory rather than disabling the store
+    return ArtifactStore(ARTIFACT_PATH or ":memory:")
@@ -0,0 +1,198 @@
+"""Headless batch runner for many (industry, product_summary) pairs.
+
+Usage:
+    python src/app/batch.py inputs.jsonl --output results.jsonl --concurrency 8 --pdf-dir reports/
+
+Inputs are JSONL or CSV rows with 'industry' and 'product_summary' (and an
+optional 'id'). Results are appended to the output JSONL as they finish; rows
+already recorded there as successful are skipped, so a crashed run resumes
+where it stopped.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List
+
+from dotenv import load_dotenv
+load_dotenv()
+from cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class _Pacer:
+    """Spaces out analysis starts so no provider's requests-per-minute limit is exceeded."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = max(self._next_start, time.monotonic()) + self.interval
+
+
+def _row_id(row: Dict) -> str:
+    if row.get("id"):
+        return str(row["id"])
+    key = normalize_query(row["industry"], row["product_summary"])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _read_inputs(path: str) -> List[Dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [{**row, "id": _row_id(row)} for row in rows if row.get("industry") and row.get("product_summary")]
+
+
+def _completed_ids(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial last line from a crash
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _start_interval(
+    mode: str, analysis_mode: str, search_queries: int, search_results: int, rpm: Dict[str, float]
+) -> float:
+    """Seconds between analysis starts, from estimated calls per analysis for each provider."""
+    llm_calls = 1 if mode == "pipeline" else 4
+    if analysis_mode == "map_reduce":
+        llm_calls += search_results
+    # Each analysis fans out into up to SEARCH_QUERIES Tavily searches
+    calls = {"groq": llm_calls, "tavily": max(1, search_queries), "firecrawl": search_results}
+    return max((60 * calls[provider] / limit for provider, limit in rpm.items() if limit), default=0.0)
+
+
+def _render_pdf(analysis_json: str, industry: str, product_summary: str, path: str) -> str:
+    # Runs in a worker process
+    from pdf import write_pdf_report
+
+    write_pdf_report(analysis_json, industry, product_summary, path)
+    return path
+
+
+async def run_batch(
+    rows: Iterable[Dict],
+    output_path: str,
+    mode: str = "pipeline",
+    concurrency: int = 4,
+    start_interval: float = 0.0,
+    pdf_dir: str | None = None,
+    pdf_workers: int = 2,
+) -> Dict[str, int]:
+    """Analyse rows with bounded concurrency, appending one JSON record per row to output_path."""
+    if mode == "pipeline":
+        from pipeline import arun_competitor_analysis
+    else:
+        from agent import arun_competitor_analysis
+
+    done = _completed_ids(output_path)
+    pending = [row for row in rows if row["id"] not in done]
+    logger.info(f"{len(done)} rows already done, {len(pending)} to run")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pacer = _Pacer(start_interval)
+    counts = {"ok": 0, "error": 0, "skipped": len(done)}
+    loop = asyncio.get_running_loop()
+    pdf_pool = ProcessPoolExecutor(max_workers=pdf_workers) if pdf_dir else None
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        async def run_one(row: Dict) -> None:
+            async with semaphore:
+                await pacer.wait()
+                started = time.monotonic()
+                record = {"id": row["id"], "industry": row["industry"], "product_summary": row["product_summary"]}
+                try:
+                    analysis_json = await arun_competitor_analysis(row["industry"], row["product_summary"])
+                    record.update(status="ok", analysis=json.loads(analysis_json))
+                    if pdf_pool:
+                        path = os.path.join(pdf_dir, f"{row['id']}.pdf")
+                        record["pdf"] = await loop.run_in_executor(
+                            pdf_pool, _render_pdf, analysis_json, row["industry"], row["product_summary"], path
+                        )
+                except Exception as e:
+                    logger.error(f"Row {row['id']} failed: {e}")
+                    record.update(status="error", error=str(e))
+                record["elapsed_seconds"] = round(time.monotonic() - started, 2)
+                counts[record["status"]] += 1
+                # One complete line per row, flushed immediately, doubles as the resume checkpoint
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+        try:
+            await asyncio.gather(*(run_one(row) for row in pending))
+        finally:
+            if pdf_pool:
+                pdf_pool.shutdown()
+    return counts
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from constants import ANALYSIS_MODE
+    from ratelimit import limiter_metrics
+    from tools import MAX_SEARCH_RESULTS, SEARCH_QUERIES
+
+    parser = argparse.ArgumentParser(description="Run competitor analyses for many inputs.")
+    parser.add_argument("inputs", help="JSONL or CSV file with industry and product_summary columns")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--mode", choices=["pipeline", "react"], default="pipeline")
+    parser.add_argument("--concurrency", type=int, default=4, help="Analyses in flight at once")
+    parser.add_argument("--groq-rpm", type=float, default=30, help="Groq requests per minute (0 = unlimited)")
+    parser.add_argument("--tavily-rpm", type=float, default=100, help="Tavily requests per minute (0 = unlimited)")
+    parser.add_argument("--firecrawl-rpm", type=float, default=100, help="Firecrawl requests per minute (0 = unlimited)")
+    parser.add_argument("--pdf-dir", help="Also render a PDF report per row into this directory")
+    parser.add_argument("--pdf-workers", type=int, default=2, help="Processes used to render PDFs")
+    args = parser.parse_args()
+
+    interval = _start_interval(
+        args.mode,
+        ANALYSIS_MODE,
+        SEARCH_QUERIES,
+        MAX_SEARCH_RESULTS,
+        {"groq": args.groq_rpm, "tavily": args.tavily_rpm, "firecrawl": args.firecrawl_rpm},
+    )
+    counts = asyncio.run(
+        run_batch(
+            _read_inputs(args.inputs),
+            args.output,
+            mode=args.mode,
+            concurrency=args.concurrency,
+            start_interval=interval,
+            pdf_dir=args.pdf_dir,
+            pdf_workers=args.pdf_workers,
+        )
+    )
+    logger.info(f"Batch finished: {counts}")
+    logger.info(f"Provider limiter metrics: {limiter_metrics()}")
+
+
+if __name__ == "__main__":
+    main()
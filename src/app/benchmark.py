@@ -0,0 +1,589 @@
+"""Offline benchmark of the agent and pipeline against recorded provider responses.
+
+Usage:
+    python src/app/benchmark.py run --output benchmarks/baseline.json
+    python src/app/benchmark.py run --compare benchmarks/baseline.json
+    python src/app/benchmark.py record inputs.jsonl --fixtures benchmarks/fixtures.json
+
+`run` replays benchmarks/fixtures.json through stand-ins for TavilyClient,
+Firecrawl and the Groq API with injected latency, and measures end-to-end and
+per-stage latency, throughput under concurrent analyses, peak memory, PDF
+render time and cold import time of the UI and agent modules. `--compare` exits non-zero if any metric regressed by more than
+`--tolerance`. `record` captures new fixtures from the live providers.
+"""
+import argparse
+import ast
+import asyncio
+import copy
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+from unittest import mock
+
+# Replays must not be served from, or written to, the local caches, checkpoints, snapshots and artifacts,
+# and pages must come from the recorded Firecrawl responses rather than the network
+os.environ.update(
+    FETCH_BACKEND="firecrawl",
+    FETCH_STATS_PATH="",
+    FETCH_CACHE_PATH="",
+    RESULT_CACHE_PATH="",
+    TRACE_DIR="",
+    CHECKPOINT_PATH=":memory:",
+    SNAPSHOT_PATH="",
+    ARTIFACT_PATH="",
+)
+# Measure the code rather than the provider rate limits, unless they are set explicitly
+for provider in ("GROQ", "TAVILY", "FIRECRAWL"):
+    os.environ.setdefault(f"{provider}_RPS", "0")
+
+from dotenv import load_dotenv
+load_dotenv()
+import agent
+import constants
+import pipeline
+import tools
+from llm import RateLimitedChatGroq
+from models import AgentResponse, CompetitorSummary, SynthesisResponse
+from packing import count_tokens
+from tracing import stage_report
+from triage import fuse, triage
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(APP_DIR, "..", "..", "benchmarks", "fixtures.json")
+# Modules whose cold import is timed; "main" stands for the Streamlit script's top-level imports
+_IMPORT_TARGETS = ("main", "agent", "pipeline", "pdf")
+
+# Metrics where a higher value is better; everything else is compared as lower-is-better
+_HIGHER_IS_BETTER = ("analyses_per_s",)
+
+
+class Latency:
+    """Injected provider latencies, in seconds."""
+
+    def __init__(self, search: float, scrape: float, llm_first_token: float, llm_per_token: float):
+        self.search = search
+        self.scrape = scrape
+        self.llm_first_token = llm_first_token
+        self.llm_per_token = llm_per_token
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+
+class Fixtures:
+    """Recorded search results, page markdown and analyses, looked up by the text of a request."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.scenarios = json.load(f)["scenarios"]
+        for scenario in self.scenarios:
+            AgentResponse.model_validate(scenario["analysis"])
+        self.pages = {url: md for scenario in self.scenarios for url, md in scenario["pages"].items()}
+
+    def scenario_for(self, text: str) -> Dict:
+        # Search query variants may only mention the industry
+        for field in ("product_summary", "industry"):
+            for scenario in self.scenarios:
+                if scenario[field] in text:
+                    return scenario
+        return self.scenarios[0]
+
+    def search(self, query: str, max_results: int) -> List[Dict]:
+        return self.scenario_for(query)["search_results"][:max_results]
+
+    def markdown(self, url: str) -> str:
+        for key in (url, url.rstrip("/"), url.rstrip("/") + "/"):
+            if key in self.pages:
+                return self.pages[key]
+        raise RuntimeError(f"No recorded page for {url}")
+
+
+class FakeTavilyClient:
+    def __init__(self, fixtures: Fixtures, latency: Latency):
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def search(self, query: str, max_results: int = 5, **kwargs: Any) -> Dict:
+        time.sleep(self.latency.search)
+        return {"query": query, "results": self.fixtures.search(query, max_results)}
+
+
+class FakeFirecrawl:
+    def __init__(self, fixtures: Fixtures, latency: Latency):
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def scrape(self, url: str, formats: List[str] | None = None, timeout: int | None = None, **kwargs: Any):
+        time.sleep(self.latency.scrape)
+        return SimpleNamespace(markdown=self.fixtures.markdown(url))
+
+
+class FakeGroqCompletions:
+    """Stand-in for groq.Groq().chat.completions that answers from the fixtures.
+
+    Plays the ReAct agent's tool calls (search → scrape → analyse), answers
+    structured-output calls with the recorded summaries, and streams the recorded
+    analysis as JSON for plain prompts, sleeping to mimic time to first token and
+    generation speed.
+    """
+
+    def __init__(self, fixtures: Fixtures, latency: Latency):
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def _reply(self, messages: List[Dict], params: Dict) -> Dict:
+        text = "\n".join(str(m.get("content") or "") for m in messages)
+        scenario = self.fixtures.scenario_for(text)
+        tool_choice = params.get("tool_choice")
+        if isinstance(tool_choice, dict):
+            tool_choice = tool_choice.get("function", {}).get("name")
+        if tool_choice in (CompetitorSummary.__name__, SynthesisResponse.__name__, AgentResponse.__name__):
+            return self._tool_call(tool_choice, self._structured(tool_choice, scenario, text))
+        if params.get("tools"):
+            return self._react_turn(messages, scenario)
+        return {"content": json.dumps(scenario["analysis"], ensure_ascii=False)}
+
+    @staticmethod
+    def _tool_call(name: str, args: Dict) -> Dict:
+        call_id = f"call_{name}_{time.monotonic_ns()}"
+        return {
+            "content": "",
+            "tool_calls": [
+                {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+            ],
+        }
+
+    @staticmethod
+    def _structured(name: str, scenario: Dict, text: str) -> Dict:
+        analysis = scenario["analysis"]
+        if name == SynthesisResponse.__name__:
+            return {key: analysis[key] for key in ("comparison_matrix", "strategic_analysis")}
+        if name == CompetitorSummary.__name__:
+            summaries = analysis["competitor_summaries"]
+            return next((s for s in summaries if s["website_url"].rstrip("/") in text), summaries[0])
+        return analysis
+
+    def _react_turn(self, messages: List[Dict], scenario: Dict) -> Dict:
+        called = {
+            call["id"]: call["function"]["name"]
+            for m in messages if m.get("role") == "assistant"
+            for call in m.get("tool_calls") or []
+        }
+        last = messages[-1]
+        last_tool = called.get(last.get("tool_call_id")) if last.get("role") == "tool" else None
+        if last_tool is None:
+            return self._tool_call(
+                "search_competitors",
+                {"industry": scenario["industry"], "product_summary": scenario["product_summary"]},
+            )
+        if last_tool == "search_competitors":
+            return self._tool_call("scrape_competitor_pages", {"urls": json.loads(last["content"])})
+        if last_tool == "scrape_competitor_pages":
+            return self._tool_call(
+                "analyse_competitors",
+                {
+                    "industry": scenario["industry"],
+                    "product_summary": scenario["product_summary"],
+                    "handles": [page["handle"] for page in json.loads(last["content"]) if "handle" in page],
+                },
+            )
+        return {"content": "DONE"}
+
+    def _usage(self, messages: List[Dict], reply: Dict) -> Dict[str, int]:
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+        completion_tokens = count_tokens(reply["content"] + json.dumps(reply.get("tool_calls", [])))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _response(self, reply: Dict, usage: Dict) -> Dict:
+        return {
+            "id": "offline",
+            "object": "chat.completion",
+            "model": "offline",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", **reply},
+                    "finish_reason": "tool_calls" if reply.get("tool_calls") else "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    @staticmethod
+    def _chunks(reply: Dict, usage: Dict, size: int = 64) -> List[Dict]:
+        if reply.get("tool_calls"):
+            deltas = [{"role": "assistant", "tool_calls": [{"index": 0, **call} for call in reply["tool_calls"]]}]
+        else:
+            content = reply["content"]
+            deltas = [{"role": "assistant", "content": content[i:i + size]} for i in range(0, len(content), size)]
+        chunks = [{"id": "offline", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+        chunks.append({
+            "id": "offline",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage},
+        })
+        return chunks
+
+    def create(self, messages: List[Dict], stream: bool = False, **params: Any):
+        reply = self._reply(messages, params)
+        usage = self._usage(messages, reply)
+        time.sleep(self.latency.llm_first_token)
+        if not stream:
+            time.sleep(usage["completion_tokens"] * self.latency.llm_per_token)
+            return self._response(reply, usage)
+        return self._stream(self._chunks(reply, usage), usage["completion_tokens"])
+
+    def _stream(self, chunks: List[Dict], completion_tokens: int) -> Iterator[Dict]:
+        delay = completion_tokens * self.latency.llm_per_token / len(chunks)
+        for chunk in chunks:
+            yield chunk
+            time.sleep(delay)
+
+
+class FakeAsyncGroqCompletions(FakeGroqCompletions):
+    async def create(self, messages: List[Dict], stream: bool = False, **params: Any):
+        reply = self._reply(messages, params)
+        usage = self._usage(messages, reply)
+        await asyncio.sleep(self.latency.llm_first_token)
+        if not stream:
+            await asyncio.sleep(usage["completion_tokens"] * self.latency.llm_per_token)
+            return self._response(reply, usage)
+        return self._astream(self._chunks(reply, usage), usage["completion_tokens"])
+
+    async def _astream(self, chunks: List[Dict], completion_tokens: int):
+        delay = completion_tokens * self.latency.llm_per_token / len(chunks)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(delay)
+
+
+@contextmanager
+def offline_providers(fixtures: Fixtures, latency: Latency) -> Iterator[None]:
+    """Route every Tavily, Firecrawl and Groq call made by the agent and pipeline to the fixtures."""
+    tavily = FakeTavilyClient(fixtures, latency)
+    firecrawl = FakeFirecrawl(fixtures, latency)
+    # One model per role, as configured, all answered by the same stand-in
+    llms = {
+        role: RateLimitedChatGroq(
+            model_name=settings["model"],
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            api_key="offline",
+            max_retries=0,
+            client=FakeGroqCompletions(fixtures, latency),
+            async_client=FakeAsyncGroqCompletions(fixtures, latency),
+        )
+        for role, settings in constants.LLM_ROLES.items()
+    }
+
+    async def tavily_search(query: str, max_results: int) -> List[Dict]:
+        await asyncio.sleep(latency.search)
+        return fixtures.search(query, max_results)
+
+    async def firecrawl_scrape_markdown(url: str, timeout: float) -> str:
+        await asyncio.sleep(latency.scrape)
+        return fixtures.markdown(url)
+
+    with ExitStack() as stack:
+        for module in (tools, pipeline):
+            stack.enter_context(mock.patch.object(module, "get_tavily_client", lambda: tavily))
+            stack.enter_context(mock.patch.object(module, "get_firecrawl_client", lambda: firecrawl))
+        stack.enter_context(mock.patch.object(tools, "tavily_search", tavily_search))
+        stack.enter_context(mock.patch.object(tools, "firecrawl_scrape_markdown", firecrawl_scrape_markdown))
+        for module in (constants, agent):
+            stack.enter_context(mock.patch.object(module, "get_llm", lambda role="synthesiser": llms[role]))
+        # The compiled agents hold the model they were built with
+        agent._get_agent.cache_clear()
+        agent._get_async_agent.cache_clear()
+        stack.callback(agent._get_agent.cache_clear)
+        stack.callback(agent._get_async_agent.cache_clear)
+        yield
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50": round(statistics.median(ordered), 1),
+        "p95": round(ordered[max(0, -(-95 * len(ordered) // 100) - 1)], 1),
+    }
+
+
+def _run_once(module, scenario: Dict) -> tuple[float, List[Dict]]:
+    started = time.perf_counter()
+    spans: List[Dict] = []
+    result = ""
+    for kind, label, detail in module.stream_competitor_analysis(scenario["industry"], scenario["product_summary"]):
+        if kind == "result":
+            result = label
+        elif kind == "timings":
+            spans = json.loads(detail)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    AgentResponse.model_validate_json(result)
+    return elapsed_ms, spans
+
+
+def bench_latency(module, fixtures: Fixtures, runs: int) -> Dict[str, Any]:
+    """End-to-end latency and per-stage p50/p95 over sequential runs of every scenario."""
+    durations, spans = [], []
+    for _ in range(runs):
+        for scenario in fixtures.scenarios:
+            elapsed_ms, run_spans = _run_once(module, scenario)
+            durations.append(elapsed_ms)
+            spans.extend(run_spans)
+    stages = {
+        stage: {key: row[key] for key in ("p50_ms", "p95_ms", "prompt_tokens", "completion_tokens", "bytes")}
+        for stage, row in stage_report(spans).items()
+    }
+    return {"e2e_ms": _percentiles(durations), "stages": stages}
+
+
+def bench_memory(module, fixtures: Fixtures) -> int:
+    """Peak traced Python allocations during one run of the first scenario."""
+    tracemalloc.start()
+    try:
+        _run_once(module, fixtures.scenarios[0])
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_throughput(module, fixtures: Fixtures, concurrency: int) -> Dict[str, float]:
+    """Run `concurrency` async analyses at once and report wall time and analyses per second."""
+
+    async def run_all() -> None:
+        scenarios = [fixtures.scenarios[i % len(fixtures.scenarios)] for i in range(concurrency)]
+        results = await asyncio.gather(
+            *(module.arun_competitor_analysis(s["industry"], s["product_summary"]) for s in scenarios)
+        )
+        for result in results:
+            AgentResponse.model_validate_json(result)
+
+    started = time.perf_counter()
+    asyncio.run(run_all())
+    wall = time.perf_counter() - started
+    return {"wall_ms": round(wall * 1000, 1), "analyses_per_s": round(concurrency / wall, 3)}
+
+
+def _scaled_analysis(analysis: Dict, competitors: int) -> Dict:
+    """Repeat the recorded summaries (and matrix columns) until there are `competitors` of them."""
+    scaled = copy.deepcopy(analysis)
+    base = analysis["competitor_summaries"]
+    scaled["competitor_summaries"] = [
+        {**base[i % len(base)], "name": f"{base[i % len(base)]['name']} {i + 1}"} for i in range(competitors)
+    ]
+    names = [summary["name"] for summary in scaled["competitor_summaries"]]
+    scaled["comparison_matrix"] = [
+        {"Feature": row["Feature"], "Your Product": row.get("Your Product", "?"), **{name: "✓" for name in names}}
+        for row in analysis["comparison_matrix"]
+    ]
+    return scaled
+
+
+def bench_pdf(fixtures: Fixtures, counts: List[int], repeats: int = 3) -> Dict[str, float]:
+    """Best-of-`repeats` uncached PDF render time per competitor count."""
+    from pdf import write_pdf_report
+
+    scenario = fixtures.scenarios[0]
+    timings = {}
+    for count in counts:
+        analysis = _scaled_analysis(scenario["analysis"], count)
+        best = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            write_pdf_report(analysis, scenario["industry"], scenario["product_summary"], BytesIO())
+            best = min(best, time.perf_counter() - started)
+        timings[str(count)] = round(best * 1000, 1)
+    return timings
+
+
+def _main_imports() -> str:
+    with open(os.path.join(APP_DIR, "main.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def bench_imports(repeats: int = 3) -> Dict[str, float]:
+    """Best-of-`repeats` time to import each of _IMPORT_TARGETS in a fresh interpreter."""
+    timings = {}
+    for target in _IMPORT_TARGETS:
+        statements = _main_imports() if target == "main" else f"import {target}"
+        code = f"import time\nstarted = time.perf_counter()\n{statements}\nprint((time.perf_counter() - started) * 1000)"
+        best = float("inf")
+        for _ in range(repeats):
+            output = subprocess.run(
+                [sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True
+            ).stdout
+            best = min(best, float(output.split()[-1]))
+        timings[target] = round(best, 1)
+    return timings
+
+
+def run_benchmarks(
+    fixtures: Fixtures,
+    latency: Latency,
+    modes: List[str],
+    runs: int,
+    concurrency: List[int],
+    pdf_counts: List[int],
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "analysis_mode": constants.ANALYSIS_MODE,
+            "latency_s": latency.as_dict(),
+            "runs": runs,
+            "scenarios": len(fixtures.scenarios),
+        },
+        "modes": {},
+    }
+    with offline_providers(fixtures, latency):
+        for mode in modes:
+            module = pipeline if mode == "pipeline" else agent
+            logger.info(f"Benchmarking {mode}")
+            mode_results = bench_latency(module, fixtures, runs)
+            mode_results["peak_memory_bytes"] = bench_memory(module, fixtures)
+            mode_results["throughput"] = {str(n): bench_throughput(module, fixtures, n) for n in concurrency}
+            results["modes"][mode] = mode_results
+    logger.info("Benchmarking PDF rendering")
+    results["pdf_render_ms"] = bench_pdf(fixtures, pdf_counts)
+    logger.info("Benchmarking cold imports")
+    results["import_ms"] = bench_imports()
+    return results
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every metric that got worse than the baseline by more than `tolerance` (a fraction)."""
+    sections = ("modes", "pdf_render_ms", "import_ms")
+    before = {path: value for section in sections for path, value in _flatten(baseline.get(section, {}), section).items()}
+    after = {path: value for section in sections for path, value in _flatten(current.get(section, {}), section).items()}
+    regressions = []
+    for path, old in sorted(before.items()):
+        new = after.get(path)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if path.endswith(_HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{path}: {old} -> {new} ({change:+.0%} worse)")
+    return regressions
+
+
+def record(inputs_path: str, fixtures_path: str) -> None:
+    """Capture search results, page markdown and the analysis for each input from the live providers."""
+    from batch import _read_inputs
+    from clients import get_firecrawl_client, get_tavily_client
+
+    scenarios = []
+    for row in _read_inputs(inputs_path):
+        # Recorded as one fused list, which every query variant then replays
+        search_results = fuse([
+            get_tavily_client().search(query, max_results=tools.MAX_SEARCH_CANDIDATES).get("results", [])
+            for query in tools._search_queries(row["industry"], row["product_summary"])
+        ])
+        pages = {}
+        for url in triage(search_results, tools.MAX_SEARCH_RESULTS):
+            try:
+                pages[url] = tools._fetch_markdown(url, get_firecrawl_client(), tools.SCRAPE_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.warning(f"Failed to record {url}: {e}")
+        analysis = pipeline.run_competitor_analysis(row["industry"], row["product_summary"])
+        scenarios.append({
+            "industry": row["industry"],
+            "product_summary": row["product_summary"],
+            "search_results": search_results,
+            "pages": pages,
+            "analysis": json.loads(analysis),
+        })
+        logger.info(f"Recorded {row['industry']}: {len(pages)} pages")
+    with open(fixtures_path, "w", encoding="utf-8") as f:
+        json.dump({"scenarios": scenarios}, f, indent=2, ensure_ascii=False)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline offline.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subcommands.add_parser("run", help="Replay the fixtures and measure")
+    run_parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    run_parser.add_argument("--output", help="Write the results JSON here (e.g. a new baseline)")
+    run_parser.add_argument("--compare", help="Baseline JSON to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)")
+    run_parser.add_argument("--modes", default="pipeline,react", help="Comma-separated: pipeline, react")
+    run_parser.add_argument("--runs", type=int, default=3, help="Sequential runs of every scenario per mode")
+    run_parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16], help="e.g. 1,4,16")
+    run_parser.add_argument("--pdf-competitors", type=_int_list, default=[3, 10, 25, 50], help="e.g. 3,10,25,50")
+    run_parser.add_argument("--search-latency", type=float, default=0.4, help="Seconds per Tavily search")
+    run_parser.add_argument("--scrape-latency", type=float, default=1.0, help="Seconds per Firecrawl scrape")
+    run_parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds to the first LLM token")
+    run_parser.add_argument("--llm-token-ms", type=float, default=2.0, help="Milliseconds per generated token")
+
+    record_parser = subcommands.add_parser("record", help="Record fixtures from the live providers")
+    record_parser.add_argument("inputs", help="JSONL or CSV file with industry and product_summary columns")
+    record_parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.inputs, args.fixtures)
+        return
+
+    latency = Latency(args.search_latency, args.scrape_latency, args.llm_latency, args.llm_token_ms / 1000)
+    results = run_benchmarks(
+        Fixtures(args.fixtures),
+        latency,
+        [mode.strip() for mode in args.modes.split(",") if mode.strip()],
+        args.runs,
+        args.concurrency,
+        args.pdf_competitors,
+    )
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            logger.error(f"Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict
+from urllib.parse import urlsplit, urlunsplit
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+FETCH_CACHE_PATH = os.getenv("FETCH_CACHE_PATH", ".cache/fetch_cache.sqlite3")
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Seconds an entry stays fresh, per source
+FETCH_CACHE_TTLS = {
+    "search": int(os.getenv("SEARCH_CACHE_TTL", str(6 * 60 * 60))),
+    "scrape": int(os.getenv("SCRAPE_CACHE_TTL", str(24 * 60 * 60))),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+def normalize_query(*parts: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    return "|".join(" ".join(part.lower().split()) for part in parts)
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host and drop fragments, default ports and trailing slashes."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), parts.query, ""))
+
+
+class FetchCache:
+    """SQLite-backed cache of external fetch results.
+
+    Entries are keyed by a hash of the namespace and normalized key, stored as
+    zstd-compressed JSON, expire after the namespace's TTL and are evicted
+    least-recently-used first once the store grows past ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int = FETCH_CACHE_MAX_BYTES, ttls: Dict[str, int] | None = None):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = dict(FETCH_CACHE_TTLS if ttls is None else ttls)
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _digest(namespace: str, key: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{key}".encode()).hexdigest()
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        digest = self._digest(namespace, key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, body FROM entries WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None or now - row[0] > self.ttls.get(namespace, 0):
+                self.misses[namespace] += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE digest = ?", (now, digest))
+            self._conn.commit()
+            self.hits[namespace] += 1
+        return json.loads(zstandard.ZstdDecompressor().decompress(row[1]))
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        body = zstandard.ZstdCompressor().compress(json.dumps(value).encode())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (self._digest(namespace, key), namespace, now, now, len(body), body),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling fetch and storing its result on a miss.
+
+        Empty results are returned but not stored, so a failed lookup is retried next time.
+        """
+        cached = self.get(namespace, key)
+        if cached is not None:
+            logger.debug(f"Cache hit for {namespace}:{key}")
+            return cached
+        value = fetch()
+        if value:
+            self.put(namespace, key, value)
+        return value
+
+    async def aget_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Async get_or_fetch; the SQLite lookups are local and fast enough to run inline."""
+        cached = self.get(namespace, key)
+        if cached is not None:
+            logger.debug(f"Cache hit for {namespace}:{key}")
+            return cached
+        value = await fetch()
+        if value:
+            self.put(namespace, key, value)
+        return value
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per namespace plus the current entry count and size."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+            ).fetchall()
+        stored = {namespace: (count, size) for namespace, count, size in rows}
+        namespaces = set(stored) | set(self.hits) | set(self.misses)
+        return {
+            namespace: {
+                "hits": self.hits[namespace],
+                "misses": self.misses[namespace],
+                "entries": stored.get(namespace, (0, 0))[0],
+                "bytes": stored.get(namespace, (0, 0))[1],
+            }
+            for namespace in sorted(namespaces)
+        }
+
+    def _evict(self) -> None:
+        # Caller holds the lock
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self._conn.execute(
+            "SELECT digest, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            self._conn.execute("DELETE FROM entries WHERE digest = ?", (digest,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        logger.info(f"Evicted fetch cache entries down to {total} bytes")
+
+
+class _NullCache:
+    """Stand-in used when FETCH_CACHE_PATH is empty: always fetches."""
+
+    def get_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Any]) -> Any:
+        return fetch()
+
+    async def aget_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        return await fetch()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {}
+
+
+@lru_cache(maxsize=1)
+def get_fetch_cache() -> FetchCache | _NullCache:
+    if not FETCH_CACHE_PATH:
+        return _NullCache()
+    return FetchCache(FETCH_CACHE_PATH)
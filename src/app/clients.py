@@ -0,0 +1,95 @@
+import asyncio
+import importlib.util
+import os
+import weakref
+from functools import lru_cache
+from typing import Dict, List
+
+import httpx
+from firecrawl import Firecrawl
+from tavily import TavilyClient
+
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+# HTTP/2 needs the optional h2 package; without it the clients speak HTTP/1.1
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# httpx.AsyncClient is bound to the event loop it was first used on, so keep one per loop
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@lru_cache(maxsize=1)
+def get_tavily_client() -> TavilyClient:
+    return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+
+
+@lru_cache(maxsize=1)
+def get_firecrawl_client() -> Firecrawl:
+    return Firecrawl(api_key=os.getenv("FIRECRAWL_API_KEY"))
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Return the pooled HTTP client for direct requests from sync code paths."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+        timeout=HTTP_TIMEOUT_SECONDS,
+        http2=HTTP2,
+    )
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=HTTP_TIMEOUT_SECONDS,
+            http2=HTTP2,
+        )
+        _async_http_clients[loop] = client
+    return client
+
+
+async def close_async_http_client() -> None:
+    """Close the running loop's pooled client, e.g. on server shutdown."""
+    client = _async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def tavily_search(query: str, max_results: int) -> List[Dict]:
+    """Call the Tavily search API over the pooled client and return its result hits."""
+    response = await get_async_http_client().post(
+        f"{TAVILY_API_URL}/search",
+        json={"query": query, "max_results": max_results},
+        headers={"Authorization": f"Bearer {os.getenv('TAVILY_API_KEY')}"},
+    )
+    response.raise_for_status()
+    return response.json().get("results", [])
+
+
+async def firecrawl_scrape_markdown(url: str, timeout: float) -> str:
+    """Scrape a page through the Firecrawl v2 API over the pooled client and return its markdown."""
+    response = await get_async_http_client().post(
+        f"{FIRECRAWL_API_URL}/v2/scrape",
+        json={"url": url, "formats": ["markdown"], "timeout": int(timeout * 1000)},
+        headers={"Authorization": f"Bearer {os.getenv('FIRECRAWL_API_KEY')}"},
+        timeout=timeout + 5,
+    )
+    response.raise_for_status()
+    body = response.json()
+    if not body.get("success"):
+        raise RuntimeError(body.get("error", "Unknown Firecrawl error"))
+    return body.get("data", {}).get("markdown") or ""
@@ -1,15 +1,78 @@
 import os
 from functools import lru_cache
-from langchain_groq import ChatGroq
+from typing import TYPE_CHECKING, Dict
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
 
-@lru_cache(maxsize=1)
-def get_llm() -> ChatGroq:
-    return ChatGroq(
-        model_name="llama-3.3-70b-versatile",
-        temperature=0.2,
-        max_tokens=4096,
+# "react" runs the LLM-planned agent, "pipeline" the fixed search → scrape → analyse graph
+AGENT_MODE = os.getenv("AGENT_MODE", "react")
+
+# "single" analyses all competitors in one LLM call, "map_reduce" extracts each page
+# in parallel and merges the summaries in a final, smaller call
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "single")
+
+
+def _llm_role(prefix: str, model: str, temperature: float, max_tokens: int, timeout: float, fallback: str) -> Dict:
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", model),
+        "temperature": float(os.getenv(f"{prefix}_TEMPERATURE", temperature)),
+        "max_tokens": int(os.getenv(f"{prefix}_MAX_TOKENS", max_tokens)),
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", timeout)),
+        # Empty disables the fallback
+        "fallback": os.getenv(f"{prefix}_FALLBACK_MODEL", fallback),
+    }
+
+
+# Model settings per role. The planner drives the ReAct agent's tool calls and the
+# extractor profiles single pages, so both run on a small, fast model. Only the
+# synthesiser, which writes the comparison and strategy, gets the large one.
+LLM_ROLES = {
+    "planner": _llm_role(
+        "PLANNER", "llama-3.1-8b-instant", temperature=0.0, max_tokens=1024, timeout=20, fallback="llama-3.3-70b-versatile"
+    ),
+    "extractor": _llm_role(
+        "EXTRACTOR", "llama-3.1-8b-instant", temperature=0.1, max_tokens=2048, timeout=30, fallback="llama-3.3-70b-versatile"
+    ),
+    "synthesiser": _llm_role(
+        "SYNTHESISER", "llama-3.3-70b-versatile", temperature=0.2, max_tokens=4096, timeout=90, fallback="openai/gpt-oss-120b"
+    ),
+}
+
+
+def _chat_model(model: str, settings: Dict, fallback_errors: tuple = ()) -> "BaseChatModel":
+    # Imported here so the UI can import this module without loading the LLM stack
+    from llm import RateLimitedChatGroq
+
+    return RateLimitedChatGroq(
+        model_name=model,
+        temperature=settings["temperature"],
+        max_tokens=settings["max_tokens"],
+        request_timeout=settings["timeout"],
         api_key=os.getenv("GROQ_API_KEY"),
+        # Retries are handled by the shared limiter so they respect the provider's budget
+        max_retries=0,
+        fallback_errors=fallback_errors,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_llm(role: str = "synthesiser") -> "BaseChatModel":
+    """The chat model for a role in LLM_ROLES, falling back to the role's secondary model.
+
+    The fallback takes over on the primary model's first timeout or 429: the
+    shared limiter doesn't retry those for a model that has a fallback, so a
+    slow primary costs one timeout rather than RETRY_MAX_ATTEMPTS of them.
+    """
+    import groq
+
+    settings = LLM_ROLES[role]
+    if not settings["fallback"] or settings["fallback"] == settings["model"]:
+        return _chat_model(settings["model"], settings)
+    fallback_errors = (groq.RateLimitError, groq.APITimeoutError)
+    return _chat_model(settings["model"], settings, fallback_errors).with_fallbacks(
+        [_chat_model(settings["fallback"], settings)],
+        exceptions_to_handle=fallback_errors,
     )
 
 categories = [
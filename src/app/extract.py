@@ -0,0 +1,380 @@
+import heapq
+import logging
+import os
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Characters kept per section while streaming, so one endless section can't use up the page's share
+MAX_SECTION_CHARS = int(os.getenv("MAX_SECTION_CHARS", "1500"))
+
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_BARE_URL_RE = re.compile(r"https?://\S+")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)")
+# The patterns below are matched against lowercased text, which is much faster than re.IGNORECASE
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_PRICE_RE = re.compile(r"[$€£]\s?\d|\d\s?(/|per )\s?(mo|month|year|yr|user|seat)")
+_NOISE_LINE_RE = re.compile(
+    r"\bcookies?( (settings|policy|preferences))?\b|\bskip to (main )?content\b|\ball rights reserved\b|©|"
+    r"\bcopyright\b|\blog ?(in|out)\b|\bsign[ -]?(in|up|out)\b|\bprivacy policy\b|"
+    r"\bterms (of (service|use)|and conditions)\b|\bsubscribe to our newsletter\b"
+)
+# Section kinds the analysis needs, matched against a section's heading and opening text
+_SECTION_KINDS = {
+    "pricing": re.compile(r"pric|\bplans?\b|per (month|user|seat)|/\s?(mo|month|yr|year)\b|free trial|[$€£]\s?\d"),
+    "features": re.compile(r"feature|integrat|capabilit|\bapi\b|security|complian|enterprise|how it works|workflow"),
+    "customers": re.compile(r"customer|trusted by|testimonial|case stud|used by|loved by|reviews?\b|teams? like"),
+}
+# Section ranking when a page has more content than it may keep; the opening section describes the company
+_KIND_WEIGHTS = {"pricing": 3.0, "features": 2.0, "customers": 1.0}
+_INTRO_WEIGHT = 2.5
+# Distinct lines remembered for de-duplication
+_MAX_SEEN_LINES = 10_000
+# Longest run of text buffered before it is treated as a line of its own
+_MAX_LINE_CHARS = 20_000
+
+# HTML elements whose content is never page copy
+_SKIP_TAGS = frozenset(
+    "script style noscript template svg canvas iframe object nav aside form button select dialog".split()
+)
+_SKIP_ROLES = frozenset("navigation banner contentinfo dialog alertdialog menu menubar search".split())
+_BOILERPLATE_ATTR_RE = re.compile(
+    r"(^|[\s_-])(cookies?|consent|gdpr|nav|navbar|navigation|menu|breadcrumbs?|footer|sidebar|"
+    r"newsletter|modal|popup|social|share)([\s_-]|$)",
+    re.IGNORECASE,
+)
+# Containers whose class names often mention nav or footer without being either
+_NEVER_SKIPPED = frozenset("html body main article".split())
+_VOID_TAGS = frozenset("area base br col embed hr img input link meta param source track wbr".split())
+_BLOCK_TAGS = frozenset(
+    "address article blockquote dd div dl dt figcaption figure h1 h2 h3 h4 h5 h6 header footer "
+    "li main ol p pre section summary table tbody thead tfoot tr ul".split()
+)
+
+
+def clean_line(line: str) -> str | None:
+    """A markdown line with images, link targets and URLs removed, or None if it is boilerplate."""
+    line = _IMAGE_RE.sub("", line)
+    # Lines made up mostly of links are menus or link lists
+    links = _LINK_RE.findall(line)
+    if len(links) >= 2 and len(_LINK_RE.sub("", line).strip(" \t|*-,")) < len(line) * 0.2:
+        return None
+    line = _LINK_RE.sub(r"\1", line)
+    line = _BARE_URL_RE.sub("", line).strip(" \t|*-")
+    lowered = line.lower()
+    # Nav items and link lists are short, word-poor lines
+    words = len(_WORD_RE.findall(lowered))
+    if words < 3 and not (_HEADING_RE.match(line) or _PRICE_RE.search(lowered)):
+        return None
+    # Footer and account boilerplate, but only when it is most of the line rather than a word in real copy
+    if len(line) < 120:
+        noise = sum(len(_WORD_RE.findall(match.group())) or 1 for match in _NOISE_LINE_RE.finditer(lowered))
+        if noise and 2 * noise >= words:
+            return None
+    return line
+
+
+class _LineFilter:
+    """clean_line plus de-duplication of lines repeated across the page (menus, CTAs)."""
+
+    def __init__(self):
+        self._seen: set = set()
+
+    def __call__(self, line: str) -> str | None:
+        line = clean_line(line)
+        if line is None:
+            return None
+        key = hash(line)
+        if key in self._seen:
+            return None
+        if len(self._seen) < _MAX_SEEN_LINES:
+            self._seen.add(key)
+        return line
+
+
+def split_sections(markdown: str) -> List[str]:
+    """Split markdown at its headings, each section starting with its heading."""
+    sections: List[List[str]] = [[]]
+    for line in markdown.splitlines():
+        if _HEADING_RE.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return ["\n".join(section) for section in sections if section]
+
+
+def section_kinds(section: str) -> List[str]:
+    """Which of pricing, features and customers a section covers, judged by its heading and opening text."""
+    head = section[:500].lower()
+    return [kind for kind, pattern in _SECTION_KINDS.items() if pattern.search(head)]
+
+
+class _Section:
+    __slots__ = ("index", "lines", "chars", "full", "kinds", "score")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.lines: List[str] = []
+        self.chars = 0
+        self.full = False
+        self.kinds: List[str] = []
+        self.score = 0.0
+
+    def add(self, line: str) -> None:
+        if self.full:
+            return
+        if self.chars + len(line) + 1 > MAX_SECTION_CHARS:
+            self.full = True
+            line = line[: max(0, MAX_SECTION_CHARS - self.chars - 1)]
+        self.lines.append(line)
+        self.chars += len(line) + 1
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def classify(self) -> None:
+        self.kinds = section_kinds(self.text())
+        self.score = sum(_KIND_WEIGHTS[kind] for kind in self.kinds) + (_INTRO_WEIGHT if self.index == 0 else 0.0)
+
+
+class PageExtractor:
+    """Turns a page, fed as markdown or HTML in chunks, into a compact record.
+
+    Lines are cleaned and de-duplicated as they arrive and grouped into sections
+    at headings. Only the best-ranked sections are kept: the opening section,
+    then pricing, feature and customer sections. Memory therefore stays around
+    twice ``max_chars`` however long the page is. ``close()`` returns the title,
+    description, section kinds and price mentions found, and the kept sections
+    in page order as ``content``.
+    """
+
+    def __init__(self, max_chars: int = 4000):
+        self.max_chars = max_chars
+        self.title = ""
+        self.description = ""
+        self._filter = _LineFilter()
+        self._sections: Dict[int, _Section] = {}
+        # (score, -index) of every kept section, weakest first
+        self._ranking: List[tuple] = []
+        self._current = _Section(0)
+        self._kept_chars = 0
+        self._kinds: Dict[str, None] = {}
+        self._prices: List[str] = []
+        self._pending = ""
+        self._html: _HTMLLines | None = None
+
+    def add_line(self, line: str) -> None:
+        line = self._filter(line)
+        if line is None:
+            return
+        heading = _HEADING_RE.match(line)
+        if heading:
+            if not self.title and len(heading.group(1)) == 1:
+                self.title = heading.group(2).strip()
+            if self._current.lines:
+                self._close_section()
+                self._current = _Section(self._current.index + 1)
+        elif not self.description and len(_WORD_RE.findall(line.lower())) >= 8:
+            self.description = line[:300]
+        if len(self._prices) < 8 and _PRICE_RE.search(line.lower()):
+            self._prices.append(line[:120])
+        self._current.add(line)
+
+    def feed_markdown(self, chunk: str) -> None:
+        *lines, self._pending = (self._pending + chunk).split("\n")
+        for line in lines:
+            self.add_line(line)
+        if len(self._pending) > _MAX_LINE_CHARS:
+            self.add_line(self._pending)
+            self._pending = ""
+
+    def feed_html(self, chunk: str) -> None:
+        if self._html is None:
+            self._html = _HTMLLines(self.add_line)
+        self._html.feed(chunk)
+
+    def _close_section(self) -> None:
+        section = self._current
+        if not section.lines:
+            return
+        section.classify()
+        self._kinds.update(dict.fromkeys(section.kinds))
+        self._sections[section.index] = section
+        heapq.heappush(self._ranking, (section.score, -section.index))
+        self._kept_chars += section.chars
+        # Allow some slack so the final choice is made among more than just enough sections
+        while self._kept_chars > 2 * self.max_chars and len(self._sections) > 1:
+            _, index = heapq.heappop(self._ranking)
+            self._kept_chars -= self._sections.pop(-index).chars
+
+    def close(self) -> Dict:
+        if self._pending:
+            self.add_line(self._pending)
+            self._pending = ""
+        if self._html is not None:
+            self._html.close()
+            self.title = " ".join(self._html.title.split())[:200] or self.title
+            self.description = self._html.description or self.description
+        self._close_section()
+        chosen, used = [], 0
+        for section in sorted(self._sections.values(), key=lambda s: (-s.score, s.index)):
+            remaining = self.max_chars - used
+            if section.chars <= remaining:
+                chosen.append((section.index, section.text()))
+                used += section.chars
+            elif not chosen or remaining >= 200:
+                # Always keep something from the best section, and fill a useful remainder
+                chosen.append((section.index, section.text()[:remaining]))
+                break
+        return {
+            "title": self.title,
+            "description": self.description,
+            "sections": list(self._kinds),
+            "prices": self._prices,
+            "content": "\n".join(text for _, text in sorted(chosen)),
+        }
+
+
+class _HTMLLines(HTMLParser):
+    """Incremental HTML to markdown-ish lines, skipping scripts, navigation, footers and hidden elements."""
+
+    def __init__(self, on_line: Callable[[str], None]):
+        super().__init__(convert_charrefs=True)
+        self._on_line = on_line
+        self._stack: List[tuple] = []
+        self._skip_depth = 0
+        self._anchor_depth = 0
+        self._in_title = False
+        self._parts: List[str] = []
+        self._part_chars = 0
+        self._prefix = ""
+        self._links = 0
+        self._link_chars = 0
+        self.title = ""
+        self.description = ""
+
+    def _is_boilerplate(self, tag: str, attrs: Dict[str, str | None]) -> bool:
+        if tag in _SKIP_TAGS or "hidden" in attrs or attrs.get("aria-hidden") == "true":
+            return True
+        if attrs.get("role") in _SKIP_ROLES:
+            return True
+        # Page-level headers and footers; an article's own header holds its title
+        if tag in ("header", "footer") and not any(open_tag in ("main", "article") for open_tag, _ in self._stack):
+            return True
+        if tag in _NEVER_SKIPPED:
+            return False
+        return bool(_BOILERPLATE_ATTR_RE.search(f"{attrs.get('class') or ''} {attrs.get('id') or ''}"))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta":
+            if (attrs.get("name") or attrs.get("property") or "").lower() in ("description", "og:description"):
+                self.description = self.description or " ".join((attrs.get("content") or "").split())[:300]
+            return
+        if tag in _VOID_TAGS:
+            if tag in ("br", "hr") and not self._skip_depth:
+                self._flush()
+            return
+        skipped = self._skip_depth > 0 or self._is_boilerplate(tag, attrs)
+        self._stack.append((tag, skipped))
+        if skipped:
+            self._skip_depth += 1
+            return
+        if tag == "title":
+            self._in_title = True
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            if tag[0] == "h" and tag[1:].isdigit():
+                self._prefix = "#" * int(tag[1]) + " "
+        elif tag in ("td", "th"):
+            self._parts.append(" | ")
+        elif tag == "a":
+            self._anchor_depth += 1
+            self._links += 1
+
+    def handle_endtag(self, tag):
+        # Stray end tags are ignored; a matching one also closes anything left open inside it
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, skipped = self._stack.pop()
+            if skipped:
+                self._skip_depth -= 1
+            elif open_tag == "title":
+                self._in_title = False
+            elif open_tag == "a":
+                self._anchor_depth -= 1
+            elif open_tag in _BLOCK_TAGS:
+                self._flush()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title = (self.title + data)[:1000]
+            return
+        self._parts.append(data)
+        self._part_chars += len(data)
+        if self._anchor_depth:
+            self._link_chars += len(data.strip())
+        if self._part_chars > _MAX_LINE_CHARS:
+            self._flush()
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._parts).split()).strip(" |")
+        prefix, links, link_chars = self._prefix, self._links, self._link_chars
+        self._parts, self._part_chars, self._prefix, self._links, self._link_chars = [], 0, "", 0, 0
+        if not text:
+            return
+        # Runs of links with little else are menus and link lists
+        if links >= 2 and link_chars >= 0.8 * len(text):
+            return
+        self._on_line(prefix + text)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+class HTMLToMarkdown:
+    """Incremental HTML to markdown-ish text (headings and one line per block), for backends that fetch raw HTML.
+
+    Boilerplate elements are skipped as in extract_html, but lines are not
+    ranked or cut, so the result can be cached and extracted like a scraped
+    page's markdown.
+    """
+
+    def __init__(self):
+        self._lines: List[str] = []
+        self._parser = _HTMLLines(self._lines.append)
+
+    def feed(self, chunk: str) -> None:
+        self._parser.feed(chunk)
+
+    def close(self) -> str:
+        self._parser.close()
+        title = " ".join(self._parser.title.split())
+        # Keep the document title when the page has no top-level heading of its own
+        if title and not any(line.startswith("# ") for line in self._lines):
+            self._lines.insert(0, f"# {title}")
+        return "\n".join(self._lines)
+
+
+def extract_markdown(markdown: str, max_chars: int = 4000) -> Dict:
+    """Compact record (title, description, section kinds, prices, content) of a page's markdown."""
+    extractor = PageExtractor(max_chars)
+    for line in markdown.splitlines():
+        extractor.add_line(line)
+    return extractor.close()
+
+
+def extract_html(html: str | Iterable[str], max_chars: int = 4000) -> Dict:
+    """Compact record of a page's HTML, given whole or as an iterable of chunks (e.g. a streamed response)."""
+    extractor = PageExtractor(max_chars)
+    for chunk in [html] if isinstance(html, str) else html:
+        extractor.feed_html(chunk)
+    return extractor.close()
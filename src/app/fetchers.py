@@ -0,0 +1,407 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from clients import get_async_http_client, get_http_client
+from extract import HTMLToMarkdown
+
+logger = logging.getLogger(__name__)
+
+# "auto" tries the local fetcher first unless a domain has mostly failed with it,
+# "local" never uses Firecrawl, and "firecrawl" always does
+FETCH_BACKEND = os.getenv("FETCH_BACKEND", "auto")
+FETCH_STATS_PATH = os.getenv("FETCH_STATS_PATH", ".cache/fetch_stats.sqlite3")
+# Seconds per-domain results count towards routing, so a domain that failed once is retried later
+FETCH_STATS_TTL = int(os.getenv("FETCH_STATS_TTL", str(7 * 24 * 60 * 60)))
+# Local attempts needed, and the success rate below which a domain goes straight to Firecrawl
+FETCH_MIN_ATTEMPTS = int(os.getenv("FETCH_MIN_ATTEMPTS", "2"))
+FETCH_MIN_SUCCESS_RATE = float(os.getenv("FETCH_MIN_SUCCESS_RATE", "0.5"))
+# Characters of HTML read per page; longer pages are cut off, not refused
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+# Pages with less text than this are taken to be rendered by JavaScript and sent to Firecrawl
+FETCH_MIN_TEXT_CHARS = int(os.getenv("FETCH_MIN_TEXT_CHARS", "500"))
+# Seconds a local fetch may take before the page goes to Firecrawl instead
+FETCH_LOCAL_TIMEOUT_SECONDS = float(os.getenv("FETCH_LOCAL_TIMEOUT_SECONDS", "10"))
+# Minimum seconds between requests to one host, raised to its robots.txt Crawl-delay
+FETCH_HOST_DELAY_SECONDS = float(os.getenv("FETCH_HOST_DELAY_SECONDS", "1"))
+FETCH_USER_AGENT = os.getenv(
+    "FETCH_USER_AGENT", "CompetitorAnalysisBot/1.0 (+https://github.com/V1SHAL421/competitor-analysis-chatbot)"
+)
+
+_ROBOTS_TTL_SECONDS = 60 * 60
+_ROBOTS_TIMEOUT_SECONDS = 5.0
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+# Statuses sites use to turn away bots or throttle them; Firecrawl may still get the page
+_BLOCKED_STATUS = {401, 403, 429}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_stats (
+    host TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    successes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (host, backend)
+);
+"""
+
+
+class NeedsFallback(Exception):
+    """The local fetcher can't or shouldn't get this page; Firecrawl may."""
+
+
+class PageUnavailable(Exception):
+    """The page must not be fetched by any backend (robots.txt disallows it) or isn't there to fetch."""
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class FetchStats:
+    """Per-domain success and failure counts for each backend, used to route later fetches."""
+
+    def __init__(self, path: str):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._purge_expired()
+
+    def record(self, host: str, backend: str, ok: bool) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO domain_stats VALUES (?, ?, ?, ?, ?) ON CONFLICT (host, backend) DO UPDATE SET "
+                "successes = successes + excluded.successes, failures = failures + excluded.failures, "
+                "updated_at = excluded.updated_at",
+                (host, backend, int(ok), int(not ok), time.time()),
+            )
+            self._conn.commit()
+
+    def counts(self, host: str, backend: str) -> tuple[int, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT successes, failures FROM domain_stats WHERE host = ? AND backend = ? AND updated_at >= ?",
+                (host, backend, time.time() - FETCH_STATS_TTL),
+            ).fetchone()
+        return row or (0, 0)
+
+    def prefers_local(self, host: str) -> bool:
+        successes, failures = self.counts(host, "local")
+        attempts = successes + failures
+        return attempts < FETCH_MIN_ATTEMPTS or successes / attempts >= FETCH_MIN_SUCCESS_RATE
+
+    def _purge_expired(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM domain_stats WHERE updated_at < ?", (time.time() - FETCH_STATS_TTL,))
+            self._conn.commit()
+
+
+class _HostPacer:
+    """Spaces out requests to each host; callers reserve a slot and are told how long to wait for it."""
+
+    def __init__(self):
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str, delay: float, max_wait: float) -> float | None:
+        """Seconds until the reserved slot, or None (and nothing reserved) if that is longer than max_wait."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            if start - now > max_wait:
+                return None
+            self._next[host] = start + delay
+            return start - now
+
+
+def _robots_from_response(response: httpx.Response) -> RobotFileParser:
+    robots = RobotFileParser()
+    # An unreachable robots.txt means nothing may be crawled (RFC 9309), as does one the site refuses to serve
+    if response.status_code in (401, 403) or response.status_code >= 500:
+        robots.disallow_all = True
+    elif response.status_code >= 400:
+        robots.allow_all = True
+    else:
+        robots.parse(response.text.splitlines())
+    return robots
+
+
+def _check_response(response: httpx.Response) -> None:
+    if response.status_code in _BLOCKED_STATUS:
+        raise NeedsFallback(f"HTTP {response.status_code}")
+    if response.status_code != 200:
+        raise PageUnavailable(f"HTTP {response.status_code}")
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in _HTML_TYPES:
+        raise PageUnavailable(f"not an HTML page ({content_type})")
+
+
+def _checked_markdown(converter: HTMLToMarkdown) -> str:
+    markdown = converter.close()
+    if len(markdown) < FETCH_MIN_TEXT_CHARS:
+        raise NeedsFallback(f"only {len(markdown)} characters of text, probably rendered with JavaScript")
+    return markdown
+
+
+def _read_validators(response: httpx.Response, validators: Dict | None) -> None:
+    if validators is not None:
+        validators.update(etag=response.headers.get("etag"), last_modified=response.headers.get("last-modified"))
+
+
+class LocalFetcher:
+    """Fetches pages directly over the pooled HTTP clients and converts their HTML to markdown.
+
+    Honours robots.txt (including Crawl-delay) and spaces out requests to each
+    host by FETCH_HOST_DELAY_SECONDS. Responses are streamed and read up to
+    FETCH_MAX_BYTES, with gzip/deflate (and brotli/zstd where available)
+    transfer compression. Pages robots.txt disallows, error responses and
+    non-HTML responses raise PageUnavailable. Pages another backend may still
+    get, such as JavaScript-rendered pages, bot-blocked or throttled requests
+    and timeouts, raise NeedsFallback.
+    """
+
+    def __init__(self):
+        self._pacer = _HostPacer()
+        self._robots: Dict[str, tuple[RobotFileParser, float]] = {}
+        self._robots_lock = threading.Lock()
+
+    def _cached_robots(self, origin: str) -> RobotFileParser | None:
+        with self._robots_lock:
+            cached = self._robots.get(origin)
+        if cached and time.monotonic() - cached[1] < _ROBOTS_TTL_SECONDS:
+            return cached[0]
+        return None
+
+    def _store_robots(self, origin: str, robots: RobotFileParser) -> RobotFileParser:
+        with self._robots_lock:
+            self._robots[origin] = (robots, time.monotonic())
+        return robots
+
+    def _allowed_delay(self, url: str, robots: RobotFileParser, deadline: float) -> float:
+        """Seconds to wait before fetching url.
+
+        Raises:
+            PageUnavailable: If robots.txt disallows url
+            NeedsFallback: If the host's pacing would leave no time to fetch url before the deadline
+        """
+        if not robots.can_fetch(FETCH_USER_AGENT, url):
+            raise PageUnavailable("disallowed by robots.txt")
+        delay = max(FETCH_HOST_DELAY_SECONDS, float(robots.crawl_delay(FETCH_USER_AGENT) or 0))
+        wait = self._pacer.reserve(_host(url), delay, deadline - time.monotonic())
+        if wait is None:
+            raise NeedsFallback(f"next request to {_host(url)} allowed only after the timeout")
+        return wait
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise NeedsFallback("timed out before the page was requested")
+        return remaining
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme or 'https'}://{parts.netloc}"
+
+    def _get_robots(self, origin: str, deadline: float) -> RobotFileParser:
+        robots = self._cached_robots(origin)
+        if robots is not None:
+            return robots
+        try:
+            response = get_http_client().get(
+                f"{origin}/robots.txt",
+                headers={"User-Agent": FETCH_USER_AGENT},
+                timeout=min(_ROBOTS_TIMEOUT_SECONDS, self._remaining(deadline)),
+                follow_redirects=True,
+            )
+        except httpx.HTTPError as e:
+            raise PageUnavailable(f"robots.txt unavailable ({e})") from e
+        return self._store_robots(origin, _robots_from_response(response))
+
+    async def _aget_robots(self, origin: str, deadline: float) -> RobotFileParser:
+        robots = self._cached_robots(origin)
+        if robots is not None:
+            return robots
+        try:
+            response = await get_async_http_client().get(
+                f"{origin}/robots.txt",
+                headers={"User-Agent": FETCH_USER_AGENT},
+                timeout=min(_ROBOTS_TIMEOUT_SECONDS, self._remaining(deadline)),
+                follow_redirects=True,
+            )
+        except httpx.HTTPError as e:
+            raise PageUnavailable(f"robots.txt unavailable ({e})") from e
+        return self._store_robots(origin, _robots_from_response(response))
+
+    def fetch(self, url: str, timeout: float, validators: Dict | None = None) -> str:
+        """Return the page's content as markdown, and its ETag/Last-Modified in validators if given.
+
+        The robots.txt lookup and the wait for the host's next slot count towards timeout.
+        """
+        deadline = time.monotonic() + timeout
+        time.sleep(self._allowed_delay(url, self._get_robots(self._origin(url), deadline), deadline))
+        converter = HTMLToMarkdown()
+        read = 0
+        try:
+            with get_http_client().stream(
+                "GET",
+                url,
+                headers={"User-Agent": FETCH_USER_AGENT},
+                timeout=self._remaining(deadline),
+                follow_redirects=True,
+            ) as response:
+                _check_response(response)
+                _read_validators(response, validators)
+                for chunk in response.iter_text():
+                    converter.feed(chunk[: FETCH_MAX_BYTES - read])
+                    read += len(chunk)
+                    if read >= FETCH_MAX_BYTES:
+                        logger.info(f"Truncated {url} at {FETCH_MAX_BYTES} characters")
+                        break
+        except httpx.HTTPError as e:
+            raise NeedsFallback(f"{type(e).__name__}: {e}") from e
+        return _checked_markdown(converter)
+
+    async def afetch(self, url: str, timeout: float, validators: Dict | None = None) -> str:
+        """Async fetch."""
+        deadline = time.monotonic() + timeout
+        await asyncio.sleep(self._allowed_delay(url, await self._aget_robots(self._origin(url), deadline), deadline))
+        converter = HTMLToMarkdown()
+        read = 0
+        try:
+            async with get_async_http_client().stream(
+                "GET",
+                url,
+                headers={"User-Agent": FETCH_USER_AGENT},
+                timeout=self._remaining(deadline),
+                follow_redirects=True,
+            ) as response:
+                _check_response(response)
+                _read_validators(response, validators)
+                async for chunk in response.aiter_text():
+                    converter.feed(chunk[: FETCH_MAX_BYTES - read])
+                    read += len(chunk)
+                    if read >= FETCH_MAX_BYTES:
+                        logger.info(f"Truncated {url} at {FETCH_MAX_BYTES} characters")
+                        break
+        except httpx.HTTPError as e:
+            raise NeedsFallback(f"{type(e).__name__}: {e}") from e
+        return _checked_markdown(converter)
+
+
+class PageFetcher:
+    """Routes each page to the local fetcher or Firecrawl and records how each backend did per domain.
+
+    With FETCH_BACKEND=auto, a page is fetched locally unless its domain's
+    recent local success rate is below FETCH_MIN_SUCCESS_RATE. If the local
+    fetch falls back, the page goes to Firecrawl in the same call. A page the
+    local fetcher finds unavailable is not sent to Firecrawl and doesn't count
+    against its domain.
+    """
+
+    def __init__(self, backend: str = FETCH_BACKEND, stats: FetchStats | None = None):
+        self.backend = backend
+        self.stats = stats
+        self.local = LocalFetcher()
+
+    def _use_local(self, host: str) -> bool:
+        if self.backend != "auto":
+            return self.backend == "local"
+        return self.stats is None or self.stats.prefers_local(host)
+
+    def _record(self, host: str, backend: str, ok: bool, attributes: Dict) -> None:
+        attributes["backend"] = backend
+        if self.stats is not None:
+            self.stats.record(host, backend, ok)
+
+    @staticmethod
+    def _unavailable(url: str, error: PageUnavailable, attributes: Dict) -> None:
+        logger.info(f"Skipping {url}: {error}")
+        attributes["backend"] = "local"
+        attributes["unavailable_reason"] = str(error)
+
+    def _fell_back(self, url: str, error: NeedsFallback, attributes: Dict) -> None:
+        if self.backend == "local":
+            raise RuntimeError(f"Local fetch failed: {error}") from error
+        logger.info(f"Fetching {url} through Firecrawl: {error}")
+        attributes["fallback_reason"] = str(error)
+        self._record(_host(url), "local", False, attributes)
+
+    def fetch(
+        self, url: str, timeout: float, firecrawl: Callable[[], str], attributes: Dict, validators: Dict | None = None
+    ) -> str:
+        """Return the page's markdown, calling firecrawl() if the local fetcher isn't used or falls back.
+
+        Args:
+            url: Page to fetch
+            timeout: Seconds allowed for the page request
+            firecrawl: Fetches the page through Firecrawl
+            attributes: Attributes of the current trace span; the backend used is recorded there
+            validators: Filled with the response's ETag/Last-Modified when the page is fetched locally
+
+        Raises:
+            PageUnavailable: If robots.txt disallows the page or the site has no HTML page there
+        """
+        host = _host(url)
+        if self._use_local(host):
+            try:
+                markdown = self.local.fetch(url, min(timeout, FETCH_LOCAL_TIMEOUT_SECONDS), validators)
+                self._record(host, "local", True, attributes)
+                return markdown
+            except PageUnavailable as e:
+                self._unavailable(url, e, attributes)
+                raise
+            except NeedsFallback as e:
+                self._fell_back(url, e, attributes)
+        try:
+            markdown = firecrawl()
+        except Exception:
+            self._record(host, "firecrawl", False, attributes)
+            raise
+        self._record(host, "firecrawl", bool(markdown), attributes)
+        return markdown
+
+    async def afetch(
+        self,
+        url: str,
+        timeout: float,
+        firecrawl: Callable[[], Awaitable[str]],
+        attributes: Dict,
+        validators: Dict | None = None,
+    ) -> str:
+        """Async fetch."""
+        host = _host(url)
+        if self._use_local(host):
+            try:
+                markdown = await self.local.afetch(url, min(timeout, FETCH_LOCAL_TIMEOUT_SECONDS), validators)
+                self._record(host, "local", True, attributes)
+                return markdown
+            except PageUnavailable as e:
+                self._unavailable(url, e, attributes)
+                raise
+            except NeedsFallback as e:
+                self._fell_back(url, e, attributes)
+        try:
+            markdown = await firecrawl()
+        except Exception:
+            self._record(host, "firecrawl", False, attributes)
+            raise
+        self._record(host, "firecrawl", bool(markdown), attributes)
+        return markdown
+
+
+@lru_cache(maxsize=1)
+def get_page_fetcher() -> PageFetcher:
+    return PageFetcher(FETCH_BACKEND, FetchStats(FETCH_STATS_PATH) if FETCH_STATS_PATH else None)
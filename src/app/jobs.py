@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List
+
+from cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+JOBS_PATH = os.getenv("JOBS_PATH", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Seconds finished jobs and their events are kept for reattaching
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(24 * 60 * 60)))
+# How often submissions also drop expired jobs, so a long-running process keeps applying JOB_RETENTION
+_PURGE_INTERVAL_SECONDS = 60 * 60
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    industry TEXT NOT NULL,
+    product_summary TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_key_status ON jobs (key, status);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+_JOB_COLUMNS = (
+    "id", "key", "mode", "industry", "product_summary", "status", "result", "error",
+    "created_at", "started_at", "finished_at",
+)
+
+
+def _job_key(mode: str, industry: str, product_summary: str) -> str:
+    return hashlib.sha256(f"{mode}\0{normalize_query(industry, product_summary)}".encode()).hexdigest()
+
+
+def _stream_for(mode: str):
+    if mode == "pipeline":
+        from pipeline import stream_competitor_analysis
+    else:
+        from agent import stream_competitor_analysis
+    return stream_competitor_analysis
+
+
+class JobQueue:
+    """Persistent queue of analysis jobs run by a local pool of worker threads.
+
+    Jobs and every (kind, label, detail) item they stream are stored in SQLite,
+    so a page can reattach to a job by ID after a rerun, a refresh or from
+    another session. Submitting a request that is already queued or running
+    returns the existing job instead of starting a second run.
+    """
+
+    def __init__(self, path: str, workers: int = JOB_WORKERS):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="analysis-job")
+        self._purge_expired()
+        self._resume_interrupted()
+
+    def submit(self, industry: str, product_summary: str, mode: str) -> str:
+        """Queue an analysis and return its job ID, or the ID of an identical job still in flight."""
+        key = _job_key(mode, industry, product_summary)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT id FROM jobs WHERE key = ? AND status IN {ACTIVE_STATUSES} ORDER BY created_at LIMIT 1",
+                (key,),
+            ).fetchone()
+            if row is not None:
+                logger.info(f"Coalescing request onto in-flight job {row[0]}")
+                return row[0]
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, key, mode, industry, product_summary, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, key, mode, industry, product_summary, time.time()),
+            )
+            self._conn.commit()
+        self._pool.submit(self._run, job_id)
+        if time.monotonic() - self._purged_at >= _PURGE_INTERVAL_SECONDS:
+            self._purge_expired()
+        return job_id
+
+    def get(self, job_id: str) -> Dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def events(self, job_id: str, after: int = 0) -> List[tuple[int, str, str, str]]:
+        """(seq, kind, label, detail) items the job has streamed, from seq `after` onwards."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, kind, label, detail FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+
+    def _append_event(self, job_id: str, seq: int, item: tuple) -> None:
+        kind, label, detail = item
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (job_id, seq, kind, label, detail) VALUES (?, ?, ?, ?, ?)",
+                (job_id, seq, kind, label, detail),
+            )
+            self._conn.commit()
+
+    def _set_status(self, job_id: str, status: str, **columns) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in ["status", *columns])
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", (status, *columns.values(), job_id)
+            )
+            self._conn.commit()
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        self._set_status(job_id, "running", started_at=time.time())
+        logger.info(f"Running job {job_id}")
+        result = ""
+        try:
+            for seq, item in enumerate(_stream_for(job["mode"])(job["industry"], job["product_summary"]), start=1):
+                self._append_event(job_id, seq, item)
+                if item[0] == "result":
+                    result = item[1]
+            self._set_status(job_id, "done", result=result, finished_at=time.time())
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self._set_status(job_id, "error", error=str(e), finished_at=time.time())
+
+    def _resume_interrupted(self) -> None:
+        # Jobs a previous process was running or had queued when it stopped start again from scratch
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status IN {ACTIVE_STATUSES} ORDER BY created_at"
+            ).fetchall()
+            for (job_id,) in rows:
+                self._conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+                self._conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ?", (job_id,))
+            self._conn.commit()
+        for (job_id,) in rows:
+            logger.info(f"Resuming interrupted job {job_id}")
+            self._pool.submit(self._run, job_id)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - JOB_RETENTION
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM events WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (cutoff,)
+            )
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+            self._purged_at = time.monotonic()
+
+
+@lru_cache(maxsize=1)
+def get_job_queue() -> JobQueue:
+    return JobQueue(JOBS_PATH or ":memory:")
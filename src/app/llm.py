@@ -0,0 +1,61 @@
+import time
+from typing import Tuple, Type
+
+from langchain_groq import ChatGroq
+
+from ratelimit import get_limiter, is_retryable
+from tracing import llm_span, record_usage
+
+
+class RateLimitedChatGroq(ChatGroq):
+    """ChatGroq whose requests share the Groq rate limit, concurrency cap and retry policy.
+
+    Covers plain, streamed, tool-calling and structured-output calls, since they
+    all go through these four methods. Each call is also recorded as a trace span.
+    """
+
+    # Errors a fallback model handles; the limiter raises them at once instead of retrying them
+    fallback_errors: Tuple[Type[BaseException], ...] = ()
+
+    def _retryable(self, e: BaseException) -> bool:
+        return is_retryable(e) and not isinstance(e, self.fallback_errors)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with llm_span(self.model_name) as attributes:
+            result = get_limiter("groq").call(
+                super()._generate, messages, stop, run_manager, retry_if=self._retryable, **kwargs
+            )
+            for generation in result.generations:
+                record_usage(attributes, generation.message)
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        with llm_span(self.model_name) as attributes:
+            result = await get_limiter("groq").acall(
+                super()._agenerate, messages, stop, run_manager, retry_if=self._retryable, **kwargs
+            )
+            for generation in result.generations:
+                record_usage(attributes, generation.message)
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._stream
+        with llm_span(self.model_name) as attributes:
+            started = time.monotonic()
+            for chunk in get_limiter("groq").stream(
+                lambda: parent(messages, stop, run_manager, **kwargs), self._retryable
+            ):
+                attributes.setdefault("first_token_ms", round((time.monotonic() - started) * 1000, 1))
+                record_usage(attributes, chunk.message)
+                yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._astream
+        with llm_span(self.model_name) as attributes:
+            started = time.monotonic()
+            async for chunk in get_limiter("groq").astream(
+                lambda: parent(messages, stop, run_manager, **kwargs), self._retryable
+            ):
+                attributes.setdefault("first_token_ms", round((time.monotonic() - started) * 1000, 1))
+                record_usage(attributes, chunk.message)
+                yield chunk
@@ -1,12 +1,55 @@
 import streamlit as st
-import pandas as pd
 import json
 from dotenv import load_dotenv
 load_dotenv()
-from constants import categories
-from agent import run_competitor_analysis, stream_competitor_analysis
-from pdf import create_pdf_report
-from email_sender import send_email_with_pdf
+from constants import categories, AGENT_MODE
+from jobs import ACTIVE_STATUSES, get_job_queue
+from warmup import start_background_warmup
+
+# pandas, the PDF renderer, the outbox and the whole LLM stack are imported on first use,
+# or ahead of it by the warm-up thread, so the first page renders straight away
+start_background_warmup()
+
+# Labels for the strategic analysis fields, in display order
+_STRATEGIC_LABELS = {
+    "market_positioning": "Market Positioning",
+    "competitive_advantages": "Competitive Advantages",
+    "areas_of_overlap": "Areas of Overlap",
+    "gaps_and_opportunities": "Gaps & Opportunities",
+    "recommended_differentiators": "Recommended Differentiators",
+    "go_to_market_strategy": "Go-to-Market Strategy",
+    "threat_assessment": "Threat Assessment",
+    "market_size_insights": "Market Size Insights",
+}
+
+
+def render_competitor(comp):
+    with st.expander(comp.get("name", "Unknown Competitor")):
+        st.write(f"**Website:** {comp.get('website_url', 'Not available')}")
+        st.write(f"**Description:** {comp.get('company_description', 'Not available')}")
+        st.write(f"**Key Features:** {', '.join(comp.get('key_features', []))}")
+        st.write(f"**Pricing Model:** {comp.get('pricing_model', 'Not specified')}")
+        st.write(f"**Target Market:** {comp.get('target_market', 'Not specified')}")
+        st.write(f"**Strengths:** {', '.join(comp.get('strengths', []))}")
+        st.write(f"**Weaknesses:** {', '.join(comp.get('weaknesses', []))}")
+        st.write(f"**Value Proposition:** {comp.get('unique_value_proposition', 'Not specified')}")
+        st.write(f"**Technology Stack:** {', '.join(comp.get('technology_stack', []))}")
+        st.write(f"**Market Position:** {comp.get('market_position', 'Not specified')}")
+
+
+def render_matrix(rows):
+    import pandas as pd
+
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+
+def render_strategic_field(field, value):
+    if field not in _STRATEGIC_LABELS:
+        return
+    if isinstance(value, list):
+        value = ", ".join(value)
+    st.write(f"**{_STRATEGIC_LABELS[field]}:** {value or 'Not provided'}")
+
 
 st.title("Competitor Analyser")
 
@@ -15,6 +58,10 @@ if 'analysis_data' not in st.session_state:
     st.session_state.analysis_data = None
     st.session_state.industry = None
     st.session_state.product_summary = None
+    st.session_state.raw_result = None
+    st.session_state.loaded_job_id = None
+    # Reattach to the job in the URL, e.g. after a refresh or from a shared link
+    st.session_state.job_id = st.query_params.get("job")
 
 # Dropdown for industry selection
 industry = st.selectbox(
@@ -33,6 +80,8 @@ product_summary = st.text_area(
     help="Keep it under 300 characters"
 )
 
+show_timings = st.checkbox("Show step timings", help="Wall time, tokens and bytes for each search, scrape and LLM call")
+
 # Analyse button to trigger agentic workflow
 if st.button(
     "🔍 Analyse Competitors", 
@@ -40,29 +89,81 @@ if st.button(
     use_container_width=True,
     disabled=not (industry and product_summary and len(product_summary.strip()) > 0)
 ):
-    result = ""
-    with st.status("Running competitor analysis...", expanded=True) as status:
-        for kind, label, detail in stream_competitor_analysis(industry, product_summary):
-            if kind == "step":
+    # Runs on the background worker pool; identical in-flight requests share one job
+    st.session_state.job_id = get_job_queue().submit(industry, product_summary, AGENT_MODE)
+    st.session_state.analysis_data = None
+    st.query_params["job"] = st.session_state.job_id
+
+
+def render_job_status(job, events, live_container):
+    """Rebuild the status panel from a job's streamed events.
+
+    While the job is running, completed parts of the analysis are also shown in
+    live_container; they are replaced by the full results once it finishes.
+    """
+    running = job["status"] in ACTIVE_STATUSES
+    if job["status"] == "done":
+        label, state = "✅ Analysis complete!", "complete"
+    elif job["status"] == "error":
+        label, state = f"❌ Analysis failed: {job['error']}", "error"
+    elif job["status"] == "queued":
+        label, state = "⏳ Waiting for a free worker...", "running"
+    else:
+        label, state = "Running competitor analysis...", "running"
+    with st.status(label, expanded=running, state=state):
+        for _, kind, label, detail in events:
+            if kind in ("competitor", "strategic"):
+                if running:
+                    with live_container:
+                        if kind == "competitor":
+                            render_competitor(json.loads(detail))
+                        else:
+                            render_strategic_field(label, json.loads(detail))
+            elif kind in ("step", "tool_result"):
                 st.write(label)
                 if detail:
                     st.caption(detail)
-            elif kind == "tool_result":
+            elif kind == "timings" and show_timings:
                 st.write(label)
-                if detail:
-                    st.caption(detail)
-            elif kind == "result":
-                result = label
-                status.update(label="✅ Analysis complete!", state="complete", expanded=False)
-    
+                render_matrix(json.loads(detail))
+
+
+def load_job_result(job):
+    st.session_state.loaded_job_id = job["id"]
+    st.session_state.raw_result = None
+    st.session_state.industry = job["industry"]
+    st.session_state.product_summary = job["product_summary"]
     try:
-        analysis_data = json.loads(result)
-        # Store in session state
-        st.session_state.analysis_data = analysis_data
-        st.session_state.industry = industry
-        st.session_state.product_summary = product_summary
+        st.session_state.analysis_data = json.loads(job["result"] or "")
     except json.JSONDecodeError:
-        st.write(result)
+        st.session_state.analysis_data = None
+        st.session_state.raw_result = job["result"]
+
+
+@st.fragment(run_every=1)
+def job_progress():
+    # Polls the job without rerunning the rest of the page, until it finishes
+    job = get_job_queue().get(st.session_state.job_id)
+    live_container = st.container()
+    render_job_status(job, get_job_queue().events(job["id"]), live_container)
+    if job["status"] not in ACTIVE_STATUSES:
+        load_job_result(job)
+        st.rerun(scope="app")
+
+
+job = get_job_queue().get(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    st.warning("That analysis is no longer available.")
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+elif job and job["status"] in ACTIVE_STATUSES:
+    job_progress()
+elif job:
+    if st.session_state.loaded_job_id != job["id"]:
+        load_job_result(job)
+    render_job_status(job, get_job_queue().events(job["id"]), None)
+    if st.session_state.raw_result and st.session_state.analysis_data is None:
+        st.write(st.session_state.raw_result)
 
 # Display results if analysis data exists in session state
 if st.session_state.analysis_data:
@@ -71,42 +172,27 @@ if st.session_state.analysis_data:
     # Display competitor summaries
     st.subheader("Competitor Summaries")
     for comp in analysis_data.get("competitor_summaries", []):
-        with st.expander(comp.get("name", "Unknown Competitor")):
-            st.write(f"**Website:** {comp.get('website_url', 'Not available')}")
-            st.write(f"**Description:** {comp.get('company_description', 'Not available')}")
-            st.write(f"**Key Features:** {', '.join(comp.get('key_features', []))}")
-            st.write(f"**Pricing Model:** {comp.get('pricing_model', 'Not specified')}")
-            st.write(f"**Target Market:** {comp.get('target_market', 'Not specified')}")
-            st.write(f"**Strengths:** {', '.join(comp.get('strengths', []))}")
-            st.write(f"**Weaknesses:** {', '.join(comp.get('weaknesses', []))}")
-            st.write(f"**Value Proposition:** {comp.get('unique_value_proposition', 'Not specified')}")
-            st.write(f"**Technology Stack:** {', '.join(comp.get('technology_stack', []))}")
-            st.write(f"**Market Position:** {comp.get('market_position', 'Not specified')}")
+        render_competitor(comp)
     
     # Display comparison matrix as dataframe
     st.subheader("Feature Comparison Matrix")
     if analysis_data.get("comparison_matrix"):
-        df = pd.DataFrame(analysis_data["comparison_matrix"])
-        st.dataframe(df, use_container_width=True)
+        render_matrix(analysis_data["comparison_matrix"])
     
     # Display strategic analysis
     st.subheader("Strategic Analysis")
     strategic = analysis_data.get("strategic_analysis", {})
-    st.write(f"**Market Positioning:** {strategic.get('market_positioning', 'Not provided')}")
-    st.write(f"**Competitive Advantages:** {', '.join(strategic.get('competitive_advantages', []))}")
-    st.write(f"**Areas of Overlap:** {', '.join(strategic.get('areas_of_overlap', []))}")
-    st.write(f"**Gaps & Opportunities:** {', '.join(strategic.get('gaps_and_opportunities', []))}")
-    st.write(f"**Recommended Differentiators:** {', '.join(strategic.get('recommended_differentiators', []))}")
-    st.write(f"**Go-to-Market Strategy:** {strategic.get('go_to_market_strategy', 'Not provided')}")
-    st.write(f"**Threat Assessment:** {strategic.get('threat_assessment', 'Not provided')}")
-    st.write(f"**Market Size Insights:** {strategic.get('market_size_insights', 'Not provided')}")
+    for field in _STRATEGIC_LABELS:
+        render_strategic_field(field, strategic.get(field))
     
     # # Action buttons
     # col1, col2 = st.columns(2)
     
     # with col1:
     if st.button("📩 Download Report", type="primary", use_container_width=True):
-        pdf_buffer = create_pdf_report(json.dumps(analysis_data), st.session_state.industry, st.session_state.product_summary)
+        from pdf import create_pdf_report
+
+        pdf_buffer = create_pdf_report(analysis_data, st.session_state.industry, st.session_state.product_summary)
         st.download_button(
             label="Download PDF Report",
             data=pdf_buffer,
@@ -119,14 +205,28 @@ if st.session_state.analysis_data:
     email_col1, email_col2 = st.columns([3, 1])
     
     with email_col1:
-        recipient_email = st.text_input("Enter recipient email:", key="email_input")
+        recipient_email = st.text_input("Enter recipient emails (comma-separated):", key="email_input")
     
     with email_col2:
         st.write("")
         if st.button("🚀", help="Send Email", disabled=not recipient_email):
+            from outbox import get_outbox, split_recipients
+            from pdf import render_pdf
+
             try:
-                pdf_buffer = create_pdf_report(json.dumps(analysis_data), st.session_state.industry, st.session_state.product_summary)
-                send_email_with_pdf(pdf_buffer, recipient_email, st.session_state.industry)
-                st.success("Email sent successfully!")
+                pdf = render_pdf(analysis_data, st.session_state.industry, st.session_state.product_summary)
+                recipients = split_recipients(recipient_email)
+                st.session_state.email_ids = get_outbox().enqueue(pdf, recipients, st.session_state.industry)
+                st.success(f"Report queued for {len(recipients)} recipient(s)!")
             except Exception as e:
-                st.error(f"Failed to send email: {e}")
\ No newline at end of file
+                st.error(f"Failed to queue email: {e}")
+
+    # Delivery happens in the background; show how the last batch is getting on
+    if st.session_state.get("email_ids"):
+        from outbox import get_outbox
+
+        messages = [get_outbox().get(message_id) for message_id in st.session_state.email_ids]
+        st.caption(" · ".join(
+            f"{message['recipient']}: {message['status']}" + (f" ({message['error']})" if message["error"] else "")
+            for message in messages if message
+        ))
\ No newline at end of file
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from cache import normalize_query, normalize_url
+from models import AgentResponse, CompetitorSummary, SynthesisResponse
+from packing import pack_competitor_data
+from repair import ainvoke_structured, invoke_structured, normalise_matrix
+from snapshots import content_hash, get_snapshot_store
+from streaming import emit
+from tracing import in_context, span
+
+logger = logging.getLogger(__name__)
+
+MAX_EXTRACTION_WORKERS = int(os.getenv("MAX_EXTRACTION_WORKERS", "8"))
+# Prompt tokens of page content given to each per-competitor extraction
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "1500"))
+
+_EXTRACTION_PROMPT_TEMPLATE = """
+You are an expert in competitive intelligence and product analysis.
+
+Profile the single competitor below based strictly on the scraped page content.
+Do NOT hallucinate features or assumptions that are not directly supported by the data.
+Use "Not specified" (or an empty list) for anything the page does not mention.
+
+--------------------
+CONTEXT ON USER'S STARTUP
+--------------------
+Industry: {industry}
+Product Summary: {product_summary}
+
+--------------------
+COMPETITOR PAGE
+--------------------
+{competitor_data}
+
+--------------------
+OUTPUT REQUIREMENTS
+--------------------
+Company name and website URL, company description and business model, key features,
+pricing model, target market, strengths, weaknesses, unique value proposition,
+technology stack and market position (leader, challenger, niche player).
+"""
+
+_SYNTHESIS_PROMPT_TEMPLATE = """
+You are an expert in competitive intelligence, product analysis, and strategic positioning.
+
+Using only the competitor profiles below, compare the competitors with the user's startup
+and produce a strategic analysis.
+
+--------------------
+CONTEXT ON USER'S STARTUP
+--------------------
+Industry: {industry}
+Product Summary: {product_summary}
+
+--------------------
+COMPETITOR PROFILES
+--------------------
+{competitor_summaries}
+
+--------------------
+OUTPUT REQUIREMENTS
+--------------------
+1. Feature comparison matrix as list of objects like:
+   [{{"Feature": "Computer Vision", "Your Product": "✓", "Competitor 1": "✗"}}]
+   Use the competitor names as keys, ✓ for present, ✗ for absent, ? for unclear
+2. Strategic analysis: market positioning, competitive advantages, areas of overlap,
+   gaps and opportunities, recommended differentiators, go-to-market strategy,
+   threat assessment, market size insights and next steps
+"""
+
+
+def _build_extraction_prompt(industry: str, product_summary: str, page: Dict) -> str:
+    return _EXTRACTION_PROMPT_TEMPLATE.format(
+        industry=industry,
+        product_summary=product_summary,
+        competitor_data=pack_competitor_data([page], product_summary, budget=PAGE_TOKEN_BUDGET),
+    )
+
+
+def _build_synthesis_prompt(industry: str, product_summary: str, summaries: List[CompetitorSummary]) -> str:
+    return _SYNTHESIS_PROMPT_TEMPLATE.format(
+        industry=industry,
+        product_summary=product_summary,
+        competitor_summaries="\n\n".join(summary.model_dump_json() for summary in summaries),
+    )
+
+
+def _extractable_pages(competitor_data: List[Dict], industry: str) -> List[Dict]:
+    pages = [page for page in competitor_data if page.get("content") and "error" not in page]
+    logger.info(f"Extracting {len(pages)} competitors in parallel for industry: {industry}")
+    return pages
+
+
+def _combine(summaries: List[CompetitorSummary], synthesis: SynthesisResponse) -> AgentResponse:
+    """Emit the strategic fields and assemble the full response from the extraction and synthesis results."""
+    for field, value in synthesis.strategic_analysis.model_dump().items():
+        emit({"strategic": {field: value}})
+    return AgentResponse(
+        competitor_summaries=summaries,
+        comparison_matrix=normalise_matrix(synthesis.comparison_matrix, [summary.name for summary in summaries]),
+        strategic_analysis=synthesis.strategic_analysis,
+    )
+
+
+def _snapshot_key(industry: str, product_summary: str, page: Dict) -> tuple[str, str, str]:
+    return normalize_url(page["url"]), normalize_query(industry, product_summary), content_hash(page["content"])
+
+
+def _previous_summary(key: tuple[str, str, str], attributes: Dict) -> CompetitorSummary | None:
+    # A page whose content is unchanged since the last run keeps the summary extracted then
+    snapshots = get_snapshot_store()
+    previous = snapshots.summary(*key) if snapshots else None
+    attributes["reused"] = previous is not None
+    return previous
+
+
+def _record_summary(key: tuple[str, str, str], summary: CompetitorSummary) -> None:
+    snapshots = get_snapshot_store()
+    if snapshots:
+        snapshots.record_summary(*key, summary)
+
+
+def _extract_competitor(industry: str, product_summary: str, page: Dict) -> CompetitorSummary:
+    from constants import get_llm
+
+    key = _snapshot_key(industry, product_summary, page)
+    with span("extract", page["url"]) as attributes:
+        previous = _previous_summary(key, attributes)
+        if previous is not None:
+            return previous
+        prompt = _build_extraction_prompt(industry, product_summary, page)
+        summary = invoke_structured(get_llm("extractor"), CompetitorSummary, prompt)
+    _record_summary(key, summary)
+    return summary
+
+
+async def _aextract_competitor(industry: str, product_summary: str, page: Dict) -> CompetitorSummary:
+    from constants import get_llm
+
+    key = _snapshot_key(industry, product_summary, page)
+    with span("extract", page["url"]) as attributes:
+        previous = _previous_summary(key, attributes)
+        if previous is not None:
+            return previous
+        prompt = _build_extraction_prompt(industry, product_summary, page)
+        summary = await ainvoke_structured(get_llm("extractor"), CompetitorSummary, prompt)
+    _record_summary(key, summary)
+    return summary
+
+
+def _extract_all(industry: str, product_summary: str, pages: List[Dict]) -> List[CompetitorSummary]:
+    """Run one extraction per page concurrently, dropping pages whose extraction failed."""
+    if not pages:
+        return []
+    summaries: Dict[int, CompetitorSummary] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_EXTRACTION_WORKERS, len(pages)))) as pool:
+        futures = {
+            pool.submit(in_context(_extract_competitor), industry, product_summary, page): i
+            for i, page in enumerate(pages)
+        }
+        # Emit from this thread: the graph's stream writer isn't visible in the workers
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+                emit({"competitor": summaries[i].model_dump()})
+            except Exception as e:
+                logger.warning(f"Failed to extract competitor from {pages[i]['url']}: {e}")
+    return [summaries[i] for i in sorted(summaries)]
+
+
+async def _aextract_all(industry: str, product_summary: str, pages: List[Dict]) -> List[CompetitorSummary]:
+    """Async _extract_all, with at most MAX_EXTRACTION_WORKERS extractions in flight."""
+    semaphore = asyncio.Semaphore(MAX_EXTRACTION_WORKERS)
+    summaries: Dict[int, CompetitorSummary] = {}
+
+    async def extract(i: int) -> None:
+        async with semaphore:
+            try:
+                summaries[i] = await _aextract_competitor(industry, product_summary, pages[i])
+                emit({"competitor": summaries[i].model_dump()})
+            except Exception as e:
+                logger.warning(f"Failed to extract competitor from {pages[i]['url']}: {e}")
+
+    await asyncio.gather(*(extract(i) for i in range(len(pages))))
+    return [summaries[i] for i in sorted(summaries)]
+
+
+def _synthesise(industry: str, product_summary: str, summaries: List[CompetitorSummary]) -> SynthesisResponse:
+    from constants import get_llm
+
+    prompt = _build_synthesis_prompt(industry, product_summary, summaries)
+    with span("synthesise", competitors=len(summaries)):
+        return invoke_structured(get_llm("synthesiser"), SynthesisResponse, prompt)
+
+
+async def _asynthesise(industry: str, product_summary: str, summaries: List[CompetitorSummary]) -> SynthesisResponse:
+    from constants import get_llm
+
+    prompt = _build_synthesis_prompt(industry, product_summary, summaries)
+    with span("synthesise", competitors=len(summaries)):
+        return await ainvoke_structured(get_llm("synthesiser"), SynthesisResponse, prompt)
+
+
+def analyse_map_reduce(industry: str, product_summary: str, competitor_data: List[Dict]) -> AgentResponse:
+    """Extract each competitor in parallel, then build the matrix and strategy in one call.
+
+    Wall-clock is roughly the slowest single extraction plus the merge call,
+    so it scales to many more competitors than a single structured call.
+    """
+    pages = _extractable_pages(competitor_data, industry)
+    summaries = _extract_all(industry, product_summary, pages)
+    if not summaries:
+        raise RuntimeError("No competitor could be extracted from the scraped pages")
+    synthesis = _synthesise(industry, product_summary, summaries)
+    return _combine(summaries, synthesis)
+
+
+async def aanalyse_map_reduce(industry: str, product_summary: str, competitor_data: List[Dict]) -> AgentResponse:
+    """Async analyse_map_reduce."""
+    pages = _extractable_pages(competitor_data, industry)
+    summaries = await _aextract_all(industry, product_summary, pages)
+    if not summaries:
+        raise RuntimeError("No competitor could be extracted from the scraped pages")
+    synthesis = await _asynthesise(industry, product_summary, summaries)
+    return _combine(summaries, synthesis)
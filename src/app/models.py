@@ -31,4 +31,9 @@ class AgentResponse(BaseModel):
     """Response model for the agent"""
     competitor_summaries: List[CompetitorSummary]
     comparison_matrix: List[Dict[str, str]]
-    strategic_analysis: StrategicAnalysis
\ No newline at end of file
+    strategic_analysis: StrategicAnalysis
+
+class SynthesisResponse(BaseModel):
+    """Comparison matrix and strategic analysis built from existing competitor summaries"""
+    comparison_matrix: List[Dict[str, str]]
+    strategic_analysis: StrategicAnalysis
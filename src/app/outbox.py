@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import os
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, List
+
+from email_sender import build_email_message, smtp_connection
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", ".cache/outbox.sqlite3")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+# Messages sent over one SMTP connection before it is reopened
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# Seconds sent and failed messages are kept for status checks
+OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 60 * 60)))
+# How often the sender drops messages older than OUTBOX_RETENTION, so a long-running process keeps applying it
+_PURGE_INTERVAL_SECONDS = 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attachments (
+    hash TEXT PRIMARY KEY,
+    pdf BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    industry TEXT NOT NULL,
+    attachment TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt_at);
+"""
+
+_MESSAGE_COLUMNS = (
+    "id", "recipient", "industry", "status", "attempts", "next_attempt_at", "error", "created_at", "sent_at",
+)
+
+
+def split_recipients(text: str) -> List[str]:
+    """Addresses from a comma, semicolon or whitespace separated list, deduplicated in order."""
+    return list(dict.fromkeys(address for address in re.split(r"[\s,;]+", text) if address))
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # SMTPException subclasses OSError, so only socket-level OSErrors count as transient here
+    return isinstance(error, smtplib.SMTPServerDisconnected) or (
+        isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+    )
+
+
+class _ConnectionLost(Exception):
+    pass
+
+
+class Outbox:
+    """Persistent email queue drained by a background sender thread.
+
+    Each recipient of a report gets its own message row, while the PDF is
+    stored once. The sender sends every due message over one authenticated
+    SMTP connection, in batches of OUTBOX_BATCH_SIZE. Transient failures (4xx
+    replies, dropped connections) are retried with exponential backoff, up to
+    OUTBOX_MAX_ATTEMPTS times. Permanent ones fail the message straight away.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._purge_expired()
+        self._sender = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+        self._sender.start()
+
+    def enqueue(self, pdf: bytes, recipients: List[str], industry: str) -> List[str]:
+        """Queue the report for each recipient and return the message IDs."""
+        digest = hashlib.sha256(pdf).hexdigest()
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in recipients]
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO attachments (hash, pdf) VALUES (?, ?)", (digest, pdf))
+            self._conn.executemany(
+                "INSERT INTO messages (id, recipient, industry, attachment, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                [(message_id, recipient, industry, digest, now, now) for message_id, recipient in zip(ids, recipients)],
+            )
+            self._conn.commit()
+        logger.info(f"Queued report for {len(recipients)} recipients")
+        self._wake.set()
+        return ids
+
+    def get(self, message_id: str) -> Dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_MESSAGE_COLUMNS)} FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+        return dict(zip(_MESSAGE_COLUMNS, row)) if row else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE status = 'queued'").fetchone()[0]
+
+    def _due(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT m.id, m.recipient, m.industry, m.attempts, a.pdf FROM messages m "
+                "JOIN attachments a ON a.hash = m.attachment "
+                "WHERE m.status = 'queued' AND m.next_attempt_at <= ? ORDER BY m.next_attempt_at LIMIT ?",
+                (time.time(), max(1, OUTBOX_BATCH_SIZE)),
+            ).fetchall()
+
+    def _seconds_until_due(self) -> float:
+        with self._lock:
+            (next_attempt_at,) = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM messages WHERE status = 'queued'"
+            ).fetchone()
+        if next_attempt_at is None:
+            return _PURGE_INTERVAL_SECONDS
+        return min(_PURGE_INTERVAL_SECONDS, max(0.0, next_attempt_at - time.time()))
+
+    def _update(self, message_id: str, status: str, **columns) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in ["status", *columns])
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE messages SET {assignments} WHERE id = ?", (status, *columns.values(), message_id)
+            )
+            self._conn.commit()
+
+    def _failed_attempt(self, message_id: str, attempts: int, error: Exception) -> None:
+        attempts += 1
+        if _is_transient(error) and attempts < OUTBOX_MAX_ATTEMPTS:
+            delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+            logger.warning(f"Email {message_id} failed ({error}), retrying in {delay:g}s")
+            self._update(message_id, "queued", attempts=attempts, error=str(error), next_attempt_at=time.time() + delay)
+        else:
+            logger.error(f"Email {message_id} failed after {attempts} attempts: {error}")
+            self._update(message_id, "failed", attempts=attempts, error=str(error))
+
+    def _send(self, server: smtplib.SMTP, message: tuple) -> None:
+        message_id, recipient, industry, attempts, pdf = message
+        try:
+            server.send_message(build_email_message(pdf, recipient, industry))
+        except smtplib.SMTPServerDisconnected as e:
+            raise _ConnectionLost() from e
+        except smtplib.SMTPException as e:
+            self._failed_attempt(message_id, attempts, e)
+            return
+        except OSError as e:
+            raise _ConnectionLost() from e
+        self._update(message_id, "sent", attempts=attempts + 1, error=None, sent_at=time.time())
+        logger.info(f"Email {message_id} sent to {recipient}")
+
+    def _send_due(self) -> None:
+        while due := self._due():
+            remaining = list(due)
+            try:
+                with smtp_connection() as server:
+                    while remaining:
+                        self._send(server, remaining[0])
+                        remaining.pop(0)
+            except Exception as e:
+                # Connecting, logging in or the connection itself failed: retry what wasn't sent later
+                error = e.__cause__ if isinstance(e, _ConnectionLost) else e
+                logger.warning(f"SMTP connection failed with {len(remaining)} emails unsent: {error}")
+                for message_id, _, _, attempts, _ in remaining:
+                    self._failed_attempt(message_id, attempts, error)
+
+    def _run(self) -> None:
+        purged_at = time.monotonic()
+        while True:
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+            try:
+                self._send_due()
+                if time.monotonic() - purged_at >= _PURGE_INTERVAL_SECONDS:
+                    self._purge_expired()
+                    purged_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Outbox sender failed: {e}")
+                time.sleep(OUTBOX_RETRY_BASE_SECONDS)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - OUTBOX_RETENTION
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE status != 'queued' AND created_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM attachments WHERE hash NOT IN (SELECT attachment FROM messages)")
+            self._conn.commit()
+
+
+@lru_cache(maxsize=1)
+def get_outbox() -> Outbox:
+    return Outbox(OUTBOX_PATH or ":memory:")
@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+import tiktoken
+
+from extract import section_kinds, split_sections
+
+logger = logging.getLogger(__name__)
+
+# Total prompt tokens shared by all competitors' page content
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("ANALYSIS_TOKEN_BUDGET", "3000"))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or our that the this to we with you your".split()
+)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Encoding files are downloaded on first use; fall back to an estimate offline
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    return len(encoding.encode(text)) if encoding else len(text) // 4
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of text, without stop words."""
+    return [term for term in _WORD_RE.findall(text.lower()) if term not in _STOP_WORDS]
+
+
+def _terms(text: str) -> set:
+    return set(tokenize(text))
+
+
+def _score_section(section: str, index: int, query_terms: set) -> float:
+    terms = _terms(section)
+    score = len(terms & query_terms) / (len(query_terms) or 1)
+    if section_kinds(section):
+        score += 1.0
+    if index == 0:
+        # The opening section usually carries the company description
+        score += 0.5
+    return score
+
+
+def _fair_shares(needs: List[int], budget: int) -> List[int]:
+    """Split budget evenly, handing what small pages don't need to the larger ones."""
+    shares = [0] * len(needs)
+    remaining = list(range(len(needs)))
+    while remaining and budget > 0:
+        share = budget // len(remaining)
+        if share == 0:
+            break
+        satisfied = [i for i in remaining if needs[i] <= share]
+        if not satisfied:
+            for i in remaining:
+                shares[i] = share
+            break
+        for i in satisfied:
+            shares[i] = needs[i]
+            budget -= needs[i]
+        remaining = [i for i in remaining if i not in satisfied]
+    return shares
+
+
+def _pack_page(sections: List[str], product_terms: set, max_tokens: int) -> str:
+    ranked = sorted(
+        range(len(sections)),
+        key=lambda i: _score_section(sections[i], i, product_terms),
+        reverse=True,
+    )
+    chosen: Dict[int, str] = {}
+    used = 0
+    for i in ranked:
+        # Count the newline joining the section to those already chosen, so the packed page stays within max_tokens
+        tokens = count_tokens(sections[i]) + (1 if chosen else 0)
+        if used + tokens <= max_tokens:
+            chosen[i] = sections[i]
+            used += tokens
+        elif not chosen:
+            # Always keep something from the most relevant section
+            chosen[i] = _truncate_tokens(sections[i], max_tokens)
+            break
+    # Keep the page's own reading order
+    return "\n".join(chosen[i] for i in sorted(chosen))
+
+
+def pack_competitor_data(
+    competitor_data: List[Dict],
+    product_summary: str,
+    budget: int = ANALYSIS_TOKEN_BUDGET,
+) -> str:
+    """Render scraped pages as prompt text that fits within a token budget.
+
+    Each extracted page is split into sections, sections are ranked by
+    relevance to the product summary (pricing and feature sections first), and
+    the budget is shared fairly so one long page can't crowd out the others.
+    """
+    pages = [page for page in competitor_data if page.get("content") and "error" not in page]
+    if not pages:
+        return "No competitor content available."
+
+    # Pages were already cleaned and de-duplicated when they were extracted
+    sectioned = [split_sections(page["content"]) for page in pages]
+    needs = [count_tokens("\n".join(sections)) for sections in sectioned]
+    shares = _fair_shares(needs, budget)
+    product_terms = _terms(product_summary)
+
+    blocks = []
+    for n, (page, sections, share) in enumerate(zip(pages, sectioned, shares), start=1):
+        packed = _pack_page(sections, product_terms, share)
+        blocks.append(f"### Competitor {n}: {page['url']}\n{packed}")
+    logger.info(f"Packed {len(pages)} pages into ~{sum(shares)} of {budget} tokens")
+    return "\n\n".join(blocks)
@@ -1,14 +1,53 @@
+import hashlib
 import json
 import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
-from typing import List, Dict
+from typing import BinaryIO, List, Dict
+from xml.sax.saxutils import escape
 
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
 
+from models import AgentResponse
+from repair import normalise_matrix
+
 logger = logging.getLogger(__name__)
 
+# Rendered reports kept in memory, keyed by a hash of their content
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "32"))
+# Competitor columns per comparison-matrix table; wider matrices are split into several tables
+MATRIX_COLUMNS_PER_TABLE = int(os.getenv("MATRIX_COLUMNS_PER_TABLE", "5"))
+
+# Left plus right padding of a table cell, in points
+_CELL_PADDING = 12
+
+_pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    return getSampleStyleSheet()
+
+
+def _as_dict(analysis: AgentResponse | Dict | str) -> Dict:
+    if isinstance(analysis, AgentResponse):
+        return analysis.model_dump()
+    if isinstance(analysis, str):
+        return json.loads(analysis)
+    return analysis
+
+
+def _report_key(analysis_data: Dict, industry: str, product_summary: str) -> str:
+    content = json.dumps([analysis_data, industry, product_summary], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
 
 def _build_competitor_elements(competitors: List[Dict], styles) -> list:
     elements = []
@@ -26,11 +65,39 @@ def _build_competitor_elements(competitors: List[Dict], styles) -> list:
     return elements
 
 
-def _build_matrix_table(comparison_matrix: List[Dict]) -> Table | None:
+def _matrix_cell(value, width: float, style) -> str | Paragraph:
+    # Paragraphs are slow to lay out, so only text too long for one line of its column gets one
+    text = str(value)
+    if stringWidth(text, style.fontName, style.fontSize) <= width - _CELL_PADDING:
+        return text
+    return Paragraph(escape(text), style)
+
+
+def _build_matrix_tables(comparison_matrix: List[Dict], competitors: List[str], styles) -> List[Table]:
+    """One table per MATRIX_COLUMNS_PER_TABLE competitors, each repeating the feature and own-product columns.
+
+    Features are rows, so a long matrix flows across pages with its header
+    repeated, and a matrix of any width stays within the page. Rows are
+    normalised first, so rows with missing, extra or differently spelt keys
+    still line up. Values too long for their column wrap onto several lines.
+    """
+    comparison_matrix = normalise_matrix(comparison_matrix, competitors)
     if not comparison_matrix:
-        return None
-    matrix_rows = [[key] + [row[key] for row in comparison_matrix] for key in comparison_matrix[0].keys()]
-    return Table(matrix_rows)
+        return []
+    columns = list(comparison_matrix[0])
+    fixed = [column for column in columns if column in ("Feature", "Your Product")]
+    competitors = [column for column in columns if column not in fixed]
+    per_table = max(1, MATRIX_COLUMNS_PER_TABLE)
+    width = letter[0] - 2 * 72
+    tables = []
+    for start in range(0, max(1, len(competitors)), per_table):
+        chunk = fixed + competitors[start:start + per_table]
+        first_width = width * 0.35
+        widths = [first_width, *[(width - first_width) / max(1, len(chunk) - 1)] * (len(chunk) - 1)]
+        rows = [chunk] + [[row[key] for key in chunk] for row in comparison_matrix]
+        rows = [[_matrix_cell(cell, w, styles["BodyText"]) for cell, w in zip(row, widths)] for row in rows]
+        tables.append(Table(rows, colWidths=widths, repeatRows=1))
+    return tables
 
 
 def _build_strategic_elements(strategic: Dict, styles) -> list:
@@ -46,45 +113,89 @@ def _build_strategic_elements(strategic: Dict, styles) -> list:
     return elements
 
 
-def create_pdf_report(analysis_json: str, industry: str, product_summary: str) -> BytesIO:
-    """Build a PDF report from the analysis JSON string.
+def _build_elements(analysis_data: Dict, product_summary: str) -> list:
+    styles = _styles()
+    elements = []
+
+    elements.append(Paragraph("Competitor Analysis Report", styles["Title"]))
+    elements.append(Spacer(1, 12))
+
+    elements.append(Paragraph("Product Summary", styles["Heading2"]))
+    elements.append(Paragraph(product_summary, styles["BodyText"]))
+    elements.append(Spacer(1, 12))
+
+    elements.append(Paragraph("Competitor Summaries", styles["Heading2"]))
+    elements.extend(_build_competitor_elements(analysis_data.get("competitor_summaries", []), styles))
+
+    elements.append(Paragraph("Comparison Matrix", styles["Heading2"]))
+    competitors = [summary.get("name", "") for summary in analysis_data.get("competitor_summaries", [])]
+    for table in _build_matrix_tables(analysis_data.get("comparison_matrix", []), competitors, styles):
+        elements.append(table)
+        elements.append(Spacer(1, 6))
+
+    elements.append(Paragraph("Strategic Analysis", styles["Heading2"]))
+    elements.extend(_build_strategic_elements(analysis_data.get("strategic_analysis", {}), styles))
+    return elements
+
+
+def write_pdf_report(
+    analysis: AgentResponse | Dict | str, industry: str, product_summary: str, output: str | BinaryIO
+) -> None:
+    """Render the report straight into a file, without going through the in-memory cache.
 
     Args:
-        analysis_json: JSON string from analyse_competitors
+        analysis: The AgentResponse, its dict form or its JSON string
         industry: Industry label (used in report header)
         product_summary: Product description shown near the top of the report
-
-    Returns:
-        BytesIO containing the rendered PDF
+        output: Path or writable binary file the PDF is written to
     """
     try:
-        analysis_data = json.loads(analysis_json)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        elements.append(Paragraph("Competitor Analysis Report", styles["Title"]))
-        elements.append(Spacer(1, 12))
-
-        elements.append(Paragraph("Product Summary", styles["Heading2"]))
-        elements.append(Paragraph(product_summary, styles["BodyText"]))
-        elements.append(Spacer(1, 12))
-
-        elements.append(Paragraph("Competitor Summaries", styles["Heading2"]))
-        elements.extend(_build_competitor_elements(analysis_data.get("competitor_summaries", []), styles))
+        SimpleDocTemplate(output, pagesize=letter).build(_build_elements(_as_dict(analysis), product_summary))
+    except Exception as e:
+        logger.error(f"Failed to create PDF report: {e}")
+        raise RuntimeError(f"Failed to create PDF report: {e}") from e
 
-        elements.append(Paragraph("Comparison Matrix", styles["Heading2"]))
-        matrix_table = _build_matrix_table(analysis_data.get("comparison_matrix", []))
-        if matrix_table:
-            elements.append(matrix_table)
 
-        elements.append(Paragraph("Strategic Analysis", styles["Heading2"]))
-        elements.extend(_build_strategic_elements(analysis_data.get("strategic_analysis", {}), styles))
+def render_pdf(analysis: AgentResponse | Dict | str, industry: str, product_summary: str) -> bytes:
+    """Render the report to bytes, reusing an earlier rendering of identical content.
 
-        pdf_buffer = BytesIO()
-        SimpleDocTemplate(pdf_buffer, pagesize=letter).build(elements)
-        pdf_buffer.seek(0)
-        return pdf_buffer
+    Args:
+        analysis: The AgentResponse, its dict form or its JSON string
+        industry: Industry label (used in report header)
+        product_summary: Product description shown near the top of the report
 
+    Returns:
+        The rendered PDF
+    """
+    try:
+        analysis_data = _as_dict(analysis)
+        key = _report_key(analysis_data, industry, product_summary)
     except Exception as e:
         logger.error(f"Failed to create PDF report: {e}")
         raise RuntimeError(f"Failed to create PDF report: {e}") from e
+    with _pdf_cache_lock:
+        if key in _pdf_cache:
+            _pdf_cache.move_to_end(key)
+            return _pdf_cache[key]
+    buffer = BytesIO()
+    write_pdf_report(analysis_data, industry, product_summary, buffer)
+    pdf = buffer.getvalue()
+    with _pdf_cache_lock:
+        _pdf_cache[key] = pdf
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+    return pdf
+
+
+def create_pdf_report(analysis: AgentResponse | Dict | str, industry: str, product_summary: str) -> BytesIO:
+    """Build a PDF report from the analysis.
+
+    Args:
+        analysis: The AgentResponse, its dict form or the JSON string from analyse_competitors
+        industry: Industry label (used in report header)
+        product_summary: Product description shown near the top of the report
+
+    Returns:
+        BytesIO containing the rendered PDF
+    """
+    return BytesIO(render_pdf(analysis, industry, product_summary))
@@ -0,0 +1,199 @@
+import logging
+from functools import lru_cache
+from typing import AsyncGenerator, Callable, Dict, Generator, List, TypedDict
+
+from langgraph.graph import StateGraph, START, END
+
+from checkpoint import NotResumable, aresume_input, checkpointed_run, get_checkpointer, resume_input
+from clients import get_firecrawl_client, get_tavily_client
+from result_cache import cached_analysis, cached_analysis_stream
+from streaming import custom_event_items
+from tracing import traced_analysis
+from tools import _search, _scrape_many, _analyse, _asearch, _ascrape_many, _aanalyse
+
+logger = logging.getLogger(__name__)
+
+# Human-readable labels for each node shown in the UI
+_NODE_LABELS = {
+    "search": "🔎 Searching for competitors...",
+    "scrape": "🌐 Scraping {count} pages...",
+    "analyse": "🧠 Analysing competitors...",
+}
+_RESUMING_LABEL = "♻️ Resuming from the last completed step..."
+
+
+class PipelineState(TypedDict, total=False):
+    industry: str
+    product_summary: str
+    urls: List[str]
+    competitor_data: List[Dict]
+    analysis: str
+
+
+def _search_node(state: PipelineState) -> Dict:
+    return {"urls": _search(state["industry"], state["product_summary"], get_tavily_client())}
+
+
+async def _asearch_node(state: PipelineState) -> Dict:
+    return {"urls": await _asearch(state["industry"], state["product_summary"])}
+
+
+def _scrape_node(state: PipelineState) -> Dict:
+    return {"competitor_data": _scrape_many(state.get("urls", []), get_firecrawl_client())}
+
+
+async def _ascrape_node(state: PipelineState) -> Dict:
+    return {"competitor_data": await _ascrape_many(state.get("urls", []))}
+
+
+def _scraped_pages(state: PipelineState) -> List[Dict]:
+    pages = [page for page in state.get("competitor_data", []) if "error" not in page]
+    if not pages:
+        # Resuming would analyse the same failed scrapes again, so the next run has to search and scrape afresh
+        raise NotResumable("Failed to analyse competitors: no competitor pages could be scraped")
+    return pages
+
+
+def _analyse_node(state: PipelineState) -> Dict:
+    analysis = _analyse(state["industry"], state["product_summary"], _scraped_pages(state))
+    return {"analysis": analysis.model_dump_json()}
+
+
+async def _aanalyse_node(state: PipelineState) -> Dict:
+    analysis = await _aanalyse(state["industry"], state["product_summary"], _scraped_pages(state))
+    return {"analysis": analysis.model_dump_json()}
+
+
+def _build_pipeline(search: Callable, scrape: Callable, analyse: Callable):
+    # Fixed search → scrape → analyse order; the LLM is only called in analyse
+    graph = StateGraph(PipelineState)
+    graph.add_node("search", search)
+    graph.add_node("scrape", scrape)
+    graph.add_node("analyse", analyse)
+    graph.add_edge(START, "search")
+    graph.add_edge("search", "scrape")
+    graph.add_edge("scrape", "analyse")
+    graph.add_edge("analyse", END)
+    # Checkpoints after every node, so a failed analyse step can be retried without searching and scraping again
+    return graph.compile(checkpointer=get_checkpointer())
+
+
+@lru_cache(maxsize=1)
+def _get_pipeline():
+    return _build_pipeline(_search_node, _scrape_node, _analyse_node)
+
+
+@lru_cache(maxsize=1)
+def _get_async_pipeline():
+    return _build_pipeline(_asearch_node, _ascrape_node, _aanalyse_node)
+
+
+def _node_label(name: str, state: Dict) -> str:
+    template = _NODE_LABELS.get(name, f"⚙️ Running {name}...")
+    return template.format(count=len(state.get("urls", [])))
+
+
+def _node_result_preview(name: str, result: Dict) -> str:
+    if "urls" in result:
+        return ", ".join(result["urls"])
+    if "competitor_data" in result:
+        failed = sum(1 for page in result["competitor_data"] if "error" in page)
+        return f"{len(result['competitor_data']) - failed} scraped, {failed} failed"
+    return str(result.get("analysis", ""))[:120].replace("\n", " ")
+
+
+def _event_items(mode: str, event: Dict) -> List[tuple[str, str, str]]:
+    """UI items for one streamed event; the analysis JSON comes back as a ("final", ...) item."""
+    # Completed parts of the analysis, streamed while the analyse node is running
+    if mode == "custom":
+        return custom_event_items(event)
+
+    name = event["name"]
+
+    # Node is about to run
+    if "input" in event:
+        return [("step", _node_label(name, event["input"]), "")]
+
+    # Node has finished
+    if event.get("error"):
+        return []
+    result = dict(event.get("result") or {})
+    items = [("tool_result", f"✅ Finished {name}", _node_result_preview(name, result))]
+    if "analysis" in result:
+        items.append(("final", result["analysis"], ""))
+    return items
+
+
+@cached_analysis
+@traced_analysis
+def run_competitor_analysis(industry: str, product_summary: str) -> str:
+    """Run the deterministic pipeline and return the analysis JSON string.
+
+    Same interface as agent.run_competitor_analysis, but without ReAct planning turns.
+    """
+    graph = _get_pipeline()
+    with checkpointed_run("pipeline", industry, product_summary) as config:
+        inputs = {"industry": industry, "product_summary": product_summary}
+        result = graph.invoke(resume_input(graph, config, inputs), config)
+    return result.get("analysis", "")
+
+
+@cached_analysis
+@traced_analysis
+async def arun_competitor_analysis(industry: str, product_summary: str) -> str:
+    """Async run_competitor_analysis; fetches share pooled HTTP clients across runs."""
+    graph = _get_async_pipeline()
+    with checkpointed_run("pipeline", industry, product_summary) as config:
+        inputs = {"industry": industry, "product_summary": product_summary}
+        result = await graph.ainvoke(await aresume_input(graph, config, inputs), config)
+    return result.get("analysis", "")
+
+
+@cached_analysis_stream
+@traced_analysis
+def stream_competitor_analysis(industry: str, product_summary: str) -> Generator[tuple[str, str], None, str]:
+    """Stream pipeline steps as (label, detail) tuples, then yield the final JSON.
+
+    Yields:
+        ("step", "<human-readable description>") as each node starts
+        ("tool_result", "<node summary>") as each node finishes
+        ("competitor", "<name>") / ("strategic", "<field>") as parts of the analysis complete
+        ("result", "<json string>") once the analysis is done
+        ("timings", "<total>", "<per-step timings json>") as the final item
+    """
+    final_content = ""
+    graph = _get_pipeline()
+    with checkpointed_run("pipeline", industry, product_summary) as config:
+        graph_input = resume_input(graph, config, {"industry": industry, "product_summary": product_summary})
+        if graph_input is None:
+            yield ("step", _RESUMING_LABEL, "")
+
+        for mode, event in graph.stream(graph_input, config, stream_mode=["tasks", "custom"]):
+            for item in _event_items(mode, event):
+                if item[0] == "final":
+                    final_content = item[1]
+                else:
+                    yield item
+
+    yield ("result", final_content, "")
+
+
+@cached_analysis_stream
+@traced_analysis
+async def astream_competitor_analysis(industry: str, product_summary: str) -> AsyncGenerator[tuple[str, str], None]:
+    """Async stream_competitor_analysis, yielding the same items."""
+    final_content = ""
+    graph = _get_async_pipeline()
+    with checkpointed_run("pipeline", industry, product_summary) as config:
+        graph_input = await aresume_input(graph, config, {"industry": industry, "product_summary": product_summary})
+        if graph_input is None:
+            yield ("step", _RESUMING_LABEL, "")
+
+        async for mode, event in graph.astream(graph_input, config, stream_mode=["tasks", "custom"]):
+            for item in _event_items(mode, event):
+                if item[0] == "final":
+                    final_content = item[1]
+                else:
+                    yield item
+
+    yield ("result", final_content, "")
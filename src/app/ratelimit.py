@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_random_exponential,
+)
+
+from tracing import record_retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_MAX_WAIT_SECONDS = float(os.getenv("RETRY_MAX_WAIT_SECONDS", "30"))
+# After a 429 a provider's rate is halved for every caller, down to this fraction of its configured rate,
+# and each successful call afterwards wins back this fraction of the configured rate
+RATE_MIN_FRACTION = float(os.getenv("RATE_MIN_FRACTION", "0.1"))
+RATE_RECOVERY_STEP = float(os.getenv("RATE_RECOVERY_STEP", "0.05"))
+
+# Exception class names providers use for throttling, timeouts and dropped connections when there is no status code to read
+_RATE_LIMIT_ERRORS = (
+    "RateLimitError",
+    "UsageLimitExceededError",
+    "RequestTimeoutError",
+    "APITimeoutError",
+    "APIConnectionError",
+)
+_THROTTLED_ERRORS = ("RateLimitError", "UsageLimitExceededError")
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _provider_limits(prefix: str, rps: float, burst: int, concurrency: int) -> Dict[str, float]:
+    return {
+        "rps": float(os.getenv(f"{prefix}_RPS", rps)),
+        "burst": int(os.getenv(f"{prefix}_BURST", burst)),
+        "concurrency": int(os.getenv(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+    }
+
+
+# Requests per second, burst size and calls in flight allowed per provider
+PROVIDER_LIMITS = {
+    "groq": _provider_limits("GROQ", rps=5, burst=10, concurrency=8),
+    "tavily": _provider_limits("TAVILY", rps=5, burst=10, concurrency=8),
+    "firecrawl": _provider_limits("FIRECRAWL", rps=5, burst=10, concurrency=8),
+}
+
+
+def _status_code(e: BaseException) -> int | None:
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(e: BaseException) -> bool:
+    """Throttling, server errors, timeouts and dropped connections are worth retrying."""
+    status = _status_code(e)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    if type(e).__name__ in _RATE_LIMIT_ERRORS:
+        return True
+    # Timeouts and connection errors (including requests') are OSErrors; httpx has its own
+    return isinstance(e, OSError) or type(e).__module__.startswith(("httpx", "httpcore"))
+
+
+def is_throttled(e: BaseException) -> bool:
+    """Whether the provider rejected the call for going over its rate limit."""
+    status = _status_code(e)
+    return status == 429 if status is not None else type(e).__name__ in _THROTTLED_ERRORS
+
+
+def _retry_after(e: BaseException | None) -> float | None:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class _WaitHonouringRetryAfter:
+    """Jittered exponential backoff, stretched to the server's Retry-After when it sends one."""
+
+    def __init__(self):
+        self._backoff = wait_random_exponential(multiplier=0.5, max=RETRY_MAX_WAIT_SECONDS)
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        wait = self._backoff(retry_state)
+        exception = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = _retry_after(exception)
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, RETRY_MAX_WAIT_SECONDS))
+        return wait
+
+
+class TokenBucket:
+    """Thread-safe, adaptive token bucket; callers reserve a token and are told how long to wait for it.
+
+    When the provider throttles a call anyway, ``throttle`` pauses every caller
+    and halves the rate; successful calls then restore it step by step
+    (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            # _updated is in the future while paused, and no tokens are refilled until then
+            if now > self._updated:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            # A negative balance is a queue: wait until it has been refilled
+            return max(0.0, self._updated - now) + (0.0 if self._tokens >= 0 else -self._tokens / self.rate)
+
+    def throttle(self, retry_after: float | None = None) -> None:
+        """Slow down every caller after the provider rejected a call for its rate.
+
+        The bucket is emptied and paused for the server's Retry-After (or one
+        interval at the new rate), and the rate is halved.
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Calls already in flight when the first 429 arrived don't halve the rate again
+            if self._updated <= now:
+                self.rate = max(self.base_rate * RATE_MIN_FRACTION, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            pause = min(retry_after, RETRY_MAX_WAIT_SECONDS) if retry_after is not None else 1 / self.rate
+            self._updated = max(self._updated, now + pause)
+
+    def recover(self) -> None:
+        """Win back part of the configured rate after a successful call."""
+        if self.rate >= self.base_rate:
+            return
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RATE_RECOVERY_STEP)
+
+
+class ProviderLimiter:
+    """Rate limit, concurrency cap and retry policy for one external provider."""
+
+    def __init__(self, name: str, rps: float, burst: int, concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rps, burst)
+        self.concurrency = concurrency
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        # asyncio semaphores belong to the loop they are first awaited on
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "calls": 0,
+            "retries": 0,
+            "throttles": 0,
+            "failures": 0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    def _record(self, **increments: float) -> None:
+        with self._metrics_lock:
+            for key, value in increments.items():
+                self._metrics[key] += value
+
+    def _record_wait(self, waited: float) -> None:
+        with self._metrics_lock:
+            self._metrics["calls"] += 1
+            self._metrics["queue_wait_seconds"] += waited
+            self._metrics["max_queue_wait_seconds"] = max(self._metrics["max_queue_wait_seconds"], waited)
+
+    def metrics(self) -> Dict[str, float]:
+        with self._metrics_lock:
+            return {**self._metrics, "rate": self.bucket.rate}
+
+    def _succeeded(self) -> None:
+        self.bucket.recover()
+
+    def _failed(self, e: BaseException) -> None:
+        # Other callers would hit the same limit, so slow all of them down rather than just retrying this one
+        if is_throttled(e):
+            self.bucket.throttle(_retry_after(e))
+            self._record(throttles=1)
+            logger.warning(f"{self.name} is throttling calls, slowing to {self.bucket.rate:.2f} requests/s")
+
+    def _before_sleep(self, retry_state: RetryCallState) -> None:
+        self._record(retries=1)
+        record_retry()
+        exception = retry_state.outcome.exception()
+        logger.warning(
+            f"{self.name} call failed ({type(exception).__name__}: {exception}), "
+            f"retrying in {retry_state.next_action.sleep:.1f}s"
+        )
+
+    def _retry_kwargs(self, retry_if: Callable[[BaseException], bool], retry_for: float | None = None) -> Dict[str, Any]:
+        stop = stop_after_attempt(RETRY_MAX_ATTEMPTS)
+        if retry_for is not None:
+            # No retry that would start after retry_for seconds, so a caller's time budget holds
+            stop = stop | stop_before_delay(retry_for)
+        return {
+            "stop": stop,
+            "wait": _WaitHonouringRetryAfter(),
+            "retry": retry_if_exception(retry_if),
+            "before_sleep": self._before_sleep,
+            "reraise": True,
+        }
+
+    def _acquire(self) -> None:
+        started = time.monotonic()
+        self._semaphore.acquire()
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+        self._record_wait(time.monotonic() - started)
+
+    async def _aacquire(self) -> asyncio.Semaphore:
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.setdefault(loop, asyncio.Semaphore(self.concurrency))
+        await semaphore.acquire()
+        delay = self.bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        self._record_wait(time.monotonic() - started)
+        return semaphore
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        retry_if: Callable[[BaseException], bool] = is_retryable,
+        retry_for: float | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Call fn under this provider's limits, retrying the failures retry_if accepts for up to retry_for seconds."""
+        try:
+            for attempt in Retrying(**self._retry_kwargs(retry_if, retry_for)):
+                with attempt:
+                    self._acquire()
+                    try:
+                        result = fn(*args, **kwargs)
+                    except Exception as e:
+                        self._failed(e)
+                        raise
+                    finally:
+                        self._semaphore.release()
+                    self._succeeded()
+                    return result
+        except Exception:
+            self._record(failures=1)
+            raise
+
+    async def acall(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        retry_if: Callable[[BaseException], bool] = is_retryable,
+        retry_for: float | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Async call: awaits fn(*args, **kwargs) under this provider's limits."""
+        try:
+            async for attempt in AsyncRetrying(**self._retry_kwargs(retry_if, retry_for)):
+                with attempt:
+                    semaphore = await self._aacquire()
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except Exception as e:
+                        self._failed(e)
+                        raise
+                    finally:
+                        semaphore.release()
+                    self._succeeded()
+                    return result
+        except Exception:
+            self._record(failures=1)
+            raise
+
+    def stream(
+        self, open_stream: Callable[[], Iterator], retry_if: Callable[[BaseException], bool] = is_retryable
+    ) -> Iterator:
+        """Yield from open_stream(), retrying only failures that happen before the first item."""
+        done = object()
+        iterator, first = None, done
+        try:
+            for attempt in Retrying(**self._retry_kwargs(retry_if)):
+                with attempt:
+                    self._acquire()
+                    try:
+                        iterator = iter(open_stream())
+                        first = next(iterator, done)
+                    except BaseException as e:
+                        self._semaphore.release()
+                        self._failed(e)
+                        raise
+                    self._succeeded()
+        except Exception:
+            self._record(failures=1)
+            raise
+        try:
+            if first is not done:
+                yield first
+                yield from iterator
+        finally:
+            self._semaphore.release()
+
+    async def astream(
+        self, open_stream: Callable[[], AsyncIterator], retry_if: Callable[[BaseException], bool] = is_retryable
+    ) -> AsyncIterator:
+        """Async stream."""
+        done = object()
+        iterator, first, semaphore = None, done, None
+        try:
+            async for attempt in AsyncRetrying(**self._retry_kwargs(retry_if)):
+                with attempt:
+                    semaphore = await self._aacquire()
+                    try:
+                        iterator = open_stream().__aiter__()
+                        first = await anext(iterator, done)
+                    except BaseException as e:
+                        semaphore.release()
+                        self._failed(e)
+                        raise
+                    self._succeeded()
+        except Exception:
+            self._record(failures=1)
+            raise
+        try:
+            if first is not done:
+                yield first
+                async for item in iterator:
+                    yield item
+        finally:
+            semaphore.release()
+
+
+@lru_cache(maxsize=None)
+def get_limiter(provider: str) -> ProviderLimiter:
+    return ProviderLimiter(provider, **PROVIDER_LIMITS[provider])
+
+
+def limiter_metrics() -> Dict[str, Dict[str, float]]:
+    """Calls, retries, failures and queue wait for every provider used so far."""
+    return {provider: get_limiter(provider).metrics() for provider in PROVIDER_LIMITS}
@@ -0,0 +1,404 @@
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Tuple, Type, TypeVar, get_args, get_origin
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_REPAIR_PROMPT_TEMPLATE = """
+{preamble}
+
+{context}
+--------------------
+PREVIOUS ANSWER
+--------------------
+Part of your previous answer was missing or did not match the required format.
+These parts were valid and are kept as they are:
+{kept}
+
+Respond with only the parts requested by the response schema, consistent with the kept parts.
+"""
+# Prompts are made of sections under a banner like this one
+_SECTION_RE = re.compile(r"^-{20}\n(.+)\n-{20}\n", re.MULTILINE)
+# Sections holding the pages or profiles, one competitor per paragraph; only the relevant ones are resent
+_DATA_SECTION_PREFIX = "COMPETITOR"
+# Sections resent whole; the requirement sections are replaced by the repair model's schema
+_CONTEXT_SECTION_PREFIX = "CONTEXT"
+
+_FEATURE_KEYS = {"feature", "features", "capability", "capabilities", "criterion", "criteria", "aspect", "dimension"}
+_OWN_PRODUCT_KEYS = {"your product", "your startup", "our product", "user's startup", "user product", "you"}
+_YES = {"✓", "✔", "yes", "y", "true", "supported", "available", "present"}
+_NO = {"✗", "✘", "x", "no", "n", "false", "not supported", "unavailable", "absent"}
+_UNKNOWN = {"", "?", "-", "unknown", "unclear", "n/a", "na", "none", "not specified"}
+
+
+def parse_lenient(text: str) -> Dict | None:
+    """The first JSON object in an LLM reply, tolerating prose, code fences, trailing text and truncation."""
+    from langchain_core.utils.json import parse_partial_json
+
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder(strict=False).raw_decode(text[start:])
+    except json.JSONDecodeError:
+        value = parse_partial_json(text[start:].rstrip().removesuffix("```").rstrip())
+    return value if isinstance(value, dict) else None
+
+
+def _key(key: Any) -> str:
+    return " ".join(str(key).replace("_", " ").split()).strip(" :").casefold()
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, bool):
+        return "✓" if value else "✗"
+    if value is None:
+        return "?"
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(item) for item in value)
+    text = " ".join(str(value).split())
+    lowered = text.casefold()
+    if lowered in _YES:
+        return "✓"
+    if lowered in _NO:
+        return "✗"
+    if lowered in _UNKNOWN:
+        return "?"
+    return text
+
+
+def normalise_matrix(rows: Any, competitors: Iterable[str] = ()) -> List[Dict[str, str]]:
+    """Give every comparison-matrix row the same keys, in the same order.
+
+    The feature column comes first and is called "Feature", then "Your Product"
+    and the competitors. Keys are matched ignoring case, spacing and
+    underscores, "Competitor N" placeholders are renamed to the Nth competitor,
+    cells are strings with yes/no/unknown answers written as ✓, ✗ and ?, and a
+    column missing from a row is filled with ?. Rows that aren't objects or
+    that name no feature are dropped.
+    """
+    rows = [row for row in rows or [] if isinstance(row, dict) and row]
+    if not rows:
+        return []
+
+    names = [name for name in competitors if name]
+    canonical = {_key(name): name for name in names}
+    for i, name in enumerate(names):
+        canonical.setdefault(f"competitor {i + 1}", name)
+    canonical.update({key: "Your Product" for key in _OWN_PRODUCT_KEYS})
+    canonical.update({key: "Feature" for key in _FEATURE_KEYS})
+    if not any(_key(key) in _FEATURE_KEYS for key in rows[0]):
+        canonical[_key(next(iter(rows[0])))] = "Feature"
+
+    normalised = []
+    for row in rows:
+        cells: Dict[str, str] = {}
+        for key, value in row.items():
+            column = canonical.setdefault(_key(key), " ".join(str(key).split()))
+            if cells.get(column, "?") == "?":
+                cells[column] = _cell(value)
+        if cells.get("Feature", "?") != "?":
+            normalised.append(cells)
+
+    columns = list(dict.fromkeys(column for row in normalised for column in row))
+    fixed = [column for column in ("Feature", "Your Product") if column in columns]
+    columns = fixed + [column for column in columns if column not in fixed]
+    return [{column: row.get(column, "?") for column in columns} for row in normalised]
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """The value as the annotated type, turning near misses such as a string for a list into the real thing.
+
+    Raises:
+        ValueError: If the value is missing or can't be read as that type
+    """
+    if value is None:
+        raise ValueError("missing")
+    if annotation is str:
+        if isinstance(value, (list, tuple)):
+            return "; ".join(str(item) for item in value if item is not None)
+        if isinstance(value, dict):
+            raise ValueError("expected text")
+        return str(value).strip()
+    if get_origin(annotation) is list and get_args(annotation) == (str,):
+        if isinstance(value, str):
+            return [value.strip()] if value.strip() else []
+        if not isinstance(value, (list, tuple)):
+            raise ValueError("expected a list")
+        return [str(item).strip() for item in value if item is not None and not isinstance(item, (dict, list))]
+    try:
+        return TypeAdapter(annotation).validate_python(value)
+    except ValidationError as e:
+        raise ValueError(str(e)) from e
+
+
+def _unwrap(model: Type[BaseModel], data: Dict) -> Dict:
+    # Some models nest the answer under the schema's name or echo the schema's "properties" key
+    if not set(data) & set(model.model_fields) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            return inner
+    return data
+
+
+def salvage(model: Type[BaseModel], data: Dict) -> Tuple[Dict, Dict]:
+    """Split a parsed reply into the fields that are valid for the model and the ones that need repairing.
+
+    Returns:
+        The valid values, keyed like the model, and what is missing: a field
+        name maps to its annotation when the whole field is missing, or to the
+        missing sub-fields of a nested model, or to a dict of list index to
+        missing sub-fields for a list of models.
+    """
+    data = _unwrap(model, data)
+    values, missing = {}, {}
+    for field, info in model.model_fields.items():
+        annotation = info.annotation
+        value = data.get(field)
+        item = get_args(annotation)[0] if get_origin(annotation) is list and get_args(annotation) else None
+
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel) and isinstance(value, dict):
+            values[field], nested = salvage(annotation, value)
+            if nested:
+                missing[field] = nested
+        elif isinstance(item, type) and issubclass(item, BaseModel) and isinstance(value, list):
+            values[field], items_missing = [], {}
+            for element in value:
+                if not isinstance(element, dict) or not element:
+                    continue
+                element_values, element_missing = salvage(item, element)
+                if element_missing:
+                    items_missing[len(values[field])] = element_missing
+                values[field].append(element_values)
+            if not values[field]:
+                del values[field]
+                missing[field] = annotation
+            elif items_missing:
+                missing[field] = items_missing
+        elif field == "comparison_matrix":
+            matrix = normalise_matrix(value if isinstance(value, list) else [])
+            if matrix:
+                values[field] = matrix
+            else:
+                missing[field] = annotation
+        else:
+            try:
+                values[field] = _coerce(value, annotation)
+            except ValueError:
+                missing[field] = annotation
+    return values, missing
+
+
+def _repair_model(model: Type[BaseModel], missing: Dict, values: Dict, name: str = "") -> Type[BaseModel]:
+    """A model with only the missing fields, nested like the original, for the follow-up call."""
+    name = name or f"Missing{model.__name__}"
+    fields = {}
+    for field, spec in missing.items():
+        annotation = model.model_fields[field].annotation
+        if not isinstance(spec, dict):
+            fields[field] = (spec, Field(description=model.model_fields[field].description))
+        elif get_origin(annotation) is list:
+            item = get_args(annotation)[0]
+            for index, item_missing in spec.items():
+                label = values[field][index].get("name") or f"number {index + 1}"
+                fields[f"{field}_{index + 1}"] = (
+                    _repair_model(item, item_missing, values[field][index], f"{name}_{field}_{index + 1}"),
+                    Field(description=f"The missing fields of item {index + 1} of {field} ({label})"),
+                )
+        else:
+            fields[field] = (
+                _repair_model(annotation, spec, values[field], f"{name}_{field}"),
+                Field(description=f"The missing fields of {field}"),
+            )
+    return create_model(name, __doc__=f"The missing parts of the {model.__name__}", **fields)
+
+
+def _merge(model: Type[BaseModel], missing: Dict, values: Dict, patch: Dict) -> None:
+    for field, spec in missing.items():
+        annotation = model.model_fields[field].annotation
+        if not isinstance(spec, dict):
+            values[field] = patch[field]
+        elif get_origin(annotation) is list:
+            for index, item_missing in spec.items():
+                _merge(get_args(annotation)[0], item_missing, values[field][index], patch[f"{field}_{index + 1}"])
+        else:
+            _merge(annotation, spec, values[field], patch[field])
+
+
+def _paths(missing: Dict, prefix: str = "") -> List[str]:
+    paths = []
+    for field, spec in missing.items():
+        path = f"{prefix}{field}" if isinstance(field, str) else f"{prefix.rstrip('.')}[{field}]"
+        paths.extend(_paths(spec, f"{path}.") if isinstance(spec, dict) else [path])
+    return paths
+
+
+def _finish(model: Type[ModelT], values: Dict) -> ModelT:
+    if "comparison_matrix" in values:
+        names = [summary.get("name", "") for summary in values.get("competitor_summaries", [])]
+        values["comparison_matrix"] = normalise_matrix(values["comparison_matrix"], names)
+    return model.model_validate(values)
+
+
+def _item_keys(item: Dict) -> List[str]:
+    # What a competitor's page block or profile is recognised by
+    return [
+        item[key].strip().rstrip("/").casefold()
+        for key in ("website_url", "url", "name")
+        if isinstance(item.get(key), str) and item[key].strip()
+    ]
+
+
+def _repaired_items(model: Type[BaseModel], missing: Dict, values: Dict) -> Tuple[List[Dict], List[Dict], bool]:
+    """The kept list items being repaired, the complete ones, and whether anything else is missing."""
+    repaired, complete, other = [], [], False
+    for field, info in model.model_fields.items():
+        spec = missing.get(field)
+        if get_origin(info.annotation) is list and isinstance(values.get(field), list) and isinstance(spec, dict):
+            for index, item in enumerate(values[field]):
+                (repaired if index in spec else complete).append(item)
+        elif get_origin(info.annotation) is list and isinstance(values.get(field), list):
+            complete.extend(item for item in values[field] if isinstance(item, dict))
+        elif spec is not None:
+            other = True
+    return repaired, complete, other
+
+
+def _repair_prompt(prompt: str, model: Type[BaseModel], missing: Dict, values: Dict) -> str:
+    """A follow-up prompt with only what the missing parts need, not the whole original prompt.
+
+    The prompt's preamble and context sections are kept. Of its competitor data,
+    only the paragraphs of competitors whose items are being repaired are kept,
+    plus, when other fields are missing, those of competitors the kept values
+    don't already cover. The kept values are included as JSON: just the repaired
+    items when nothing else is missing, otherwise all of them.
+    """
+    preamble, *sections = _SECTION_RE.split(prompt)
+    repaired, complete, other = _repaired_items(model, missing, values)
+    repaired_keys = [key for item in repaired for key in _item_keys(item)]
+    complete_keys = [key for item in complete for key in _item_keys(item)]
+
+    def relevant(paragraph: str, keys: List[str]) -> bool:
+        lowered = paragraph.casefold()
+        return any(key in lowered for key in keys)
+
+    context = []
+    for title, body in zip(sections[::2], sections[1::2]):
+        if title.startswith(_DATA_SECTION_PREFIX):
+            body = "\n\n".join(
+                paragraph
+                for paragraph in body.strip().split("\n\n")
+                if relevant(paragraph, repaired_keys) or (other and not relevant(paragraph, complete_keys))
+            )
+            if not body:
+                continue
+        elif not title.startswith(_CONTEXT_SECTION_PREFIX):
+            continue
+        context.append(f"{'-' * 20}\n{title}\n{'-' * 20}\n{body.strip()}\n")
+
+    kept = values if other or not repaired else repaired
+    return _REPAIR_PROMPT_TEMPLATE.format(
+        preamble=preamble.strip(),
+        context="\n".join(context),
+        kept=json.dumps(kept, ensure_ascii=False, separators=(",", ":")),
+    )
+
+
+def repair(llm, model: Type[ModelT], prompt: str, data: Dict) -> ModelT:
+    """Validate a parsed reply, re-requesting only its missing or invalid parts.
+
+    Valid fields and list items are kept as they are, and a single follow-up
+    call asks for the rest, resending only the data those parts need, so a reply
+    with one bad field costs a fraction of a full re-run.
+
+    Args:
+        llm: The chat model that produced the reply
+        model: The response model the reply should match
+        prompt: The prompt the reply answered
+        data: The reply, parsed leniently
+    """
+    values, missing = salvage(model, data)
+    if missing:
+        logger.warning(f"Repairing {model.__name__}, missing or invalid: {_paths(missing)}")
+        with span("repair", model.__name__, fields=len(_paths(missing))):
+            patch = llm.with_structured_output(_repair_model(model, missing, values)).invoke(
+                _repair_prompt(prompt, model, missing, values)
+            )
+        _merge(model, missing, values, patch.model_dump())
+    return _finish(model, values)
+
+
+async def arepair(llm, model: Type[ModelT], prompt: str, data: Dict) -> ModelT:
+    """Async repair."""
+    values, missing = salvage(model, data)
+    if missing:
+        logger.warning(f"Repairing {model.__name__}, missing or invalid: {_paths(missing)}")
+        with span("repair", model.__name__, fields=len(_paths(missing))):
+            patch = await llm.with_structured_output(_repair_model(model, missing, values)).ainvoke(
+                _repair_prompt(prompt, model, missing, values)
+            )
+        _merge(model, missing, values, patch.model_dump())
+    return _finish(model, values)
+
+
+def _failed_generation(error: Exception) -> Dict | None:
+    # Groq rejects tool calls that don't match the schema, returning what the model wrote
+    body = getattr(error, "body", None)
+    if not isinstance(body, dict):
+        return None
+    body = body.get("error", body)
+    if not isinstance(body, dict) or body.get("code") != "tool_use_failed":
+        return None
+    return parse_lenient(str(body.get("failed_generation") or ""))
+
+
+def _raw_reply(result: Dict) -> Dict | None:
+    if result["parsed"] is not None:
+        return result["parsed"].model_dump()
+    raw = result["raw"]
+    if getattr(raw, "tool_calls", None):
+        return raw.tool_calls[0]["args"]
+    if getattr(raw, "invalid_tool_calls", None):
+        return parse_lenient(raw.invalid_tool_calls[0].get("args") or "")
+    return parse_lenient(raw.content if isinstance(raw.content, str) else "")
+
+
+def invoke_structured(llm, model: Type[ModelT], prompt: str) -> ModelT:
+    """Structured-output call that repairs a reply not matching the model instead of failing.
+
+    Raises:
+        Exception: The call's own error, if the reply can't be recovered at all
+    """
+    try:
+        result = llm.with_structured_output(model, include_raw=True).invoke(prompt)
+    except Exception as e:
+        data = _failed_generation(e)
+        if data is None:
+            raise
+    else:
+        data = _raw_reply(result)
+        if data is None:
+            raise result["parsing_error"] or ValueError(f"No {model.__name__} in the reply")
+    return repair(llm, model, prompt, data)
+
+
+async def ainvoke_structured(llm, model: Type[ModelT], prompt: str) -> ModelT:
+    """Async invoke_structured."""
+    try:
+        result = await llm.with_structured_output(model, include_raw=True).ainvoke(prompt)
+    except Exception as e:
+        data = _failed_generation(e)
+        if data is None:
+            raise
+    else:
+        data = _raw_reply(result)
+        if data is None:
+            raise result["parsing_error"] or ValueError(f"No {model.__name__} in the reply")
+    return await arepair(llm, model, prompt, data)
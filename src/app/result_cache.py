@@ -0,0 +1,226 @@
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from functools import lru_cache, wraps
+from typing import AsyncGenerator, Callable, Dict, Generator, List
+
+from pydantic import ValidationError
+
+from cache import normalize_query
+from models import AgentResponse
+from packing import tokenize
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", ".cache/result_cache.sqlite3")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 60 * 60)))
+# Minimum TF-IDF cosine similarity between product summaries for a near-duplicate hit; 0 disables it
+RESULT_CACHE_SIMILARITY = float(os.getenv("RESULT_CACHE_SIMILARITY", "0.85"))
+
+# Bump when the table layout changes; older caches are dropped rather than migrated
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    digest TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    industry TEXT NOT NULL,
+    product_summary TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_industry ON analyses (mode, industry, created_at);
+"""
+
+# AGENT_MODE that each decorated entry point's module implements
+_AGENT_MODES = {"agent": "react", "pipeline": "pipeline"}
+
+
+# Timings item for a cache hit, so stream consumers always get one after the result
+_CACHED_TIMINGS = ("timings", "⚡ Served from the result cache", json.dumps([]))
+
+
+def _mode(run: Callable) -> str:
+    """Cache scope for an entry point: its AGENT_MODE and the current ANALYSIS_MODE."""
+    from constants import ANALYSIS_MODE
+
+    return f"{_AGENT_MODES.get(run.__module__, run.__module__)}/{ANALYSIS_MODE}"
+
+
+def _tfidf_similarities(query: str, documents: List[str]) -> List[float]:
+    """Cosine similarity of query against each document, with IDF fitted on all of them."""
+    token_counts = [Counter(tokenize(text)) for text in [query] + documents]
+    doc_freq = Counter(token for counts in token_counts for token in counts)
+    n_docs = len(token_counts)
+
+    def vector(counts: Counter) -> Dict[str, float]:
+        return {t: c * (math.log((1 + n_docs) / (1 + doc_freq[t])) + 1) for t, c in counts.items()}
+
+    def norm(vec: Dict[str, float]) -> float:
+        return math.sqrt(sum(w * w for w in vec.values())) or 1.0
+
+    query_vec = vector(token_counts[0])
+    query_norm = norm(query_vec)
+    similarities = []
+    for counts in token_counts[1:]:
+        doc_vec = vector(counts)
+        dot = sum(w * doc_vec.get(t, 0.0) for t, w in query_vec.items())
+        similarities.append(dot / (query_norm * norm(doc_vec)))
+    return similarities
+
+
+class ResultCache:
+    """SQLite store of finished analyses keyed on (mode, industry, product_summary).
+
+    Lookups try an exact match on the normalized inputs first, then the most
+    similar product summary within the same mode and industry if it clears
+    ``similarity``. ``mode`` keeps results of different agent and analysis
+    modes apart.
+    """
+
+    def __init__(self, path: str, ttl: int = RESULT_CACHE_TTL, similarity: float = RESULT_CACHE_SIMILARITY):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS analyses")
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _digest(mode: str, industry: str, product_summary: str) -> str:
+        return hashlib.sha256(normalize_query(mode, industry, product_summary).encode()).hexdigest()
+
+    def lookup(self, mode: str, industry: str, product_summary: str) -> str | None:
+        industry_key = normalize_query(industry)
+        oldest = time.time() - self.ttl
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM analyses WHERE digest = ? AND created_at >= ?",
+                (self._digest(mode, industry, product_summary), oldest),
+            ).fetchone()
+            if row is not None:
+                logger.info(f"Exact result cache hit for {industry}")
+                return row[0]
+            if self.similarity <= 0:
+                return None
+            rows = self._conn.execute(
+                "SELECT product_summary, result FROM analyses WHERE mode = ? AND industry = ? AND created_at >= ?",
+                (mode, industry_key, oldest),
+            ).fetchall()
+
+        if not rows:
+            return None
+        similarities = _tfidf_similarities(product_summary, [summary for summary, _ in rows])
+        best = max(range(len(rows)), key=similarities.__getitem__)
+        if similarities[best] < self.similarity:
+            return None
+        logger.info(f"Similar result cache hit for {industry} (similarity {similarities[best]:.2f})")
+        return rows[best][1]
+
+    def store(self, mode: str, industry: str, product_summary: str, result: str) -> None:
+        try:
+            AgentResponse.model_validate_json(result)
+        except ValidationError:
+            logger.warning("Not caching analysis that does not match AgentResponse")
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self._digest(mode, industry, product_summary),
+                    mode,
+                    normalize_query(industry),
+                    product_summary,
+                    time.time(),
+                    result,
+                ),
+            )
+            self._conn.execute("DELETE FROM analyses WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+
+@lru_cache(maxsize=1)
+def get_result_cache() -> ResultCache | None:
+    return ResultCache(RESULT_CACHE_PATH) if RESULT_CACHE_PATH else None
+
+
+def cached_analysis(run: Callable[[str, str], str]) -> Callable[[str, str], str]:
+    """Serve run_competitor_analysis (or its async variant) from the result cache when possible."""
+    if inspect.iscoroutinefunction(run):
+
+        @wraps(run)
+        async def async_wrapper(industry: str, product_summary: str) -> str:
+            cache = get_result_cache()
+            mode = _mode(run)
+            cached = cache.lookup(mode, industry, product_summary) if cache else None
+            if cached is not None:
+                return cached
+            result = await run(industry, product_summary)
+            if cache:
+                cache.store(mode, industry, product_summary, result)
+            return result
+
+        return async_wrapper
+
+    @wraps(run)
+    def wrapper(industry: str, product_summary: str) -> str:
+        cache = get_result_cache()
+        mode = _mode(run)
+        cached = cache.lookup(mode, industry, product_summary) if cache else None
+        if cached is not None:
+            return cached
+        result = run(industry, product_summary)
+        if cache:
+            cache.store(mode, industry, product_summary, result)
+        return result
+
+    return wrapper
+
+
+def cached_analysis_stream(stream: Callable[[str, str], Generator]) -> Callable[[str, str], Generator]:
+    """Serve stream_competitor_analysis (or its async variant) from the result cache when possible."""
+    if inspect.isasyncgenfunction(stream):
+
+        @wraps(stream)
+        async def async_wrapper(industry: str, product_summary: str) -> AsyncGenerator:
+            cache = get_result_cache()
+            mode = _mode(stream)
+            cached = cache.lookup(mode, industry, product_summary) if cache else None
+            if cached is not None:
+                yield ("step", "⚡ Reusing a recent analysis...", "")
+                yield ("result", cached, "")
+                yield _CACHED_TIMINGS
+                return
+            async for kind, label, detail in stream(industry, product_summary):
+                if kind == "result" and cache:
+                    cache.store(mode, industry, product_summary, label)
+                yield (kind, label, detail)
+
+        return async_wrapper
+
+    @wraps(stream)
+    def wrapper(industry: str, product_summary: str) -> Generator:
+        cache = get_result_cache()
+        mode = _mode(stream)
+        cached = cache.lookup(mode, industry, product_summary) if cache else None
+        if cached is not None:
+            yield ("step", "⚡ Reusing a recent analysis...", "")
+            yield ("result", cached, "")
+            yield _CACHED_TIMINGS
+            return
+        for kind, label, detail in stream(industry, product_summary):
+            if kind == "result" and cache:
+                cache.store(mode, industry, product_summary, label)
+            yield (kind, label, detail)
+
+    return wrapper
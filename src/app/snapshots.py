@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict
+
+import httpx
+import zstandard
+
+from clients import get_async_http_client, get_http_client
+from models import CompetitorSummary
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", ".cache/snapshots.sqlite3")
+REVALIDATE_TIMEOUT_SECONDS = float(os.getenv("REVALIDATE_TIMEOUT_SECONDS", "5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    markdown BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    url TEXT NOT NULL,
+    context TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (url, context)
+);
+"""
+
+
+def content_hash(content: str) -> str:
+    # Whitespace-insensitive, so reflowed but otherwise identical pages still match
+    return hashlib.sha256(" ".join(content.split()).encode()).hexdigest()
+
+
+def _validators(response: httpx.Response) -> Dict[str, str | None]:
+    return {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
+
+
+def _conditional_headers(page: Dict) -> Dict[str, str]:
+    headers = {}
+    if page["etag"]:
+        headers["If-None-Match"] = page["etag"]
+    if page["last_modified"]:
+        headers["If-Modified-Since"] = page["last_modified"]
+    return headers
+
+
+def _not_modified(page: Dict, response: httpx.Response) -> bool:
+    if response.status_code == 304:
+        return True
+    # Some servers ignore conditional HEADs but still send the same validators
+    validators = _validators(response)
+    return response.status_code == 200 and any(
+        validators[key] and validators[key] == page[key] for key in ("etag", "last_modified")
+    )
+
+
+class SnapshotStore:
+    """Last seen state of each competitor page, for cheap weekly refreshes.
+
+    Pages keep their markdown and HTTP validators (ETag / Last-Modified), so an
+    unchanged page can be served after a conditional HEAD instead of a new
+    scrape. Competitor summaries are kept per page, analysis context and content
+    hash, so unchanged pages skip their extraction call.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def page(self, url: str) -> Dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, markdown FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "markdown": zstandard.ZstdDecompressor().decompress(row[2]).decode(),
+        }
+
+    def record_page(self, url: str, markdown: str, validators: Dict[str, str | None]) -> None:
+        body = zstandard.ZstdCompressor().compress(markdown.encode())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url, validators.get("etag"), validators.get("last_modified"), body, time.time()),
+            )
+            self._conn.commit()
+
+    def summary(self, url: str, context: str, digest: str) -> CompetitorSummary | None:
+        """The summary extracted last time, if the page content hasn't changed since."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE url = ? AND context = ? AND content_hash = ?",
+                (url, context, digest),
+            ).fetchone()
+        return CompetitorSummary.model_validate_json(row[0]) if row else None
+
+    def record_summary(self, url: str, context: str, digest: str, summary: CompetitorSummary) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                (url, context, digest, summary.model_dump_json(), time.time()),
+            )
+            self._conn.commit()
+
+    def _record_fetched(self, url: str, markdown: str, validators: Dict, fetched: Dict) -> None:
+        # The fetch's own response headers are fresher than the HEAD's, where the backend exposes them
+        if markdown:
+            self.record_page(url, markdown, {**validators, **{key: value for key, value in fetched.items() if value}})
+
+    def fetch_if_changed(self, url: str, fetch: Callable[[Dict], str]) -> str:
+        """Return the stored markdown if a conditional HEAD says the page is unchanged, else fetch it.
+
+        A page seen for the first time is fetched straight away, without a HEAD.
+        fetch(validators) fills in the ETag/Last-Modified of its response, where
+        it has one, for the next revalidation.
+        """
+        page = self.page(url)
+        validators: Dict[str, str | None] = {}
+        if page:
+            with span("revalidate", url) as attributes:
+                try:
+                    response = get_http_client().head(
+                        url, headers=_conditional_headers(page), timeout=REVALIDATE_TIMEOUT_SECONDS, follow_redirects=True
+                    )
+                    validators = _validators(response)
+                    if _not_modified(page, response):
+                        attributes["not_modified"] = True
+                        return page["markdown"]
+                except httpx.HTTPError as e:
+                    logger.debug(f"Revalidating {url} failed, scraping it: {e}")
+        fetched: Dict[str, str | None] = {}
+        markdown = fetch(fetched)
+        self._record_fetched(url, markdown, validators, fetched)
+        return markdown
+
+    async def afetch_if_changed(self, url: str, fetch: Callable[[Dict], Awaitable[str]]) -> str:
+        """Async fetch_if_changed."""
+        page = self.page(url)
+        validators: Dict[str, str | None] = {}
+        if page:
+            with span("revalidate", url) as attributes:
+                try:
+                    response = await get_async_http_client().head(
+                        url, headers=_conditional_headers(page), timeout=REVALIDATE_TIMEOUT_SECONDS, follow_redirects=True
+                    )
+                    validators = _validators(response)
+                    if _not_modified(page, response):
+                        attributes["not_modified"] = True
+                        return page["markdown"]
+                except httpx.HTTPError as e:
+                    logger.debug(f"Revalidating {url} failed, scraping it: {e}")
+        fetched: Dict[str, str | None] = {}
+        markdown = await fetch(fetched)
+        self._record_fetched(url, markdown, validators, fetched)
+        return markdown
+
+
+@lru_cache(maxsize=1)
+def get_snapshot_store() -> SnapshotStore | None:
+    if not SNAPSHOT_PATH:
+        return None
+    return SnapshotStore(SNAPSHOT_PATH)
@@ -0,0 +1,180 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple, get_args, get_origin
+
+from langchain_core.utils.json import parse_partial_json
+from langgraph.config import get_stream_writer
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from models import AgentResponse, CompetitorSummary, StrategicAnalysis
+from repair import ainvoke_structured, arepair, invoke_structured, parse_lenient, repair
+
+logger = logging.getLogger(__name__)
+
+# Re-parse the partial JSON at least this often, in characters of new output
+_PARSE_EVERY_CHARS = 200
+
+_JSON_INSTRUCTIONS = """
+--------------------
+RESPONSE FORMAT
+--------------------
+Respond with a single JSON object, and nothing else, shaped like this example, with one
+competitor_summaries entry per competitor and one comparison_matrix row per feature.
+Every field is required; "..." stands for text and ["..."] for a list of strings:
+{example}
+"""
+
+
+def _example(model: type[BaseModel]) -> Dict:
+    """An example object listing the model's fields, which costs far fewer prompt tokens than its JSON Schema."""
+    example = {}
+    for field, info in model.model_fields.items():
+        annotation = info.annotation
+        item = get_args(annotation)[0] if get_origin(annotation) is list else None
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            example[field] = _example(annotation)
+        elif isinstance(item, type) and issubclass(item, BaseModel):
+            example[field] = [_example(item)]
+        elif get_origin(item) is dict:
+            example[field] = [{"Feature": "...", "Your Product": "✓", "<competitor name>": "✗"}]
+        elif item is not None:
+            example[field] = ["..."]
+        else:
+            example[field] = "..."
+    return example
+
+
+_RESPONSE_FORMAT = _JSON_INSTRUCTIONS.format(
+    example=json.dumps(_example(AgentResponse), ensure_ascii=False, separators=(",", ":"))
+)
+
+
+def emit(event: Dict) -> None:
+    """Send a custom stream event to the running graph, if there is one."""
+    try:
+        get_stream_writer()(event)
+    except RuntimeError:
+        pass
+
+
+def custom_event_items(event: Dict) -> List[Tuple[str, str, str]]:
+    """Turn a custom stream event into the (kind, label, detail) items the UI consumes.
+
+    ("competitor", "<name>", "<CompetitorSummary json>") and
+    ("strategic", "<field>", "<value json>").
+    """
+    items = []
+    if "competitor" in event:
+        competitor = event["competitor"]
+        items.append(("competitor", competitor.get("name", ""), json.dumps(competitor)))
+    for field, value in event.get("strategic", {}).items():
+        items.append(("strategic", field, json.dumps(value)))
+    return items
+
+
+@lru_cache(maxsize=None)
+def _strategic_field(field: str) -> TypeAdapter | None:
+    info = StrategicAnalysis.model_fields.get(field)
+    return TypeAdapter(info.annotation) if info else None
+
+
+class AnalysisEmitter:
+    """Emits each competitor summary and strategic field once it is complete.
+
+    A list item or object field is complete once the model has started writing
+    the next one, so everything but the last element is safe to emit early.
+    Parts that are complete but invalid are held back and retried on later
+    updates, so the final update emits their repaired values exactly once.
+    """
+
+    def __init__(self):
+        self.competitors_emitted: Set[str] = set()
+        self.fields_emitted: Set[str] = set()
+
+    def update(self, partial: Any, final: bool = False) -> None:
+        if not isinstance(partial, dict):
+            return
+
+        summaries = partial.get("competitor_summaries") or []
+        summaries_done = final or "comparison_matrix" in partial or "strategic_analysis" in partial
+        complete = summaries if summaries_done else summaries[:-1]
+        for summary in complete:
+            if not isinstance(summary, dict) or summary.get("name") in self.competitors_emitted:
+                continue
+            try:
+                competitor = CompetitorSummary.model_validate(summary).model_dump()
+            except ValidationError:
+                logger.debug("Holding back competitor summary that failed validation")
+                continue
+            self.competitors_emitted.add(competitor["name"])
+            emit({"competitor": competitor})
+
+        strategic = partial.get("strategic_analysis") or {}
+        if not isinstance(strategic, dict):
+            return
+        fields = list(strategic)
+        for field in fields if final else fields[:-1]:
+            adapter = _strategic_field(field)
+            if field in self.fields_emitted or adapter is None:
+                continue
+            try:
+                value = adapter.validate_python(strategic[field])
+            except ValidationError:
+                logger.debug(f"Holding back strategic field {field} that failed validation")
+                continue
+            self.fields_emitted.add(field)
+            emit({"strategic": {field: value}})
+
+
+def _json_start(text: str) -> str:
+    # Drop any prose or code fence the model writes before the object
+    start = text.find("{")
+    return text[start:] if start >= 0 else ""
+
+
+def stream_analysis(llm, prompt: str) -> AgentResponse:
+    """Stream an AgentResponse from the LLM, emitting completed parts as they arrive.
+
+    Whatever valid parts the streamed JSON has are kept and only the rest is
+    re-requested; a regular structured-output call is made only if the reply
+    has no JSON object at all.
+    """
+    emitter = AnalysisEmitter()
+    content = ""
+    parsed_at = 0
+    for chunk in llm.stream(prompt + _RESPONSE_FORMAT):
+        content += chunk.content if isinstance(chunk.content, str) else ""
+        if len(content) - parsed_at >= _PARSE_EVERY_CHARS or "}" in str(chunk.content):
+            parsed_at = len(content)
+            emitter.update(parse_partial_json(_json_start(content)))
+
+    data = parse_lenient(content)
+    if data is None:
+        logger.warning("Streamed analysis had no JSON object, retrying with structured output")
+        analysis = invoke_structured(llm, AgentResponse, prompt)
+    else:
+        analysis = repair(llm, AgentResponse, prompt, data)
+    emitter.update(analysis.model_dump(), final=True)
+    return analysis
+
+
+async def astream_analysis(llm, prompt: str) -> AgentResponse:
+    """Async stream_analysis."""
+    emitter = AnalysisEmitter()
+    content = ""
+    parsed_at = 0
+    async for chunk in llm.astream(prompt + _RESPONSE_FORMAT):
+        content += chunk.content if isinstance(chunk.content, str) else ""
+        if len(content) - parsed_at >= _PARSE_EVERY_CHARS or "}" in str(chunk.content):
+            parsed_at = len(content)
+            emitter.update(parse_partial_json(_json_start(content)))
+
+    data = parse_lenient(content)
+    if data is None:
+        logger.warning("Streamed analysis had no JSON object, retrying with structured output")
+        analysis = await ainvoke_structured(llm, AgentResponse, prompt)
+    else:
+        analysis = await arepair(llm, AgentResponse, prompt, data)
+    emitter.update(analysis.model_dump(), final=True)
+    return analysis
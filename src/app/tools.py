@@ -1,14 +1,41 @@
+import asyncio
+import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from langchain_core.tools import tool
+from artifacts import get_artifact_store, page_summary
+from cache import get_fetch_cache, normalize_query, normalize_url
+from checkpoint import NotResumable
+from clients import firecrawl_scrape_markdown, get_firecrawl_client, get_tavily_client, tavily_search
+from mapreduce import analyse_map_reduce, aanalyse_map_reduce
 from models import AgentResponse
+from ratelimit import get_limiter
+from snapshots import get_snapshot_store
+from extract import extract_markdown
+from fetchers import get_page_fetcher
+from packing import pack_competitor_data
+from streaming import astream_analysis, stream_analysis
+from tracing import in_context, span
+from triage import fuse, triage
 from tavily import TavilyClient
 from firecrawl import Firecrawl
-from typing import List, Dict
+from typing import Any, List, Dict
 
 logger = logging.getLogger(__name__)
 
-MAX_SCRAPED_CHARS = 1000
+MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "3"))
+# Search hits fetched per competitor wanted, so triage can still fill the quota after dropping junk
+SEARCH_OVERFETCH = int(os.getenv("SEARCH_OVERFETCH", "3"))
+# Tavily returns at most 20 results per search
+MAX_SEARCH_CANDIDATES = min(20, MAX_SEARCH_RESULTS * max(1, SEARCH_OVERFETCH))
+# Query variants searched in parallel and fused, and how long to wait for them before fusing what's back
+SEARCH_QUERIES = int(os.getenv("SEARCH_QUERIES", "4"))
+SEARCH_BUDGET_SECONDS = float(os.getenv("SEARCH_BUDGET_SECONDS", "8"))
+MAX_SCRAPED_CHARS = int(os.getenv("MAX_SCRAPED_CHARS", "4000"))
+MAX_SCRAPE_WORKERS = int(os.getenv("MAX_SCRAPE_WORKERS", "4"))
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "30"))
 
 _ANALYSIS_PROMPT_TEMPLATE = """
 You are an expert in competitive intelligence, product analysis, and strategic positioning.
@@ -23,7 +50,7 @@ Industry: {industry}
 Product Summary: {product_summary}
 
 --------------------
-COMPETITOR DATA (CLEANED + EXTRACTED FROM SCRAPED PAGES)
+COMPETITOR DATA (MOST RELEVANT SECTIONS OF EACH SCRAPED PAGE)
 --------------------
 {competitor_data}
 
@@ -82,21 +109,111 @@ def _build_analysis_prompt(industry: str, product_summary: str, competitor_data:
     return _ANALYSIS_PROMPT_TEMPLATE.format(
         industry=industry,
         product_summary=product_summary,
-        competitor_data=competitor_data,
+        competitor_data=pack_competitor_data(competitor_data, product_summary),
     )
 
 
-def _search(industry: str, product_summary: str, client: TavilyClient) -> List[str]:
-    search_query = f"top competitors in {industry} similar to {product_summary}"
-    search_results = client.search(search_query, max_results=3)
-    if not search_results.get("results"):
+def _search_query(industry: str, product_summary: str) -> str:
+    return f"top competitors in {industry} similar to {product_summary}"
+
+
+def _search_queries(industry: str, product_summary: str) -> List[str]:
+    """The primary query plus up to SEARCH_QUERIES - 1 variants that surface competitors it misses."""
+    variants = [
+        f"alternatives to {product_summary} in {industry}",
+        f"{industry} software pricing plans",
+        f"{industry} tools compared vs",
+        f"leading {industry} companies and category leaders",
+    ]
+    return [_search_query(industry, product_summary), *variants][: max(1, SEARCH_QUERIES)]
+
+
+def _competitor_urls(search_results: List[Dict], industry: str) -> List[str]:
+    if not search_results:
         logger.warning(f"No competitors found for {industry}")
         return []
-    competitor_urls = [hit["url"] for hit in search_results["results"][:3]]
+    competitor_urls = triage(search_results, MAX_SEARCH_RESULTS)
     logger.info(f"Found competitor URLs: {competitor_urls}")
     return competitor_urls
 
 
+def _fetched(attributes: Dict, value: Any) -> Any:
+    # Only called on a cache miss, so the span shows what actually came over the network
+    attributes["cache_hit"] = False
+    attributes["bytes"] = len(value.encode() if isinstance(value, str) else json.dumps(value).encode())
+    return value
+
+
+def _search_one(search_query: str, client: TavilyClient) -> List[Dict]:
+    with span("search", search_query, cache_hit=True) as attributes:
+        return get_fetch_cache().get_or_fetch(
+            "search",
+            normalize_query(search_query),
+            lambda: _fetched(
+                attributes,
+                get_limiter("tavily").call(client.search, search_query, max_results=MAX_SEARCH_CANDIDATES).get("results", []),
+            ),
+        )
+
+
+async def _asearch_one(search_query: str) -> List[Dict]:
+    async def fetch() -> List[Dict]:
+        return _fetched(attributes, await get_limiter("tavily").acall(tavily_search, search_query, MAX_SEARCH_CANDIDATES))
+
+    with span("search", search_query, cache_hit=True) as attributes:
+        return await get_fetch_cache().aget_or_fetch("search", normalize_query(search_query), fetch)
+
+
+def _search(industry: str, product_summary: str, client: TavilyClient) -> List[str]:
+    """Run every query variant concurrently and fuse what comes back within SEARCH_BUDGET_SECONDS.
+
+    Variants still running at the deadline are dropped. If none has answered by
+    then, the primary query is waited for, and its error raised if it failed.
+    """
+    queries = _search_queries(industry, product_summary)
+    results: Dict[int, List[Dict]] = {}
+    pool = ThreadPoolExecutor(max_workers=len(queries))
+    futures = {pool.submit(in_context(_search_one), query, client): i for i, query in enumerate(queries)}
+    try:
+        for future in as_completed(futures, timeout=SEARCH_BUDGET_SECONDS):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logger.warning(f"Search failed for {queries[i]!r}: {type(e).__name__}: {e}")
+    except FuturesTimeoutError:
+        logger.warning(f"Search exceeded {SEARCH_BUDGET_SECONDS:g}s, fusing {len(results)} of {len(queries)} queries")
+    try:
+        if not results:
+            results[0] = next(future for future, i in futures.items() if i == 0).result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _competitor_urls(fuse([results[i] for i in sorted(results)]), industry)
+
+
+async def _asearch(industry: str, product_summary: str) -> List[str]:
+    """Async _search."""
+    queries = _search_queries(industry, product_summary)
+    tasks = [asyncio.ensure_future(_asearch_one(query)) for query in queries]
+    done, pending = await asyncio.wait(tasks, timeout=SEARCH_BUDGET_SECONDS)
+    if pending:
+        logger.warning(f"Search exceeded {SEARCH_BUDGET_SECONDS:g}s, fusing {len(done)} of {len(queries)} queries")
+    results: Dict[int, List[Dict]] = {}
+    try:
+        for i, task in enumerate(tasks):
+            if task in done:
+                if task.exception() is None:
+                    results[i] = task.result()
+                else:
+                    logger.warning(f"Search failed for {queries[i]!r}: {task.exception()}")
+        if not results:
+            results[0] = await tasks[0]
+    finally:
+        for task in pending:
+            task.cancel()
+    return _competitor_urls(fuse([results[i] for i in sorted(results)]), industry)
+
+
 @tool
 def search_competitors(industry: str, product_summary: str) -> List[str]:
     """Search for competitor URLs for a given industry and product summary.
@@ -106,64 +223,237 @@ def search_competitors(industry: str, product_summary: str) -> List[str]:
         product_summary: Brief description of the product (max 300 chars)
 
     Returns:
-        List of competitor URLs found via web search
+        Competitor homepage or pricing URLs from a web search, one per company, with
+        directories, aggregators and news sites already filtered out
     """
     logger.info(f"Searching competitors for industry: {industry}")
     try:
-        return _search(industry, product_summary, TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+        return _search(industry, product_summary, get_tavily_client())
     except Exception as e:
         logger.error(f"Failed to search competitors: {e}")
         return []
 
 
-def _scrape(url: str, client: Firecrawl) -> Dict:
-    doc = client.scrape(url, formats=["markdown"])
-    content = doc.markdown[:MAX_SCRAPED_CHARS] if hasattr(doc, "markdown") else ""
-    return {"url": url, "content": content}
+def _remaining(url: str, deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"No time left to scrape {url}")
+    return remaining
+
+
+def _fetch_markdown(url: str, client: Firecrawl, timeout: float) -> str:
+    # Retries share the page's timeout, so a batch's per-URL budget holds and no abandoned scrape keeps going
+    deadline = time.monotonic() + timeout
+
+    def scrape():
+        return client.scrape(url, formats=["markdown"], timeout=int(_remaining(url, deadline) * 1000))
+
+    doc = get_limiter("firecrawl").call(scrape, retry_for=timeout)
+    return (doc.markdown or "") if hasattr(doc, "markdown") else ""
+
+
+def _fetch_if_changed(url: str, attributes: Dict, client: Firecrawl, timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+
+    # Firecrawl gets whatever time a local attempt left, as in _ascrape
+    def firecrawl() -> str:
+        return _fetch_markdown(url, client, deadline - time.monotonic())
+
+    def fetch(validators: Dict) -> str:
+        return _fetched(attributes, get_page_fetcher().fetch(url, timeout, firecrawl, attributes, validators))
+
+    snapshots = get_snapshot_store()
+    return snapshots.fetch_if_changed(normalize_url(url), fetch) if snapshots else fetch({})
+
+
+def _scrape(url: str, client: Firecrawl, timeout: float = SCRAPE_TIMEOUT_SECONDS) -> Dict:
+    with span("scrape", url, cache_hit=True) as attributes:
+        markdown = get_fetch_cache().get_or_fetch(
+            "scrape", normalize_url(url), lambda: _fetch_if_changed(url, attributes, client, timeout)
+        )
+    return {"url": url, **extract_markdown(markdown, MAX_SCRAPED_CHARS)}
+
+
+async def _ascrape(url: str, timeout: float = SCRAPE_TIMEOUT_SECONDS) -> Dict:
+    deadline = time.monotonic() + timeout
+
+    async def scrape() -> str:
+        return await firecrawl_scrape_markdown(url, _remaining(url, deadline))
+
+    async def firecrawl() -> str:
+        return await get_limiter("firecrawl").acall(scrape, retry_for=timeout)
+
+    async def fetch(validators: Dict) -> str:
+        return _fetched(attributes, await get_page_fetcher().afetch(url, timeout, firecrawl, attributes, validators))
+
+    async def fetch_if_changed() -> str:
+        snapshots = get_snapshot_store()
+        return await snapshots.afetch_if_changed(normalize_url(url), fetch) if snapshots else await fetch({})
+
+    with span("scrape", url, cache_hit=True) as attributes:
+        markdown = await get_fetch_cache().aget_or_fetch("scrape", normalize_url(url), fetch_if_changed)
+    return {"url": url, **extract_markdown(markdown, MAX_SCRAPED_CHARS)}
+
+
+def _scrape_many(
+    urls: List[str],
+    client: Firecrawl,
+    max_workers: int = MAX_SCRAPE_WORKERS,
+    timeout: float = SCRAPE_TIMEOUT_SECONDS,
+) -> List[Dict]:
+    """Scrape URLs concurrently, returning one result per URL in input order.
+
+    Failed or timed-out URLs get an 'error' entry instead of content so the
+    rest of the batch is still usable.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+
+    workers = max(1, min(max_workers, len(urls)))
+    # Each URL gets `timeout` seconds once a worker picks it up
+    deadline = timeout * -(-len(urls) // workers)
+    results: Dict[str, Dict] = {}
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {pool.submit(in_context(_scrape), url, client, timeout): url for url in urls}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            url = futures[future]
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to scrape {url}: {type(e).__name__}: {e}")
+                results[url] = {"url": url, "error": str(e)}
+    except FuturesTimeoutError:
+        logger.warning(f"Scrape batch exceeded {deadline:.0f}s, returning partial results")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return [results.get(url, {"url": url, "error": f"Timed out after {timeout:.0f}s"}) for url in urls]
+
+
+async def _ascrape_many(
+    urls: List[str],
+    max_workers: int = MAX_SCRAPE_WORKERS,
+    timeout: float = SCRAPE_TIMEOUT_SECONDS,
+) -> List[Dict]:
+    """Async _scrape_many: at most max_workers scrapes in flight, each capped at timeout."""
+    urls = list(dict.fromkeys(urls))
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def scrape_one(url: str) -> Dict:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(_ascrape(url, timeout), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Timed out scraping {url} after {timeout:.0f}s")
+                return {"url": url, "error": f"Timed out after {timeout:.0f}s"}
+            except Exception as e:
+                logger.warning(f"Failed to scrape {url}: {type(e).__name__}: {e}")
+                return {"url": url, "error": str(e)}
+
+    return list(await asyncio.gather(*(scrape_one(url) for url in urls)))
+
+
+def _stored(pages: List[Dict]) -> List[Dict]:
+    """Move scraped content into the artifact store, leaving a handle and summary per page for the transcript."""
+    store = get_artifact_store()
+    return [page if "error" in page else page_summary(store.put("scrape", page), page) for page in pages]
+
+
+def _resolve(handles: List[str]) -> List[Dict]:
+    # Resuming would retry the same call with the same handles, so a run that got here has to start afresh
+    if not handles:
+        raise NotResumable("No scraped pages to analyse. Pass the handles returned by scrape_competitor_pages.")
+    try:
+        return get_artifact_store().resolve(handles)
+    except KeyError as e:
+        raise NotResumable(f"{e.args[0]}. Pass the handles returned by scrape_competitor_pages.") from e
 
 
 @tool
-def scrape_competitor_page(url: str) -> Dict:
-    """Scrape a single competitor website and return its content.
+def scrape_competitor_pages(urls: List[str]) -> List[Dict]:
+    """Scrape several competitor websites concurrently and return their content.
 
-    Use this to selectively scrape URLs you judge worth investigating based on
-    search result context. Prefer company homepages and pricing pages over
-    aggregator or Wikipedia links.
+    Pass every URL worth investigating in a single call. Prefer company
+    homepages and pricing pages over aggregator or Wikipedia links.
 
     Args:
-        url: The URL to scrape
+        urls: The URLs to scrape
 
     Returns:
-        Dict with 'url' and 'content' keys, or 'error' key on failure
+        List of dicts with the page's 'url', a 'handle' for analyse_competitors,
+        and its 'title', length in 'chars' and a short 'preview'; or 'error' for
+        URLs that failed. The full content stays server-side.
     """
-    logger.info(f"Scraping {url}")
-    try:
-        return _scrape(url, Firecrawl(api_key=os.getenv("FIRECRAWL_API_KEY")))
-    except Exception as e:
-        logger.warning(f"Failed to scrape {url}: {type(e).__name__}: {e}")
-        return {"url": url, "error": str(e)}
+    logger.info(f"Scraping {len(urls)} pages")
+    return _stored(_scrape_many(urls, get_firecrawl_client()))
 
 
 @tool
-def analyse_competitors(industry: str, product_summary: str, competitor_data: List[Dict]) -> str:
+def analyse_competitors(industry: str, product_summary: str, handles: List[str]) -> str:
     """Analyse competitors based on scraped content.
 
     Args:
         industry: The industry or category (e.g., 'AI coding assistants')
         product_summary: Brief description of the product (max 300 chars)
-        competitor_data: List of dicts with 'url' and 'content' keys from scrape_competitor_page
+        handles: The 'handle' of every successfully scraped page from scrape_competitor_pages
 
     Returns:
         JSON string containing structured competitor analysis
     """
-    from constants import get_llm
+    return _analyse(industry, product_summary, _resolve(handles)).model_dump_json()
+
+
+def _analyse(industry: str, product_summary: str, competitor_data: List[Dict]) -> AgentResponse:
+    from constants import get_llm, ANALYSIS_MODE
 
     logger.info(f"Analysing {len(competitor_data)} competitors for industry: {industry}")
-    prompt = _build_analysis_prompt(industry, product_summary, competitor_data)
-    structured_llm = get_llm().with_structured_output(AgentResponse)
     try:
-        analysis = structured_llm.invoke(prompt)
-        return analysis.model_dump_json()
+        with span("analyse", ANALYSIS_MODE, competitors=len(competitor_data)):
+            if ANALYSIS_MODE == "map_reduce":
+                return analyse_map_reduce(industry, product_summary, competitor_data)
+            prompt = _build_analysis_prompt(industry, product_summary, competitor_data)
+            return stream_analysis(get_llm("synthesiser"), prompt)
     except Exception as e:
         logger.error(f"Analysis failed: {e}")
         raise RuntimeError(f"Failed to analyse competitors: {e}") from e
+
+
+async def _aanalyse(industry: str, product_summary: str, competitor_data: List[Dict]) -> AgentResponse:
+    from constants import get_llm, ANALYSIS_MODE
+
+    logger.info(f"Analysing {len(competitor_data)} competitors for industry: {industry}")
+    try:
+        with span("analyse", ANALYSIS_MODE, competitors=len(competitor_data)):
+            if ANALYSIS_MODE == "map_reduce":
+                return await aanalyse_map_reduce(industry, product_summary, competitor_data)
+            prompt = _build_analysis_prompt(industry, product_summary, competitor_data)
+            return await astream_analysis(get_llm("synthesiser"), prompt)
+    except Exception as e:
+        logger.error(f"Analysis failed: {e}")
+        raise RuntimeError(f"Failed to analyse competitors: {e}") from e
+
+
+# Async variants of the tools for the async agent. They share names and
+# descriptions with the sync tools but run on the pooled HTTP clients.
+
+@tool("search_competitors", description=search_competitors.description)
+async def asearch_competitors(industry: str, product_summary: str) -> List[str]:
+    logger.info(f"Searching competitors for industry: {industry}")
+    try:
+        return await _asearch(industry, product_summary)
+    except Exception as e:
+        logger.error(f"Failed to search competitors: {e}")
+        return []
+
+
+@tool("scrape_competitor_pages", description=scrape_competitor_pages.description)
+async def ascrape_competitor_pages(urls: List[str]) -> List[Dict]:
+    logger.info(f"Scraping {len(urls)} pages")
+    return _stored(await _ascrape_many(urls))
+
+
+@tool("analyse_competitors", description=analyse_competitors.description)
+async def aanalyse_competitors(industry: str, product_summary: str, handles: List[str]) -> str:
+    return (await _aanalyse(industry, product_summary, _resolve(handles))).model_dump_json()
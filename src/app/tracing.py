@@ -0,0 +1,329 @@
+"""Per-analysis tracing of tool calls and LLM turns.
+
+Every analysis run records a span per search, page scrape and LLM call with
+its wall time, bytes fetched, prompt/completion tokens and retries, and writes
+them to TRACE_DIR as an OTLP/JSON file. Summarise the traces collected so far:
+
+    python src/app/tracing.py report --dir .cache/traces
+"""
+import argparse
+import inspect
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial, wraps
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = os.getenv("TRACE_DIR", ".cache/traces")
+
+_SERVICE_NAME = "competitor-analyser"
+# Numeric span attributes summed per stage in the report
+_SUMMED_ATTRIBUTES = ("bytes", "prompt_tokens", "completion_tokens", "retries")
+
+
+class Span:
+    def __init__(self, stage: str, name: str, parent_id: str | None = None):
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.stage = stage
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {"stage": self.stage, "name": self.name, "duration_ms": round(self.duration_ms, 1)}
+        summary.update(self.attributes)
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        attributes = {"stage": self.stage, **self.attributes}
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": f"{self.stage} {self.name}".strip(),
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """The spans recorded for one analysis run, under a root "analysis" span."""
+
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span("analysis", name)
+        self.root.attributes.update(attributes)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Completed spans in start order, as flat dicts for display."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_ns)
+        return [span.summary() for span in spans]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [self.root, *self.spans]
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(_SERVICE_NAME)}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": _SERVICE_NAME},
+                            "spans": [span.to_otlp(self.trace_id) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def write(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_otlp(), f)
+        return path
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    if "boolValue" in value:
+        return value["boolValue"]
+    return value.get("stringValue")
+
+
+def _reset(var: ContextVar, token) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        # A generator closed from a different context than it started in
+        pass
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """Record every span opened inside this block into a new trace, written to TRACE_DIR on exit."""
+    trace = Trace(name, **attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.root.end_ns = time.time_ns()
+        _reset(_current_span, span_token)
+        _reset(_current_trace, trace_token)
+        logger.info(f"Trace {trace.trace_id} finished in {trace.root.duration_ms:.0f} ms")
+        if TRACE_DIR:
+            try:
+                trace.write(TRACE_DIR)
+            except OSError as e:
+                logger.warning(f"Failed to write trace {trace.trace_id}: {e}")
+
+
+@contextmanager
+def span(stage: str, name: str = "", **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time the block as a span of the current trace and yield its attributes for the caller to fill in.
+
+    Outside a trace the attributes are still yielded but nothing is recorded.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield dict(attributes)
+        return
+    parent = _current_span.get()
+    current = Span(stage, name, parent.span_id if parent else trace.root.span_id)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current.attributes
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _reset(_current_span, token)
+        trace.add(current)
+
+
+def llm_span(model: str) -> Iterator[Dict[str, Any]]:
+    """Span for one LLM call, staged by what it was called for ("llm:planning" outside any tool)."""
+    parent = _current_span.get()
+    purpose = parent.stage if parent and parent.stage != "analysis" else "planning"
+    return span(f"llm:{purpose}", model)
+
+
+def record_usage(attributes: Dict[str, Any], message: Any) -> None:
+    """Add a message's token usage to an LLM span's attributes."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        attributes["prompt_tokens"] = attributes.get("prompt_tokens", 0) + usage.get("input_tokens", 0)
+        attributes["completion_tokens"] = attributes.get("completion_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def record_retry() -> None:
+    """Count a retry against the span currently running, if any."""
+    current = _current_span.get()
+    if current is not None and _current_trace.get() is not None:
+        current.attributes["retries"] = current.attributes.get("retries", 0) + 1
+
+
+def in_context(fn: Callable) -> Callable:
+    """Bind fn to a copy of the current context so spans from a worker thread join this trace."""
+    return partial(copy_context().run, fn)
+
+
+def _timings_item(trace: Trace) -> tuple[str, str, str]:
+    return ("timings", f"⏱️ Finished in {trace.root.duration_ms / 1000:.1f}s", json.dumps(trace.summary()))
+
+
+def traced_analysis(run: Callable) -> Callable:
+    """Trace each call of an analysis entry point; streams also yield a ("timings", ...) item at the end."""
+    if inspect.isasyncgenfunction(run):
+
+        @wraps(run)
+        async def async_stream_wrapper(industry: str, product_summary: str) -> AsyncGenerator:
+            with start_trace(run.__module__, industry=industry) as trace:
+                async for item in run(industry, product_summary):
+                    yield item
+            yield _timings_item(trace)
+
+        return async_stream_wrapper
+
+    if inspect.isgeneratorfunction(run):
+
+        @wraps(run)
+        def stream_wrapper(industry: str, product_summary: str) -> Generator:
+            with start_trace(run.__module__, industry=industry) as trace:
+                yield from run(industry, product_summary)
+            yield _timings_item(trace)
+
+        return stream_wrapper
+
+    if inspect.iscoroutinefunction(run):
+
+        @wraps(run)
+        async def async_wrapper(industry: str, product_summary: str) -> str:
+            with start_trace(run.__module__, industry=industry):
+                return await run(industry, product_summary)
+
+        return async_wrapper
+
+    @wraps(run)
+    def wrapper(industry: str, product_summary: str) -> str:
+        with start_trace(run.__module__, industry=industry):
+            return run(industry, product_summary)
+
+    return wrapper
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def load_spans(directory: str = TRACE_DIR) -> List[Dict[str, Any]]:
+    """Flatten every trace file in directory into span dicts with stage, duration_ms and attributes."""
+    spans = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            document = json.load(f)
+        for resource in document.get("resourceSpans", []):
+            for scope in resource.get("scopeSpans", []):
+                for otlp_span in scope.get("spans", []):
+                    attributes = {a["key"]: _from_otlp_value(a["value"]) for a in otlp_span.get("attributes", [])}
+                    spans.append({
+                        **attributes,
+                        "duration_ms": (int(otlp_span["endTimeUnixNano"]) - int(otlp_span["startTimeUnixNano"])) / 1e6,
+                        "error": otlp_span.get("status", {}).get("code") == 2,
+                    })
+    return spans
+
+
+def stage_report(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Count, p50/p95 latency, errors and summed bytes/tokens/retries per stage."""
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        by_stage.setdefault(s.get("stage", "unknown"), []).append(s)
+    report = {}
+    for stage, stage_spans in sorted(by_stage.items()):
+        durations = [s["duration_ms"] for s in stage_spans]
+        report[stage] = {
+            "count": len(stage_spans),
+            "p50_ms": round(_percentile(durations, 0.5), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            "errors": sum(1 for s in stage_spans if s.get("error")),
+            **{key: sum(s.get(key, 0) for s in stage_spans) for key in _SUMMED_ATTRIBUTES},
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise analysis traces.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    report_parser = subcommands.add_parser("report", help="p50/p95 latency and totals per stage")
+    report_parser.add_argument("--dir", default=TRACE_DIR, help="Directory of trace files")
+    report_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = stage_report(load_spans(args.dir))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    columns = ["count", "p50_ms", "p95_ms", "errors", *_SUMMED_ATTRIBUTES]
+    print(f"{'stage':<18}" + "".join(f"{column:>18}" for column in columns))
+    for stage, row in report.items():
+        print(f"{stage:<18}" + "".join(f"{row[column]:>18}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import logging
+import os
+import re
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def _domains(value: str) -> frozenset[str]:
+    return frozenset(domain.strip().lower() for domain in value.split(",") if domain.strip())
+
+
+# Encyclopedias, social networks, review aggregators, news and video sites rarely describe a competitor first-hand
+TRIAGE_BLOCKLIST = _domains(os.getenv("TRIAGE_BLOCKLIST") or (
+    "wikipedia.org,linkedin.com,g2.com,capterra.com,getapp.com,softwareadvice.com,trustradius.com,"
+    "producthunt.com,crunchbase.com,forbes.com,techcrunch.com,businessinsider.com,medium.com,"
+    "substack.com,reddit.com,quora.com,youtube.com,facebook.com,x.com,twitter.com,instagram.com,"
+    "github.com,apps.apple.com,play.google.com"
+))
+# Domains that are always kept, and ranked first, even if they would otherwise be blocked
+TRIAGE_ALLOWLIST = _domains(os.getenv("TRIAGE_ALLOWLIST", ""))
+
+# Reciprocal-rank fusion damping: a hit at rank r of a result list scores 1 / (_RRF_K + r)
+_RRF_K = 60
+
+# Second-level labels under which a country code TLD registers domains, e.g. example.co.uk
+_SECOND_LEVEL_LABELS = {"co", "com", "net", "org", "gov", "ac", "edu"}
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|msclkid|mc_cid|mc_eid|ref|ref_src|source)$", re.IGNORECASE)
+
+_PRICING_PATH = re.compile(r"/(pricing|plans|price|buy|subscribe)(/|$)", re.IGNORECASE)
+_PRODUCT_PATH = re.compile(r"/(product|products|features|platform|solutions|why-\w+)(/|$)", re.IGNORECASE)
+_CONTENT_PATH = re.compile(
+    r"/(blog|news|press|articles?|posts?|stories|resources|insights|guides?|learn|docs|help|support|"
+    r"careers|jobs|legal|privacy|terms|compare|vs|alternatives?|reviews?|tags?|categor(y|ies))(/|$)",
+    re.IGNORECASE,
+)
+# Listicles and comparison pieces: "top 10 ...", "best ... tools", "X vs Y", "X alternatives"
+_LISTICLE = re.compile(
+    r"\b(top[- ]\d+|best\b.*\b(tools|apps|software|platforms)|vs\.?|versus|alternatives?)\b", re.IGNORECASE
+)
+
+
+def canonicalize_url(url: str) -> str:
+    """normalize_url, also dropping tracking parameters such as utm_* and gclid.
+
+    The host is kept as it is, since it is also the address that gets scraped;
+    www and bare hosts of a site are merged by registered_domain instead.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)])
+    return normalize_url(urlunsplit(parts._replace(query=query)))
+
+
+def registered_domain(url: str) -> str:
+    """The domain a site is registered under, e.g. "example.co.uk" for "https://app.example.co.uk/x"."""
+    labels = (urlsplit(url).hostname or "").lower().rstrip(".").split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def _listed(url: str, domains: frozenset[str]) -> bool:
+    labels = (urlsplit(url).hostname or "").split(".")
+    return any(".".join(labels[i:]) in domains for i in range(len(labels)))
+
+
+def _score(url: str, hit: Dict) -> float:
+    """How likely the URL is a competitor's own homepage or pricing page; higher is better."""
+    path = urlsplit(url).path
+    depth = len([segment for segment in path.split("/") if segment])
+    score = float(hit.get("score") or 0)
+    if depth == 0:
+        score += 3
+    if _PRICING_PATH.search(path):
+        score += 2.5
+    elif _PRODUCT_PATH.search(path):
+        score += 1.5
+    if _CONTENT_PATH.search(path):
+        score -= 3
+    if _LISTICLE.search(f"{path} {hit.get('title', '')}"):
+        score -= 2
+    return score - 0.25 * depth
+
+
+def fuse(result_lists: List[List[Dict]]) -> List[Dict]:
+    """Merge the hits of several searches with reciprocal-rank fusion over registered domains.
+
+    A competitor ranked well by several query variants beats one ranked first
+    by a single query, even when each query surfaced a different page of it.
+    Each distinct URL is kept once, its score replaced by its domain's fused
+    score scaled to 0..1, so triage() can still pick the best page per domain.
+    """
+    domain_scores: Dict[str, float] = {}
+    hits: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            if not hit.get("url"):
+                continue
+            url = canonicalize_url(hit["url"])
+            domain = registered_domain(url)
+            domain_scores[domain] = domain_scores.get(domain, 0) + 1 / (_RRF_K + rank)
+            hits.setdefault(url, hit)
+    if not hits:
+        return []
+    top = max(domain_scores.values())
+    fused = [
+        {**hit, "url": url, "score": domain_scores[registered_domain(url)] / top}
+        for url, hit in hits.items()
+    ]
+    return sorted(fused, key=lambda hit: hit["score"], reverse=True)
+
+
+def triage(search_results: List[Dict], k: int) -> List[str]:
+    """Pick the k search hits most likely to be distinct competitors' own sites.
+
+    URLs are canonicalized, blocklisted domains dropped and the best-scoring
+    page kept per registered domain, so no scrape or prompt token goes to an
+    aggregator, a news article or a second page of the same competitor.
+    """
+    best: Dict[str, tuple[float, str]] = {}
+    blocked = 0
+    for hit in search_results:
+        if not hit.get("url"):
+            continue
+        url = canonicalize_url(hit["url"])
+        domain = registered_domain(url)
+        allowed = _listed(url, TRIAGE_ALLOWLIST)
+        if not allowed and _listed(url, TRIAGE_BLOCKLIST):
+            blocked += 1
+            continue
+        score = _score(url, hit) + (100 if allowed else 0)
+        if domain not in best or score > best[domain][0]:
+            best[domain] = (score, url)
+    ranked = sorted(best.values(), key=lambda entry: entry[0], reverse=True)
+    urls = [url for _, url in ranked[:k]]
+    logger.info(
+        f"Triaged {len(search_results)} search results: {blocked} blocked, "
+        f"{len(best)} distinct domains, kept {len(urls)}"
+    )
+    return urls
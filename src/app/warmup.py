@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict
+
+from constants import AGENT_MODE
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to build everything on the first request instead
+WARMUP = os.getenv("WARMUP", "true").lower() != "false"
+
+
+def _import_report_modules() -> None:
+    import pandas  # noqa: F401
+    import outbox  # noqa: F401
+    import pdf
+
+    pdf._styles()
+
+
+def _build_clients() -> None:
+    from clients import get_firecrawl_client, get_http_client, get_tavily_client
+
+    get_tavily_client()
+    get_firecrawl_client()
+    get_http_client()
+
+
+def _build_graphs(mode: str) -> None:
+    if mode == "pipeline":
+        import pipeline
+
+        pipeline._get_pipeline()
+        pipeline._get_async_pipeline()
+    else:
+        import agent
+
+        agent._get_agent()
+        agent._get_async_agent()
+
+
+def _open_stores() -> None:
+    from cache import get_fetch_cache
+    from fetchers import get_page_fetcher
+    from jobs import get_job_queue
+
+    get_fetch_cache()
+    get_page_fetcher()
+    get_job_queue()
+
+
+def warmup(mode: str = AGENT_MODE) -> Dict[str, float]:
+    """Import and build everything the first analysis needs, returning milliseconds per step.
+
+    A failing step is logged and skipped, so the app still starts and that
+    step is retried lazily on first use.
+    """
+    from constants import LLM_ROLES, get_llm
+
+    steps: Dict[str, Callable[[], object]] = {
+        "llm": lambda: [get_llm(role) for role in LLM_ROLES],
+        "clients": _build_clients,
+        "graphs": lambda: _build_graphs(mode),
+        "stores": _open_stores,
+        "report_modules": _import_report_modules,
+    }
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Warm-up finished in {sum(timings.values()):.0f} ms: {timings}")
+    return timings
+
+
+@lru_cache(maxsize=1)
+def start_background_warmup() -> threading.Thread | None:
+    """Run warmup() once per process on a daemon thread, so the first page renders without waiting for it."""
+    if not WARMUP:
+        return None
+    thread = threading.Thread(target=warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,18 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules, the way Streamlit runs them
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "app"))
+
+# Keep the module-level stores off disk and the background threads off
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.update(
+    FETCH_CACHE_PATH="",
+    RESULT_CACHE_PATH="",
+    TRACE_DIR="",
+    CHECKPOINT_PATH=":memory:",
+    SNAPSHOT_PATH="",
+    ARTIFACT_PATH="",
+    FETCH_STATS_PATH="",
+    WARMUP="false",
+)
@@ -0,0 +1,30 @@
+import pytest
+
+import artifacts
+from artifacts import ArtifactStore
+
+
+def test_handles_are_content_addressed():
+    store = ArtifactStore(":memory:")
+    handle = store.put("scrape", {"url": "https://a.example", "content": "x"})
+    assert handle.startswith("scrape:")
+    assert store.put("scrape", {"content": "x", "url": "https://a.example"}) == handle
+    assert store.resolve([handle, handle]) == [{"url": "https://a.example", "content": "x"}]
+
+
+def test_resolve_raises_only_when_nothing_resolves():
+    store = ArtifactStore(":memory:")
+    handle = store.put("scrape", {"url": "https://a.example"})
+    assert store.resolve([handle, "scrape:unknown"]) == [{"url": "https://a.example"}]
+    with pytest.raises(KeyError):
+        store.resolve(["scrape:unknown"])
+
+
+def test_expired_artifacts_are_purged_by_later_writes(monkeypatch):
+    monkeypatch.setattr(artifacts, "_PURGE_INTERVAL_SECONDS", 0)
+    store = ArtifactStore(":memory:", ttl=60)
+    old = store.put("scrape", {"url": "https://old.example"})
+    store._conn.execute("UPDATE artifacts SET created_at = created_at - 120 WHERE handle = ?", (old,))
+    store.put("scrape", {"url": "https://new.example"})
+    assert store._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone() == (1,)
+    assert store.get(old) is None
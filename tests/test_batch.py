@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import pipeline
+from batch import _Pacer, _completed_ids, _read_inputs, _start_interval, run_batch
+
+
+def test_jsonl_and_csv_inputs_read_the_same(tmp_path):
+    jsonl = tmp_path / "inputs.jsonl"
+    jsonl.write_text(
+        '{"id": "a", "industry": "SaaS", "product_summary": "Invoicing for designers"}\n'
+        "\n"
+        '{"industry": "Fintech", "product_summary": "Expense cards"}\n'
+        '{"industry": "Fintech", "product_summary": ""}\n',
+        encoding="utf-8",
+    )
+    csv = tmp_path / "inputs.csv"
+    csv.write_text(
+        "id,industry,product_summary\n"
+        "a,SaaS,Invoicing for designers\n"
+        ',Fintech,"Expense cards"\n'
+        ",Fintech,\n",
+        encoding="utf-8",
+    )
+    rows = _read_inputs(str(jsonl))
+    assert [(row["industry"], row["product_summary"]) for row in rows] == [
+        ("SaaS", "Invoicing for designers"),
+        ("Fintech", "Expense cards"),
+    ]
+    assert rows[0]["id"] == "a"
+    # Rows without an id get a stable one derived from their inputs
+    assert len(rows[1]["id"]) == 16
+    assert [row["id"] for row in _read_inputs(str(csv))] == [row["id"] for row in rows]
+
+
+def test_only_successful_rows_count_as_done(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        '{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "c", "sta',
+        encoding="utf-8",
+    )
+    assert _completed_ids(str(output)) == {"a"}
+    assert _completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_run_batch_resumes_after_the_rows_already_done(tmp_path, monkeypatch):
+    analysed = []
+
+    async def arun_competitor_analysis(industry, product_summary):
+        analysed.append(industry)
+        if industry == "Broken":
+            raise RuntimeError("search failed")
+        return json.dumps({"industry": industry})
+
+    monkeypatch.setattr(pipeline, "arun_competitor_analysis", arun_competitor_analysis)
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n', encoding="utf-8")
+    rows = [
+        {"id": "a", "industry": "SaaS", "product_summary": "Invoicing"},
+        {"id": "b", "industry": "Fintech", "product_summary": "Expense cards"},
+        {"id": "c", "industry": "Broken", "product_summary": "Anything"},
+    ]
+
+    counts = asyncio.run(run_batch(rows, str(output)))
+    assert counts == {"ok": 1, "error": 1, "skipped": 1}
+    assert sorted(analysed) == ["Broken", "Fintech"]
+    records = {record["id"]: record for record in map(json.loads, output.read_text(encoding="utf-8").splitlines()[2:])}
+    assert records["b"]["analysis"] == {"industry": "Fintech"}
+    assert records["c"]["error"] == "search failed"
+    assert _completed_ids(str(output)) == {"a", "b"}
+
+
+@pytest.mark.parametrize(
+    "mode, analysis_mode, rpm, interval",
+    [
+        # Four Tavily searches per analysis at 60 rpm: one start every 4 seconds
+        ("pipeline", "single", {"groq": 0, "tavily": 60, "firecrawl": 0}, 4.0),
+        # The ReAct agent makes four LLM calls; map-reduce adds one per result
+        ("react", "single", {"groq": 30, "tavily": 0, "firecrawl": 0}, 8.0),
+        ("pipeline", "map_reduce", {"groq": 30, "tavily": 0, "firecrawl": 0}, 12.0),
+        ("pipeline", "single", {"groq": 0, "tavily": 0, "firecrawl": 0}, 0.0),
+    ],
+)
+def test_start_interval_follows_the_tightest_provider(mode, analysis_mode, rpm, interval):
+    assert _start_interval(mode, analysis_mode, 4, 5, rpm) == pytest.approx(interval)
+
+
+def test_pacer_spaces_out_starts():
+    async def starts():
+        pacer = _Pacer(0.05)
+        times = []
+
+        async def start():
+            await pacer.wait()
+            times.append(time.monotonic())
+
+        await asyncio.gather(*(start() for _ in range(3)))
+        return times
+
+    times = asyncio.run(starts())
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:]))
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import FetchCache, normalize_query, normalize_url
+
+
+class FakeFetcher:
+    """Returns canned values and counts how often it was called."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return FetchCache(str(tmp_path / "cache.sqlite3"), ttls={"search": 60, "scrape": 600})
+
+
+def test_get_or_fetch_calls_the_fetcher_once(store):
+    fetcher = FakeFetcher({"urls": ["https://a.com"]})
+    assert store.get_or_fetch("search", "q", fetcher) == {"urls": ["https://a.com"]}
+    assert store.get_or_fetch("search", "q", fetcher) == {"urls": ["https://a.com"]}
+    assert fetcher.calls == 1
+
+
+def test_empty_results_are_not_stored(store):
+    fetcher = FakeFetcher([])
+    store.get_or_fetch("search", "q", fetcher)
+    store.get_or_fetch("search", "q", fetcher)
+    assert fetcher.calls == 2
+
+
+def test_ttl_is_per_namespace(store, clock):
+    store.put("search", "k", "search result")
+    store.put("scrape", "k", "page")
+    clock[0] += 61
+    assert store.get("search", "k") is None
+    assert store.get("scrape", "k") == "page"
+    clock[0] += 540
+    assert store.get("scrape", "k") is None
+
+
+def test_unknown_namespace_expires_immediately(store, clock):
+    store.put("other", "k", "value")
+    clock[0] += 1
+    assert store.get("other", "k") is None
+
+
+def test_namespaces_do_not_share_keys(store):
+    store.put("search", "k", "search result")
+    assert store.get("scrape", "k") is None
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path, clock):
+    store = FetchCache(str(tmp_path / "cache.sqlite3"), max_bytes=10_000, ttls={"scrape": 600})
+    page = "x" * 20_000  # compresses to well under max_bytes
+    size = len(cache.zstandard.ZstdCompressor().compress(f'"{page}a"'.encode()))
+    store.max_bytes = size * 2 + size // 2
+    for key in "abc":
+        clock[0] += 1
+        store.put("scrape", key, page + key)
+    # Evicting happens on put, so the oldest of three went when "c" was stored
+    assert store.get("scrape", "a") is None
+    clock[0] += 1
+    assert store.get("scrape", "b") == page + "b"  # "b" is now the most recently used
+    clock[0] += 1
+    store.put("scrape", "d", page + "d")
+    assert store.get("scrape", "c") is None
+    assert store.get("scrape", "b") == page + "b"
+    assert store.get("scrape", "d") == page + "d"
+
+
+def test_stats_count_hits_and_misses(store):
+    fetcher = FakeFetcher(["result"])
+    store.get_or_fetch("search", "q", fetcher)
+    store.get_or_fetch("search", "q", fetcher)
+    store.get_or_fetch("search", "other", fetcher)
+    stats = store.stats()["search"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+    assert stats["bytes"] > 0
+
+
+def test_aget_or_fetch_caches_the_awaited_value(store):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"markdown": "# Acme"}
+
+    assert asyncio.run(store.aget_or_fetch("scrape", "u", fetch)) == {"markdown": "# Acme"}
+    assert asyncio.run(store.aget_or_fetch("scrape", "u", fetch)) == {"markdown": "# Acme"}
+    assert len(calls) == 1
+
+
+def test_entries_survive_reopening(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    FetchCache(path, ttls={"search": 60}).put("search", "q", ["a"])
+    assert FetchCache(path, ttls={"search": 60}).get("search", "q") == ["a"]
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("HTTPS://Acme.COM/Pricing/", "https://acme.com/Pricing"),
+        ("https://acme.com:443/a#section", "https://acme.com/a"),
+        ("http://acme.com:80/", "http://acme.com"),
+        ("https://acme.com:8443/a?b=1", "https://acme.com:8443/a?b=1"),
+        ("  //acme.com/a  ", "https://acme.com/a"),
+    ],
+)
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_normalize_query_ignores_case_and_whitespace():
+    assert normalize_query("AI  coding", " Fast\tIDE ") == normalize_query("ai coding", "fast ide")
+    assert normalize_query("a", "b c") != normalize_query("a b", "c")
@@ -0,0 +1,77 @@
+import pytest
+
+import pipeline
+import tools
+from checkpoint import NotResumable, get_checkpointer, thread_id_for
+from models import AgentResponse
+from streaming import _example
+
+
+class StandIns:
+    """Stand-ins for the pipeline's search, scrape and analyse steps, recording their calls."""
+
+    def __init__(self, scrapes):
+        self.scrapes = list(scrapes)
+        self.calls = []
+
+    def search(self, industry, product_summary, client):
+        self.calls.append("search")
+        return ["https://acme.com"]
+
+    def scrape(self, urls, client):
+        self.calls.append("scrape")
+        return self.scrapes.pop(0)
+
+    def analyse(self, industry, product_summary, pages):
+        self.calls.append("analyse")
+        return AgentResponse.model_validate(_example(AgentResponse))
+
+
+@pytest.fixture
+def stand_ins(monkeypatch):
+    failed = [{"url": "https://acme.com", "error": "timed out"}]
+    scraped = [{"url": "https://acme.com", "content": "# Acme"}]
+    fakes = StandIns([failed, scraped])
+    monkeypatch.setattr(pipeline, "_search", fakes.search)
+    monkeypatch.setattr(pipeline, "_scrape_many", fakes.scrape)
+    monkeypatch.setattr(pipeline, "_analyse", fakes.analyse)
+    monkeypatch.setattr(pipeline, "get_tavily_client", lambda: None)
+    monkeypatch.setattr(pipeline, "get_firecrawl_client", lambda: None)
+    return fakes
+
+
+def test_run_with_no_scraped_pages_is_not_resumed(stand_ins):
+    with pytest.raises(NotResumable):
+        pipeline.run_competitor_analysis("Retries", "All scrapes fail once")
+    thread_id = thread_id_for("pipeline", "Retries", "All scrapes fail once")
+    assert get_checkpointer().get_tuple({"configurable": {"thread_id": thread_id}}) is None
+
+    result = pipeline.run_competitor_analysis("Retries", "All scrapes fail once")
+
+    assert AgentResponse.model_validate_json(result)
+    # The retry searched and scraped again rather than re-analysing the failed scrape
+    assert stand_ins.calls == ["search", "scrape", "search", "scrape", "analyse"]
+
+
+def test_failed_llm_step_is_resumed(stand_ins, monkeypatch):
+    stand_ins.scrapes = [[{"url": "https://acme.com", "content": "# Acme"}]]
+    analyse = stand_ins.analyse
+
+    def fails_once(*args):
+        if stand_ins.calls.count("analyse") == 0:
+            stand_ins.calls.append("analyse")
+            raise RuntimeError("Failed to analyse competitors: timed out")
+        return analyse(*args)
+
+    monkeypatch.setattr(pipeline, "_analyse", fails_once)
+    with pytest.raises(RuntimeError):
+        pipeline.run_competitor_analysis("Retries", "LLM times out once")
+    pipeline.run_competitor_analysis("Retries", "LLM times out once")
+    assert stand_ins.calls == ["search", "scrape", "analyse", "analyse"]
+
+
+def test_analysing_without_handles_is_not_resumable():
+    with pytest.raises(NotResumable):
+        tools._resolve([])
+    with pytest.raises(NotResumable, match="scrape_competitor_pages"):
+        tools._resolve(["scrape:0000000000000000"])
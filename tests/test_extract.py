@@ -0,0 +1,197 @@
+from pathlib import Path
+
+import pytest
+
+from extract import HTMLToMarkdown, PageExtractor, clean_line, extract_html, extract_markdown
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "Our product catalog includes 40 integrations.",
+        "We design innovative tools for teams.",
+        "Acme builds the fastest catalog in the world for retail teams.",
+        "Sign up to get a dashboard that tracks every deployment and rollback.",
+        "Single sign-on, audit logs and SCIM provisioning for every plan.",
+    ],
+)
+def test_clean_line_keeps_copy_that_mentions_noise_words(line):
+    assert clean_line(line) == line
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "Skip to main content",
+        "© 2024 Acme Inc. All rights reserved.",
+        "Privacy Policy | Terms of Service | Cookie settings",
+        "Sign up for free",
+        "Subscribe to our newsletter",
+        "[Home](/) [Pricing](/pricing) [Docs](/docs)",
+        "![logo](https://acme.com/logo.png)",
+    ],
+)
+def test_clean_line_drops_boilerplate(line):
+    assert clean_line(line) is None
+
+
+def test_clean_line_strips_link_targets_and_urls():
+    assert clean_line("Read the [pricing guide](https://acme.com/pricing) at https://acme.com now") == (
+        "Read the pricing guide at  now"
+    )
+
+
+def test_extract_markdown_keeps_the_opening_description():
+    page = extract_markdown("# Acme\nAcme builds the fastest catalog in the world for retail teams.\n")
+    assert page["title"] == "Acme"
+    assert page["description"] == "Acme builds the fastest catalog in the world for retail teams."
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _headings(content):
+    return [line for line in content.splitlines() if line.startswith("#")]
+
+
+@pytest.fixture
+def markdown():
+    return (FIXTURES / "acme.md").read_text()
+
+
+@pytest.fixture
+def html():
+    return (FIXTURES / "acme.html").read_text()
+
+
+def test_all_sections_kept_when_they_fit(markdown):
+    record = extract_markdown(markdown, max_chars=4000)
+    assert record["title"] == "Acme CRM"
+    assert record["description"].startswith("Acme CRM keeps every deal")
+    assert record["sections"] == ["pricing", "features", "customers"]
+    assert record["prices"] == [
+        "Starter costs $12 per user / month and includes unlimited contacts and deals.",
+        "Growth costs $29 per user / month and adds automations, forecasting and reporting.",
+    ]
+    assert _headings(record["content"]) == [
+        "# Acme CRM", "## Our story", "## Pricing", "## Careers", "## Features", "## Trusted by 2,000 teams"
+    ]
+    # Menus, images, link targets and footer boilerplate are gone
+    assert "Skip to main content" not in record["content"]
+    assert "https://" not in record["content"]
+    assert "rights reserved" not in record["content"]
+    assert "imports from any spreadsheet" in record["content"]
+
+
+def test_best_sections_kept_in_page_order(markdown):
+    # Room for about four sections: the intro, then pricing, features and customers, ahead of story and careers
+    record = extract_markdown(markdown, max_chars=800)
+    assert _headings(record["content"]) == ["# Acme CRM", "## Pricing", "## Features", "## Trusted by 2,000 teams"]
+    assert len(record["content"]) <= 800
+    # Section kinds and prices cover the whole page, not just what was kept
+    assert record["sections"] == ["pricing", "features", "customers"]
+
+
+def test_best_section_is_cut_rather_than_dropped(markdown):
+    record = extract_markdown(markdown, max_chars=100)
+    # Pricing outranks even the opening section
+    assert record["content"].startswith("## Pricing\nStarter costs $12")
+    assert len(record["content"]) == 100
+
+
+def test_weak_sections_evicted_while_streaming():
+    max_chars = 500
+    extractor = PageExtractor(max_chars)
+    extractor.add_line("# Acme CRM")
+    extractor.add_line("Acme CRM keeps every deal, contact and follow-up for small sales teams.")
+    for n in range(50):
+        extractor.add_line(f"## Update {n}")
+        extractor.add_line(f"Release note number {n} describes small fixes to the mobile app and exports.")
+        # Memory stays bounded at about twice max_chars, however long the page gets
+        assert extractor._kept_chars <= 2 * max_chars + 200
+    extractor.add_line("## Pricing")
+    extractor.add_line("Starter costs $12 per user / month with unlimited contacts.")
+    record = extractor.close()
+
+    headings = _headings(record["content"])
+    assert headings[0] == "# Acme CRM"
+    assert headings[-1] == "## Pricing"
+    # Among sections of equal rank the earliest are kept
+    assert headings[1] == "## Update 0"
+    assert len(record["content"]) <= max_chars
+
+
+def test_headings_set_title_and_split_sections():
+    record = extract_markdown(
+        "## Product tour\nA short tour through the product and its main screens for new users.\n"
+        "# Acme CRM\n### Pipelines\nDrag and drop deal stages."
+    )
+    # Only a top-level heading names the page
+    assert record["title"] == "Acme CRM"
+    assert record["description"] == "A short tour through the product and its main screens for new users."
+    assert _headings(record["content"]) == ["## Product tour", "# Acme CRM", "### Pipelines"]
+
+
+def test_html_to_markdown_skips_boilerplate(html):
+    converter = HTMLToMarkdown()
+    converter.feed(html)
+    assert converter.close().splitlines() == [
+        "# Acme CRM",
+        "Acme CRM keeps every deal, contact and follow-up for small sales teams in one place.",
+        "## Pricing",
+        "Plan | Price",
+        "Starter | $12 per user / month",
+        "## Features",
+        "Pipeline boards with drag and drop deal stages",
+        "Email sync and integrations with Slack and Gmail",
+        # An article's own footer is content; the page's header and footer are not
+        "Written by the Acme team for growing sales teams.",
+    ]
+
+
+@pytest.mark.parametrize(
+    "element",
+    [
+        '<div class="cookie-banner"><p>{}</p></div>',
+        '<div id="main_menu"><p>{}</p></div>',
+        '<section class="Sidebar"><p>{}</p></section>',
+        '<div role="navigation"><p>{}</p></div>',
+        "<p hidden>{}</p>",
+        '<p aria-hidden="true">{}</p>',
+        "<nav><p>{}</p></nav>",
+        "<header><p>{}</p></header>",
+        "<footer><p>{}</p></footer>",
+        "<div><footer><p>{}</p></footer></div>",
+    ],
+)
+def test_html_boilerplate_elements_skipped(element):
+    copy = "Copy that should never reach the analysis prompt."
+    record = extract_html(f"<p>Acme CRM keeps every deal in one place for teams.</p>{element.format(copy)}")
+    assert copy not in record["content"]
+
+
+@pytest.mark.parametrize(
+    "element",
+    [
+        '<main class="main-nav-offset"><p>{}</p></main>',
+        '<article class="post footer-note"><p>{}</p></article>',
+        "<main><header><p>{}</p></header></main>",
+        "<article><footer><p>{}</p></footer></article>",
+        '<div class="navigator-hero"><p>{}</p></div>',
+    ],
+)
+def test_html_content_elements_kept(element):
+    copy = "Copy that belongs in the analysis prompt."
+    assert copy in extract_html(element.format(copy))["content"]
+
+
+def test_html_record_uses_head_title_and_description(html):
+    record = extract_html(html)
+    assert record["title"] == "Acme CRM – Pipelines for small sales teams"
+    assert record["description"] == "Acme CRM keeps every deal, contact and follow-up in one place."
+    assert record["sections"] == ["pricing", "features"]
+
+
+def test_html_chunking_does_not_change_the_record(html):
+    chunks = [html[i:i + 7] for i in range(0, len(html), 7)]
+    assert extract_html(chunks) == extract_html(html)
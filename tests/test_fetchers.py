@@ -0,0 +1,201 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+
+import fetchers
+from fetchers import FetchStats, PageFetcher, PageUnavailable
+
+COPY = "Acme CRM keeps every deal, contact and follow-up for small sales teams in one place. "
+PAGE = f"<html><head><title>Acme CRM</title></head><body><main><h1>Acme CRM</h1><p>{COPY * 10}</p></main></body></html>"
+JS_SHELL = '<html><body><div id="root"></div><script src="/app.js"></script></body></html>'
+
+
+class Site:
+    """Stand-in competitor site serving robots.txt and a few pages, recording the paths requested."""
+
+    def __init__(self, robots="User-agent: *\nDisallow: /private\n"):
+        self.robots = robots
+        self.pages = {
+            "/": (200, "text/html; charset=utf-8", PAGE),
+            "/private": (200, "text/html", PAGE),
+            "/report.pdf": (200, "application/pdf", "%PDF-1.4"),
+            "/app": (200, "text/html", JS_SHELL),
+            "/missing": (404, "text/html", "Not found"),
+            "/blocked": (403, "text/html", "Access denied"),
+        }
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        if request.url.path == "/robots.txt":
+            return httpx.Response(200, text=self.robots)
+        status, content_type, body = self.pages[request.url.path]
+        return httpx.Response(status, headers={"content-type": content_type, "etag": '"v1"'}, text=body)
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = Site()
+    transport = httpx.MockTransport(site)
+    monkeypatch.setattr(fetchers, "get_http_client", lambda: httpx.Client(transport=transport))
+    monkeypatch.setattr(fetchers, "get_async_http_client", lambda: httpx.AsyncClient(transport=transport))
+    monkeypatch.setattr(fetchers, "FETCH_HOST_DELAY_SECONDS", 0.0)
+    return site
+
+
+@pytest.fixture
+def fetcher():
+    return PageFetcher("auto", FetchStats(":memory:"))
+
+
+def firecrawl():
+    firecrawl.calls += 1
+    return "# Acme CRM (via Firecrawl)"
+
+
+@pytest.fixture(autouse=True)
+def reset_firecrawl():
+    firecrawl.calls = 0
+
+
+def test_html_page_is_fetched_locally(site, fetcher):
+    attributes, validators = {}, {}
+    markdown = fetcher.fetch("https://acme.com/", 10, firecrawl, attributes, validators)
+    assert markdown.startswith("# Acme CRM\nAcme CRM keeps every deal")
+    assert firecrawl.calls == 0
+    assert attributes == {"backend": "local"}
+    assert validators == {"etag": '"v1"', "last_modified": None}
+    assert fetcher.stats.counts("acme.com", "local") == (1, 0)
+    assert site.requests == ["/robots.txt", "/"]
+
+
+@pytest.mark.parametrize(
+    "path, reason",
+    [
+        ("/app", "probably rendered with JavaScript"),
+        ("/blocked", "HTTP 403"),
+    ],
+)
+def test_pages_the_local_fetcher_cant_render_or_reach_go_to_firecrawl(site, fetcher, path, reason):
+    attributes = {}
+    assert fetcher.fetch(f"https://acme.com{path}", 10, firecrawl, attributes) == "# Acme CRM (via Firecrawl)"
+    assert firecrawl.calls == 1
+    assert attributes["backend"] == "firecrawl"
+    assert reason in attributes["fallback_reason"]
+    assert fetcher.stats.counts("acme.com", "local") == (0, 1)
+    assert fetcher.stats.counts("acme.com", "firecrawl") == (1, 0)
+
+
+@pytest.mark.parametrize(
+    "path, reason",
+    [
+        ("/private", "disallowed by robots.txt"),
+        ("/report.pdf", "not an HTML page (application/pdf)"),
+        ("/missing", "HTTP 404"),
+    ],
+)
+def test_unavailable_pages_fail_without_firecrawl_or_stats(site, fetcher, path, reason):
+    attributes = {}
+    with pytest.raises(PageUnavailable, match=re.escape(reason)):
+        fetcher.fetch(f"https://acme.com{path}", 10, firecrawl, attributes)
+    assert firecrawl.calls == 0
+    assert attributes["unavailable_reason"] == reason
+    # A disallowed or missing page says nothing about how well the domain fetches locally
+    assert fetcher.stats.counts("acme.com", "local") == (0, 0)
+    assert fetcher.stats.counts("acme.com", "firecrawl") == (0, 0)
+
+
+def test_disallowed_page_is_never_requested(site, fetcher):
+    with pytest.raises(PageUnavailable):
+        fetcher.fetch("https://acme.com/private", 10, firecrawl, {})
+    assert site.requests == ["/robots.txt"]
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_unreachable_robots_txt_disallows_everything(site, fetcher, monkeypatch, status):
+    monkeypatch.setattr(Site, "__call__", lambda self, request: httpx.Response(status))
+    with pytest.raises(PageUnavailable, match="disallowed"):
+        fetcher.fetch("https://acme.com/", 10, firecrawl, {})
+    assert firecrawl.calls == 0
+
+
+def test_long_pages_are_cut_at_the_size_cap(site, fetcher, monkeypatch):
+    monkeypatch.setattr(fetchers, "FETCH_MAX_BYTES", 800)
+    site.pages["/"] = (200, "text/html", PAGE.replace("</p>", f"</p><p>{'Needle ' * 200}</p>"))
+    markdown = fetcher.fetch("https://acme.com/", 10, firecrawl, {})
+    assert "Needle" not in markdown
+    assert firecrawl.calls == 0
+
+
+def test_domains_that_keep_failing_locally_go_straight_to_firecrawl(site, fetcher, monkeypatch):
+    monkeypatch.setattr(fetchers, "FETCH_MIN_ATTEMPTS", 2)
+    for _ in range(2):
+        fetcher.fetch("https://acme.com/app", 10, firecrawl, {})
+    site.requests.clear()
+
+    attributes = {}
+    fetcher.fetch("https://acme.com/", 10, firecrawl, attributes)
+    assert site.requests == []
+    assert attributes == {"backend": "firecrawl"}
+    # Other domains are unaffected
+    assert fetcher.stats.prefers_local("globex.com")
+
+
+def test_local_backend_never_falls_back(site):
+    fetcher = PageFetcher("local")
+    with pytest.raises(RuntimeError, match="rendered with JavaScript"):
+        fetcher.fetch("https://acme.com/app", 10, firecrawl, {})
+    assert firecrawl.calls == 0
+
+
+def test_firecrawl_backend_never_fetches_locally(site):
+    PageFetcher("firecrawl").fetch("https://acme.com/", 10, firecrawl, {})
+    assert site.requests == []
+
+
+def test_crawl_delay_longer_than_the_timeout_falls_back_without_waiting(site, fetcher, monkeypatch):
+    site.robots = "User-agent: *\nCrawl-delay: 30\n"
+    slept = []
+    monkeypatch.setattr(fetchers.time, "sleep", slept.append)
+    fetcher.fetch("https://acme.com/", 10, firecrawl, {})
+
+    attributes = {}
+    fetcher.fetch("https://acme.com/", 10, firecrawl, attributes)
+    assert attributes["backend"] == "firecrawl"
+    assert "after the timeout" in attributes["fallback_reason"]
+    assert slept == [0.0]
+    assert site.requests == ["/robots.txt", "/"]
+
+
+def test_wait_for_the_host_counts_against_the_timeout(site, fetcher, monkeypatch):
+    site.robots = "User-agent: *\nCrawl-delay: 4\n"
+    monkeypatch.setattr(fetchers.time, "sleep", lambda seconds: None)
+    fetcher.fetch("https://acme.com/", 10, firecrawl, {})
+    # A four second wait fits a ten second timeout, so the page is still fetched locally
+    attributes = {}
+    fetcher.fetch("https://acme.com/", 10, firecrawl, attributes)
+    assert attributes["backend"] == "local"
+    # The slot after that is eight seconds away, beyond a three second timeout
+    fetcher.fetch("https://acme.com/", 3, firecrawl, attributes)
+    assert attributes["backend"] == "firecrawl"
+
+
+def test_async_fetch_routes_like_fetch(site, fetcher, monkeypatch):
+    monkeypatch.setattr(fetchers, "FETCH_MIN_ATTEMPTS", 1)
+
+    async def afirecrawl():
+        return firecrawl()
+
+    async def fetch(path):
+        attributes = {}
+        markdown = await fetcher.afetch(f"https://acme.com{path}", 10, afirecrawl, attributes)
+        return markdown, attributes["backend"]
+
+    assert asyncio.run(fetch("/"))[1] == "local"
+    with pytest.raises(PageUnavailable):
+        asyncio.run(fetch("/private"))
+    assert asyncio.run(fetch("/app")) == ("# Acme CRM (via Firecrawl)", "firecrawl")
+    # One local success and one failure still meet FETCH_MIN_SUCCESS_RATE
+    assert asyncio.run(fetch("/"))[1] == "local"
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+class Streams:
+    """Stand-in analysis streams that hold each run at its first step until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.runs = []
+
+    def __call__(self, mode):
+        def stream(industry, product_summary):
+            self.runs.append((mode, industry))
+            yield ("step", "🔍 Searching...", "")
+            self.release.wait(5)
+            yield ("result", f"{mode} analysis of {industry}", "")
+
+        return stream
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    streams = Streams()
+    monkeypatch.setattr(jobs, "_stream_for", streams)
+    yield streams
+    streams.release.set()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_identical_requests_join_the_job_in_flight(streams):
+    queue = JobQueue(":memory:")
+    job_id = queue.submit("SaaS", "Invoicing for designers", "react")
+    assert queue.submit(" saas", "invoicing for  designers", "react") == job_id
+    assert queue.submit("SaaS", "Invoicing for designers", "pipeline") != job_id
+
+    streams.release.set()
+    wait_for(lambda: queue.get(job_id)["status"] == "done")
+    assert queue.submit("SaaS", "Invoicing for designers", "react") != job_id
+
+
+def test_reattaching_replays_events_and_follows_the_running_job(streams):
+    queue = JobQueue(":memory:")
+    job_id = queue.submit("SaaS", "Invoicing for designers", "react")
+    wait_for(lambda: queue.events(job_id))
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.events(job_id) == [(1, "step", "🔍 Searching...", "")]
+
+    streams.release.set()
+    wait_for(lambda: queue.get(job_id)["status"] == "done")
+    assert queue.events(job_id, after=1) == [(2, "result", "react analysis of SaaS", "")]
+    assert queue.get(job_id)["result"] == "react analysis of SaaS"
+
+
+def test_failed_runs_record_the_error(monkeypatch):
+    def stream(industry, product_summary):
+        raise RuntimeError("search failed")
+        yield
+
+    monkeypatch.setattr(jobs, "_stream_for", lambda mode: stream)
+    queue = JobQueue(":memory:")
+    job_id = queue.submit("SaaS", "Invoicing for designers", "react")
+    wait_for(lambda: queue.get(job_id)["status"] == "error")
+    assert queue.get(job_id)["error"] == "search failed"
+
+
+def test_interrupted_jobs_restart_from_scratch(streams, tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # A previous process stopped mid-run, leaving a running job with a partial event log
+    previous = JobQueue(path)
+    previous._conn.execute(
+        "INSERT INTO jobs (id, key, mode, industry, product_summary, status, created_at, started_at) "
+        "VALUES ('interrupted', 'key', 'pipeline', 'SaaS', 'Invoicing for designers', 'running', 0, 0)"
+    )
+    previous._conn.execute("INSERT INTO events VALUES ('interrupted', 1, 'step', '📄 Scraping...', '')")
+    previous._conn.commit()
+
+    queue = JobQueue(path)
+    streams.release.set()
+    wait_for(lambda: queue.get("interrupted")["status"] == "done")
+    assert [kind for _, kind, _, _ in queue.events("interrupted")] == ["step", "result"]
+    assert queue.events("interrupted")[0][2] == "🔍 Searching..."
+    assert streams.runs == [("pipeline", "SaaS")]
+
+
+def test_expired_jobs_are_purged_by_later_submissions(streams, monkeypatch):
+    monkeypatch.setattr(jobs, "_PURGE_INTERVAL_SECONDS", 0)
+    streams.release.set()
+    queue = JobQueue(":memory:")
+    old = queue.submit("SaaS", "Invoicing for designers", "react")
+    wait_for(lambda: queue.get(old)["status"] == "done")
+    queue._conn.execute("UPDATE jobs SET finished_at = finished_at - ? WHERE id = ?", (jobs.JOB_RETENTION + 60, old))
+    queue._conn.commit()
+
+    queue.submit("Fintech", "Expense cards for startups", "react")
+    assert queue.get(old) is None
+    assert queue.events(old) == []
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import groq
+import httpx
+import pytest
+from groq.resources.chat.completions import AsyncCompletions, Completions
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+import ratelimit
+from constants import LLM_ROLES, get_llm
+
+PLANNER = LLM_ROLES["planner"]
+
+
+@tool
+def search_competitors(industry: str) -> str:
+    """Find competitor URLs for an industry."""
+    return json.dumps(["https://a.example"])
+
+
+def _reply(messages):
+    if messages[-1]["role"] == "tool":
+        return {"content": "DONE"}
+    call = {"id": "call_1", "type": "function", "function": {"name": "search_competitors", "arguments": '{"industry": "CRM"}'}}
+    return {"content": "", "tool_calls": [call]}
+
+
+_REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+_FAILURES = {
+    "timeout": lambda: groq.APITimeoutError(request=_REQUEST),
+    "429": lambda: groq.RateLimitError("rate limited", response=httpx.Response(429, request=_REQUEST), body=None),
+}
+
+
+class Groq:
+    """Stand-in for the Groq API: the primary planner model fails with `failure`, every other model answers."""
+
+    def __init__(self, failure):
+        self.failure = failure
+        self.calls = []
+
+    def create(self, messages, model, **params):
+        self.calls.append(model)
+        if model == PLANNER["model"]:
+            raise _FAILURES[self.failure]()
+        reply = _reply(messages)
+        return {
+            "id": "test",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", **reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+
+@pytest.fixture(params=sorted(_FAILURES))
+def api(request, monkeypatch):
+    stand_in = Groq(request.param)
+
+    async def acreate(self, messages, model, **params):
+        return stand_in.create(messages, model, **params)
+
+    monkeypatch.setattr(Completions, "create", lambda self, messages, model, **params: stand_in.create(messages, model, **params))
+    monkeypatch.setattr(AsyncCompletions, "create", acreate)
+    # A 429 still pauses the shared bucket; a high rate keeps that pause short
+    monkeypatch.setitem(ratelimit.PROVIDER_LIMITS, "groq", {"rps": 1000, "burst": 10, "concurrency": 8})
+    monkeypatch.setattr(ratelimit, "RETRY_MAX_WAIT_SECONDS", 0.01)
+    get_llm.cache_clear()
+    ratelimit.get_limiter.cache_clear()
+    yield stand_in
+    get_llm.cache_clear()
+    ratelimit.get_limiter.cache_clear()
+
+
+def _question():
+    return {"messages": [HumanMessage(content="Research CRM competitors, then reply DONE.")]}
+
+
+def test_react_agent_falls_back_on_the_first_failure(api):
+    planner = get_llm("planner")
+    agent = create_react_agent(planner, tools=[search_competitors])
+    messages = agent.invoke(_question())["messages"]
+
+    assert [m.type for m in messages] == ["human", "ai", "tool", "ai"]
+    assert messages[-1].content == "DONE"
+    # One attempt at the primary per turn, then straight to the fallback rather than retrying
+    assert api.calls == [PLANNER["model"], PLANNER["fallback"]] * 2
+
+
+def test_async_react_agent_falls_back_on_the_first_failure(api):
+    agent = create_react_agent(get_llm("planner"), tools=[search_competitors])
+    messages = asyncio.run(agent.ainvoke(_question()))["messages"]
+
+    assert messages[-1].content == "DONE"
+    assert api.calls == [PLANNER["model"], PLANNER["fallback"]] * 2
+
+
+def test_failures_are_still_retried_without_a_fallback(api, monkeypatch):
+    monkeypatch.setitem(LLM_ROLES, "planner", {**PLANNER, "fallback": ""})
+    monkeypatch.setattr(ratelimit, "RETRY_MAX_ATTEMPTS", 2)
+    with pytest.raises((groq.APITimeoutError, groq.RateLimitError)):
+        get_llm("planner").invoke("hello")
+    assert api.calls == [PLANNER["model"]] * 2
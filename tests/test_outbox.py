@@ -0,0 +1,90 @@
+import socket
+import time
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import email_sender
+import outbox
+from outbox import Outbox
+
+
+class Handler:
+    """Stand-in SMTP server: rejects recipients listed in `replies` with that reply, once per entry."""
+
+    def __init__(self):
+        self.replies = {}
+        self.delivered = []
+        self.connections = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.connections.add(session.peer)
+        for recipient in envelope.rcpt_tos:
+            if self.replies.get(recipient):
+                return self.replies[recipient].pop(0)
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(controller.port))
+    monkeypatch.setenv("EMAIL_SENDER", "reports@example.com")
+    monkeypatch.delenv("EMAIL_PASSWORD", raising=False)
+    monkeypatch.setattr(email_sender, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(outbox, "OUTBOX_RETRY_BASE_SECONDS", 0.05)
+    yield handler
+    controller.stop()
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def statuses(box, ids):
+    return [box.get(message_id)["status"] for message_id in ids]
+
+
+def test_batch_is_sent_over_one_connection(smtp, tmp_path):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    ids = box.enqueue(b"%PDF-1.4", ["a@example.com", "b@example.com", "c@example.com"], "CRM software")
+    wait_for(lambda: box.pending() == 0)
+    assert statuses(box, ids) == ["sent"] * 3
+    assert sorted(smtp.delivered) == ["a@example.com", "b@example.com", "c@example.com"]
+    assert len(smtp.connections) == 1
+
+
+def test_4xx_is_retried_and_5xx_fails(smtp, tmp_path):
+    smtp.replies = {"busy@example.com": ["451 Try again later"], "gone@example.com": ["550 No such user"]}
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    busy, gone, ok = box.enqueue(b"%PDF-1.4", ["busy@example.com", "gone@example.com", "ok@example.com"], "CRM")
+    wait_for(lambda: box.pending() == 0)
+
+    assert box.get(busy)["status"] == "sent"
+    assert box.get(busy)["attempts"] == 2
+    assert box.get(gone)["status"] == "failed"
+    assert box.get(gone)["attempts"] == 1
+    assert "550" in box.get(gone)["error"]
+    assert box.get(ok)["status"] == "sent"
+
+
+def test_expired_messages_are_purged_while_running(smtp, tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox, "_PURGE_INTERVAL_SECONDS", 0.1)
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    (message_id,) = box.enqueue(b"%PDF-1.4", ["a@example.com"], "CRM software")
+    wait_for(lambda: box.get(message_id)["status"] == "sent")
+    monkeypatch.setattr(outbox, "OUTBOX_RETENTION", 0)
+    wait_for(lambda: box.get(message_id) is None)
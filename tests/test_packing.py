@@ -0,0 +1,87 @@
+import pytest
+
+import packing
+from packing import _fair_shares, _pack_page, count_tokens, pack_competitor_data
+
+
+def page(url, sections, words_per_section=120):
+    body = "\n".join(
+        f"## {heading}\n" + " ".join(f"{heading.lower()}-detail-{n}" for n in range(words_per_section))
+        for heading in sections
+    )
+    return {"url": url, "content": f"# {url}\n{body}"}
+
+
+def packed_pages(prompt_text):
+    # Each block is a "### Competitor n: url" line followed by that page's packed sections
+    return [block.split("\n", 1)[1] for block in prompt_text.split("\n\n")]
+
+
+@pytest.fixture(params=["tiktoken", "estimate"])
+def encoding(request, monkeypatch):
+    if request.param == "estimate":
+        monkeypatch.setattr(packing, "_get_encoding", lambda: None)
+    return request.param
+
+
+def test_packed_pages_fit_the_budget(encoding):
+    pages = [
+        page("https://acme.com", ["Pricing", "Features", "Customers", "Careers"]),
+        page("https://globex.com", ["Platform", "Integrations", "Press"]),
+        page("https://initech.com", ["Plans", "Security", "Blog"]),
+    ]
+    text = pack_competitor_data(pages, "CRM pricing and integrations for agencies", budget=600)
+    packed = packed_pages(text)
+    assert len(packed) == 3
+    assert sum(count_tokens(content) for content in packed) <= 600
+    assert all(content for content in packed)
+
+
+def test_small_pages_leave_their_share_to_the_others(encoding):
+    small = {"url": "https://tiny.com", "content": "# Tiny\nInvoices for agencies."}
+    large = [page("https://acme.com", ["Pricing", "Features", "Customers"]), page("https://globex.com", ["Plans", "Security"])]
+    budget = 900
+    packed = packed_pages(pack_competitor_data([small, *large], "Invoices for agencies", budget=budget))
+    assert packed[0] == small["content"]
+    # The large pages get more than an even third of the budget each, but never more than all of it together
+    assert all(count_tokens(content) > budget // 3 for content in packed[1:])
+    assert sum(count_tokens(content) for content in packed) <= budget
+
+
+@pytest.mark.parametrize(
+    "needs, budget, shares",
+    [
+        ([50, 1000, 1000], 900, [50, 425, 425]),
+        ([50, 60, 1000], 900, [50, 60, 790]),
+        ([100, 100], 900, [100, 100]),
+        ([1000, 1000, 1000], 2, [0, 0, 0]),
+    ],
+)
+def test_fair_shares(needs, budget, shares):
+    assert _fair_shares(needs, budget) == shares
+    assert sum(shares) <= budget
+
+
+def test_the_newlines_joining_sections_count_against_the_share(encoding):
+    sections = [f"Section {n} text" for n in range(12)]
+    for share in range(1, 40):
+        assert count_tokens(_pack_page(sections, set(), share)) <= share
+
+
+def test_token_counts_fall_back_to_an_estimate_without_tiktoken(monkeypatch):
+    def unavailable(name):
+        raise OSError("no network to download cl100k_base")
+
+    packing._get_encoding.cache_clear()
+    monkeypatch.setattr(packing.tiktoken, "get_encoding", unavailable)
+    try:
+        assert packing._get_encoding() is None
+        assert count_tokens("x" * 40) == 10
+        assert packing._truncate_tokens("x" * 40, 3) == "x" * 12
+    finally:
+        packing._get_encoding.cache_clear()
+
+
+def test_pages_with_errors_or_no_content_are_left_out():
+    pages = [{"url": "https://down.com", "error": "timeout"}, {"url": "https://empty.com", "content": ""}]
+    assert pack_competitor_data(pages, "CRM") == "No competitor content available."
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from reportlab.platypus import Paragraph
+
+import pdf
+from models import AgentResponse
+from pdf import _build_matrix_tables, _styles, create_pdf_report, render_pdf, write_pdf_report
+from streaming import _example
+
+ANALYSIS = _example(AgentResponse)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    pdf._pdf_cache.clear()
+    yield
+    pdf._pdf_cache.clear()
+
+
+def test_identical_reports_are_rendered_once(monkeypatch):
+    rendered = []
+    write = pdf.write_pdf_report
+    monkeypatch.setattr(pdf, "write_pdf_report", lambda *args: rendered.append(args) or write(*args))
+
+    first = render_pdf(json.dumps(ANALYSIS), "SaaS", "Invoicing for designers")
+    assert first.startswith(b"%PDF")
+    # The same content as a dict or a model hits the cache
+    assert render_pdf(ANALYSIS, "SaaS", "Invoicing for designers") is first
+    assert create_pdf_report(AgentResponse.model_validate(ANALYSIS), "SaaS", "Invoicing for designers").getvalue() == first
+    assert len(rendered) == 1
+
+    render_pdf(ANALYSIS, "SaaS", "Invoicing for illustrators")
+    assert len(rendered) == 2
+
+
+def test_cache_keeps_only_the_most_recent_reports(monkeypatch):
+    monkeypatch.setattr(pdf, "PDF_CACHE_SIZE", 1)
+    render_pdf(ANALYSIS, "SaaS", "Invoicing for designers")
+    render_pdf(ANALYSIS, "SaaS", "Invoicing for illustrators")
+    assert len(pdf._pdf_cache) == 1
+
+
+def test_bad_json_raises_runtime_error():
+    with pytest.raises(RuntimeError, match="Failed to create PDF report"):
+        render_pdf("{not json", "SaaS", "Invoicing for designers")
+
+
+def test_wide_matrices_are_split_into_tables(monkeypatch):
+    monkeypatch.setattr(pdf, "MATRIX_COLUMNS_PER_TABLE", 2)
+    competitors = ["Acme", "Globex", "Initech", "Umbrella", "Hooli"]
+    matrix = [
+        {"Feature": "Pricing", "Your Product": "$10 < $12", **{name: "✓" for name in competitors}},
+        {"Feature": "Integrations", "Your Product": "✗", **{name: "✗" for name in competitors}},
+    ]
+    tables = _build_matrix_tables(matrix, competitors, _styles())
+    assert [table._cellvalues[0] for table in tables] == [
+        ["Feature", "Your Product", "Acme", "Globex"],
+        ["Feature", "Your Product", "Initech", "Umbrella"],
+        ["Feature", "Your Product", "Hooli"],
+    ]
+    assert all(len(table._cellvalues) == 3 for table in tables)
+
+
+def test_long_matrix_cells_wrap_within_their_column():
+    long_value = "Stripe & Xero <native> integrations, plus QuickBooks, FreshBooks and Wave via Zapier"
+    matrix = [{"Feature": "Integrations", "Your Product": long_value, "Acme": "✓"}]
+    [table] = _build_matrix_tables(matrix, ["Acme"], _styles())
+    feature, ours, acme = table._cellvalues[1]
+    assert (feature, acme) == ("Integrations", "✓")
+    assert isinstance(ours, Paragraph)
+    # Cell text is escaped, not read as paragraph markup
+    assert ours.getPlainText() == long_value
+
+
+def test_write_pdf_report_to_a_path(tmp_path):
+    path = tmp_path / "report.pdf"
+    write_pdf_report(json.dumps(ANALYSIS), "SaaS", "Invoicing for designers", str(path))
+    assert path.read_bytes().startswith(b"%PDF")
+    assert not pdf._pdf_cache
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+import ratelimit
+from ratelimit import ProviderLimiter, TokenBucket, is_throttled
+
+
+class Throttled(Exception):
+    """Stand-in for a provider's 429 error."""
+
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(ratelimit.time, "sleep", slept.append)
+    return slept
+
+
+def test_bucket_allows_a_burst_then_queues(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+
+def test_throttle_pauses_every_caller_and_halves_the_rate(clock):
+    bucket = TokenBucket(rate=4, burst=4)
+    bucket.throttle(retry_after=3)
+    assert bucket.rate == 2
+    # Tokens left in the burst are gone; the next callers wait out the pause, then queue at the new rate
+    assert bucket.reserve() == pytest.approx(3.5)
+    assert bucket.reserve() == pytest.approx(4.0)
+
+
+def test_concurrent_throttles_halve_the_rate_once(clock):
+    bucket = TokenBucket(rate=4, burst=4)
+    for _ in range(5):
+        bucket.throttle()
+    assert bucket.rate == 2
+    clock[0] += 10
+    bucket.throttle()
+    assert bucket.rate == 1
+
+
+def test_rate_has_a_floor_and_recovers_step_by_step(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_RECOVERY_STEP", 0.25)
+    bucket = TokenBucket(rate=8, burst=1)
+    for _ in range(10):
+        clock[0] += 100
+        bucket.throttle()
+    assert bucket.rate == pytest.approx(8 * ratelimit.RATE_MIN_FRACTION)
+    for _ in range(3):
+        bucket.recover()
+    assert bucket.rate == pytest.approx(0.8 + 6)
+    bucket.recover()
+    assert bucket.rate == 8
+
+
+def test_disabled_bucket_ignores_throttling(clock):
+    bucket = TokenBucket(rate=0, burst=1)
+    bucket.throttle(retry_after=5)
+    assert bucket.reserve() == 0.0
+
+
+def test_is_throttled():
+    assert is_throttled(Throttled())
+    assert not is_throttled(type("ServerError", (Exception,), {"status_code": 503})())
+    assert is_throttled(type("RateLimitError", (Exception,), {})())
+    assert not is_throttled(TimeoutError())
+
+
+def test_a_429_slows_down_other_callers(clock, no_sleep):
+    limiter = ProviderLimiter("test", rps=10, burst=10, concurrency=4)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise Throttled(retry_after="2")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert limiter.bucket.rate == pytest.approx(5 + 10 * ratelimit.RATE_RECOVERY_STEP)
+    assert limiter.metrics()["throttles"] == 1
+    # Another caller, not the one that was throttled, still waits for the pause
+    no_sleep.clear()
+    limiter.call(lambda: None)
+    assert no_sleep and no_sleep[0] > 1.5
+
+
+def test_async_call_throttles_the_shared_bucket(clock, monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", no_sleep)
+    limiter = ProviderLimiter("test", rps=10, burst=10, concurrency=4)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Throttled()
+        return "ok"
+
+    assert asyncio.run(limiter.acall(flaky)) == "ok"
+    assert limiter.metrics()["throttles"] == 2
+    assert limiter.bucket.rate < 10
+
+
+def test_retry_for_caps_the_time_spent_retrying(clock, no_sleep, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RETRY_MAX_ATTEMPTS", 4)
+    limiter = ProviderLimiter("test", rps=0, burst=1, concurrency=4)
+    attempts = []
+
+    def slow_timeout():
+        attempts.append(clock[0])
+        clock[0] += 5
+        raise TimeoutError("scrape timed out")
+
+    with pytest.raises(TimeoutError):
+        limiter.call(slow_timeout, retry_for=8)
+    # The second attempt starts within the 8s budget, a third would not
+    assert len(attempts) == 2
+
+    attempts.clear()
+    with pytest.raises(TimeoutError):
+        limiter.call(slow_timeout)
+    assert len(attempts) == 4
@@ -0,0 +1,253 @@
+import asyncio
+import json
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from models import AgentResponse, CompetitorSummary, SynthesisResponse
+from repair import _merge, _paths, _repair_model, arepair, normalise_matrix, repair, salvage
+
+
+def summary(name, url, **overrides):
+    fields = {
+        "name": name,
+        "website_url": url,
+        "company_description": f"{name} builds CRM software.",
+        "key_features": ["Pipelines"],
+        "pricing_model": "Per seat",
+        "target_market": "Small teams",
+        "strengths": ["Simple"],
+        "weaknesses": ["Few integrations"],
+        "unique_value_proposition": "Fast setup",
+        "technology_stack": ["Not specified"],
+        "market_position": "Challenger",
+    }
+    return {**fields, **overrides}
+
+
+STRATEGY = {
+    "market_positioning": "Niche",
+    "competitive_advantages": ["Price"],
+    "areas_of_overlap": ["Pipelines"],
+    "gaps_and_opportunities": ["Agencies"],
+    "recommended_differentiators": ["Approvals"],
+    "go_to_market_strategy": "Communities",
+    "threat_assessment": "Medium",
+    "market_size_insights": "Growing",
+    "next_steps": ["Interview agencies"],
+}
+
+def answer(*summaries, strategy=STRATEGY):
+    return {
+        "competitor_summaries": list(summaries),
+        "comparison_matrix": [{"Feature": "Pipelines", "Acme": "✓"}],
+        "strategic_analysis": strategy,
+    }
+
+
+PROMPT = """
+You are an expert in competitive intelligence.
+
+--------------------
+CONTEXT ON USER'S STARTUP
+--------------------
+Industry: CRM
+Product Summary: A CRM for agencies.
+
+--------------------
+COMPETITOR DATA (MOST RELEVANT SECTIONS OF EACH SCRAPED PAGE)
+--------------------
+### Competitor 1: https://acme.com/
+# Acme CRM
+Starter costs $12 per user / month.
+
+### Competitor 2: https://globex.com/
+# Globex
+Pipelines for enterprise sales teams.
+
+--------------------
+OUTPUT REQUIREMENTS
+--------------------
+Provide structured analysis with competitor summaries, a matrix and a strategy.
+"""
+
+
+class LLM:
+    """Stand-in chat model answering structured-output calls with a fixed reply and recording the prompts."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+        self.schemas = []
+
+    def with_structured_output(self, schema):
+        self.schemas.append(schema)
+        return self
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return self.schemas[-1].model_validate(self.reply)
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+def test_salvage_keeps_valid_fields_and_coerces_near_misses():
+    values, missing = salvage(
+        CompetitorSummary,
+        summary("Acme", "https://acme.com/", key_features="Pipelines", strengths=None, technology_stack=[["x"], "Go"]),
+    )
+    assert values["key_features"] == ["Pipelines"]
+    assert values["technology_stack"] == ["Go"]
+    assert missing == {"strengths": List[str]}
+
+
+def test_salvage_unwraps_a_reply_nested_under_the_schema_name():
+    values, missing = salvage(CompetitorSummary, {"CompetitorSummary": summary("Acme", "https://acme.com/")})
+    assert missing == {}
+    assert values["name"] == "Acme"
+
+
+def test_salvage_reports_nested_fields_and_list_indices():
+    data = {
+        "competitor_summaries": [
+            summary("Acme", "https://acme.com/"),
+            "not an object",
+            summary("Globex", "https://globex.com/", pricing_model={"tiers": 3}, weaknesses=None),
+        ],
+        "comparison_matrix": [{"feature": "Pipelines", "acme": "yes"}],
+        "strategic_analysis": {**STRATEGY, "next_steps": None},
+    }
+    values, missing = salvage(AgentResponse, data)
+    # Items that aren't objects are dropped, so Globex is item 1 of the kept list
+    assert [item["name"] for item in values["competitor_summaries"]] == ["Acme", "Globex"]
+    assert missing == {
+        "competitor_summaries": {1: {"pricing_model": str, "weaknesses": List[str]}},
+        "strategic_analysis": {"next_steps": List[str]},
+    }
+    assert _paths(missing) == [
+        "competitor_summaries[1].pricing_model",
+        "competitor_summaries[1].weaknesses",
+        "strategic_analysis.next_steps",
+    ]
+
+
+def test_salvage_reports_a_whole_field_when_nothing_in_it_is_usable():
+    values, missing = salvage(SynthesisResponse, {"comparison_matrix": [], "strategic_analysis": "n/a"})
+    assert values == {}
+    assert set(missing) == {"comparison_matrix", "strategic_analysis"}
+
+
+def test_repair_model_asks_only_for_the_missing_parts():
+    values, missing = salvage(
+        AgentResponse,
+        answer(
+            summary("Acme", "https://acme.com/"),
+            summary("Globex", "https://globex.com/", weaknesses=None),
+            strategy={**STRATEGY, "next_steps": None},
+        ),
+    )
+    repair_model = _repair_model(AgentResponse, missing, values)
+    assert set(repair_model.model_fields) == {"competitor_summaries_2", "strategic_analysis"}
+    item = repair_model.model_fields["competitor_summaries_2"]
+    assert "Globex" in item.description
+    assert set(item.annotation.model_fields) == {"weaknesses"}
+    assert set(repair_model.model_fields["strategic_analysis"].annotation.model_fields) == {"next_steps"}
+
+
+def test_merge_fills_nested_fields_and_list_items_in_place():
+    values, missing = salvage(
+        AgentResponse,
+        answer(
+            summary("Acme", "https://acme.com/"),
+            summary("Globex", "https://globex.com/", weaknesses=None),
+            strategy={**STRATEGY, "next_steps": None},
+        ),
+    )
+    patch = {"competitor_summaries_2": {"weaknesses": ["Pricey"]}, "strategic_analysis": {"next_steps": ["Ship"]}}
+    _merge(AgentResponse, missing, values, patch)
+    assert values["competitor_summaries"][1]["weaknesses"] == ["Pricey"]
+    assert values["competitor_summaries"][0]["weaknesses"] == ["Few integrations"]
+    assert values["strategic_analysis"]["next_steps"] == ["Ship"]
+    assert AgentResponse.model_validate(values)
+
+
+def test_normalise_matrix_gives_every_row_the_same_columns():
+    rows = [
+        {"feature": "Pipelines", "your_product": "yes", "Competitor 1": True, "Globex": "No"},
+        {"Capability": "Invoicing", "Acme": ["Stripe", "PayPal"]},
+        {"feature": "", "Acme": "✓"},
+        "not a row",
+    ]
+    assert normalise_matrix(rows, ["Acme", "Globex"]) == [
+        {"Feature": "Pipelines", "Your Product": "✓", "Acme": "✓", "Globex": "✗"},
+        {"Feature": "Invoicing", "Your Product": "?", "Acme": "Stripe, PayPal", "Globex": "?"},
+    ]
+
+
+def test_normalise_matrix_takes_the_first_column_as_the_feature():
+    assert normalise_matrix([{"Area": "Pipelines", "Acme": "n/a"}]) == [{"Feature": "Pipelines", "Acme": "?"}]
+
+
+def test_valid_reply_needs_no_follow_up_call():
+    llm = LLM({})
+    data = {**answer(summary("Acme", "https://acme.com/")), "comparison_matrix": [{"feature": "A", "Acme": "yes"}]}
+    result = repair(llm, AgentResponse, PROMPT, data)
+    assert llm.prompts == []
+    assert result.comparison_matrix == [{"Feature": "A", "Acme": "✓"}]
+
+
+def test_repairing_one_competitor_resends_only_its_page():
+    data = answer(summary("Acme", "https://acme.com/"), summary("Globex", "https://globex.com/", weaknesses=None))
+    llm = LLM({"competitor_summaries_2": {"weaknesses": ["Pricey"]}})
+    result = repair(llm, AgentResponse, PROMPT, data)
+
+    assert result.competitor_summaries[1].weaknesses == ["Pricey"]
+    (prompt,) = llm.prompts
+    assert "You are an expert in competitive intelligence." in prompt
+    assert "Product Summary: A CRM for agencies." in prompt
+    assert "### Competitor 2: https://globex.com/" in prompt
+    assert "acme.com" not in prompt
+    assert "OUTPUT REQUIREMENTS" not in prompt
+    # The kept values are the repaired competitor's, not the whole answer
+    assert '"name":"Globex"' in prompt
+    assert "Communities" not in prompt
+
+
+def test_repairing_the_strategy_resends_the_kept_summaries_not_the_pages():
+    data = answer(
+        summary("Acme", "https://acme.com/"),
+        summary("Globex", "https://globex.com/"),
+        strategy={**STRATEGY, "threat_assessment": None},
+    )
+    llm = LLM({"strategic_analysis": {"threat_assessment": "High"}})
+    result = repair(llm, AgentResponse, PROMPT, data)
+
+    assert result.strategic_analysis.threat_assessment == "High"
+    (prompt,) = llm.prompts
+    assert "### Competitor" not in prompt
+    kept = json.loads(prompt.split("kept as they are:\n")[1].split("\n\n")[0])
+    assert [item["name"] for item in kept["competitor_summaries"]] == ["Acme", "Globex"]
+    assert len(prompt) < len(PROMPT) + len(json.dumps(kept))
+
+
+def test_repairing_a_whole_field_resends_the_pages_it_needs():
+    llm = LLM({"competitor_summaries": [summary("Acme", "https://acme.com/"), summary("Globex", "https://globex.com/")]})
+    result = asyncio.run(arepair(llm, AgentResponse, PROMPT, answer()))
+
+    assert [s.name for s in result.competitor_summaries] == ["Acme", "Globex"]
+    (prompt,) = llm.prompts
+    assert "### Competitor 1: https://acme.com/" in prompt
+    assert "### Competitor 2: https://globex.com/" in prompt
+    assert result.comparison_matrix == [{"Feature": "Pipelines", "Acme": "✓"}]
+
+
+def test_prompts_without_sections_are_resent_whole():
+    class Reply(BaseModel):
+        answer: str
+        sources: List[str]
+
+    llm = LLM({"sources": ["acme.com"]})
+    assert repair(llm, Reply, "Answer briefly.", {"answer": "Yes"}).sources == ["acme.com"]
+    assert "Answer briefly." in llm.prompts[0]
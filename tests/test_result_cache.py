@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+
+import constants
+import result_cache
+from models import AgentResponse
+from result_cache import ResultCache, cached_analysis, cached_analysis_stream
+from streaming import _example
+
+RESULT = json.dumps(_example(AgentResponse))
+SUMMARY = "Invoicing software for freelance designers with automatic payment reminders"
+
+
+def test_exact_hit_ignores_case_and_spacing():
+    cache = ResultCache(":memory:")
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    assert cache.lookup("react/single", " saas ", SUMMARY.upper()) == RESULT
+
+
+def test_results_that_are_not_analyses_are_not_stored():
+    cache = ResultCache(":memory:")
+    cache.store("react/single", "SaaS", SUMMARY, "Agent stopped due to iteration limit")
+    assert cache.lookup("react/single", "SaaS", SUMMARY) is None
+
+
+@pytest.mark.parametrize(
+    "summary, hit",
+    [
+        ("Automatic payment reminders and invoicing software for freelance designers", True),
+        ("Project management for construction crews", False),
+    ],
+)
+def test_similar_summaries_hit_only_above_the_threshold(summary, hit):
+    cache = ResultCache(":memory:", similarity=0.85)
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    cache.store("react/single", "SaaS", "Fitness tracking for amateur runners", RESULT)
+    assert (cache.lookup("react/single", "SaaS", summary) == RESULT) is hit
+
+
+def test_similarity_lookup_can_be_disabled():
+    cache = ResultCache(":memory:", similarity=0)
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    assert cache.lookup("react/single", "SaaS", SUMMARY + " today") is None
+
+
+def test_expired_results_are_missed_and_purged(monkeypatch):
+    cache = ResultCache(":memory:", ttl=60)
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    now = result_cache.time.time()
+    monkeypatch.setattr(result_cache.time, "time", lambda: now + 120)
+    assert cache.lookup("react/single", "SaaS", SUMMARY) is None
+    cache.store("react/single", "SaaS", "Fitness tracking for amateur runners", RESULT)
+    assert cache._conn.execute("SELECT COUNT(*) FROM analyses").fetchone() == (1,)
+
+
+@pytest.mark.parametrize(
+    "mode, industry",
+    [("react/single", "Fintech"), ("pipeline/single", "SaaS"), ("react/map_reduce", "SaaS")],
+)
+def test_hits_are_scoped_to_mode_and_industry(mode, industry):
+    cache = ResultCache(":memory:")
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    assert cache.lookup(mode, industry, SUMMARY) is None
+
+
+def test_caches_from_an_older_layout_are_dropped(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    old = result_cache.sqlite3.connect(path)
+    old.execute("CREATE TABLE analyses (digest TEXT PRIMARY KEY, industry TEXT, product_summary TEXT)")
+    old.commit()
+    old.close()
+    cache = ResultCache(path)
+    cache.store("react/single", "SaaS", SUMMARY, RESULT)
+    assert cache.lookup("react/single", "SaaS", SUMMARY) == RESULT
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache(":memory:")
+    monkeypatch.setattr(result_cache, "get_result_cache", lambda: cache)
+    return cache
+
+
+def test_cached_analysis_scopes_by_analysis_mode(cache, monkeypatch):
+    calls = []
+
+    def run(industry, product_summary):
+        calls.append(constants.ANALYSIS_MODE)
+        return RESULT
+
+    run.__module__ = "pipeline"
+    wrapped = cached_analysis(run)
+    assert wrapped("SaaS", SUMMARY) == RESULT
+    assert wrapped("SaaS", SUMMARY) == RESULT
+    monkeypatch.setattr(constants, "ANALYSIS_MODE", "map_reduce")
+    assert wrapped("SaaS", SUMMARY) == RESULT
+    assert calls == ["single", "map_reduce"]
+    assert cache.lookup("pipeline/single", "SaaS", SUMMARY) == RESULT
+
+
+def test_cached_stream_yields_timings_after_the_result(cache):
+    def stream(industry, product_summary):
+        yield ("step", "🔍 Searching...", "")
+        yield ("result", RESULT, "")
+        yield ("timings", "⏱️ Finished in 1.0s", "[]")
+
+    async def astream(industry, product_summary):
+        for item in stream(industry, product_summary):
+            yield item
+
+    async def collect(agen):
+        return [item async for item in agen]
+
+    stream.__module__ = astream.__module__ = "agent"
+    list(cached_analysis_stream(stream)("SaaS", SUMMARY))
+    for items in (
+        list(cached_analysis_stream(stream)("SaaS", SUMMARY)),
+        asyncio.run(collect(cached_analysis_stream(astream)("SaaS", SUMMARY))),
+    ):
+        assert [kind for kind, _, _ in items] == ["step", "result", "timings"]
+        assert items[0][1] == "⚡ Reusing a recent analysis..."
+        assert items[1][1] == RESULT
+        assert json.loads(items[2][2]) == []
@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+import snapshots
+from snapshots import SnapshotStore
+
+
+class Site:
+    """Stand-in competitor site answering conditional HEADs from its current ETag."""
+
+    def __init__(self, etag='"v1"'):
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.headers.get("if-none-match")))
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"etag": self.etag})
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = Site()
+    transport = httpx.MockTransport(site)
+    monkeypatch.setattr(snapshots, "get_http_client", lambda: httpx.Client(transport=transport))
+    monkeypatch.setattr(snapshots, "get_async_http_client", lambda: httpx.AsyncClient(transport=transport))
+    return site
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshots.sqlite3"))
+
+
+def fetcher(markdown, etag=None):
+    calls = []
+
+    def fetch(validators):
+        calls.append(1)
+        if etag:
+            validators["etag"] = etag
+        return markdown
+
+    fetch.calls = calls
+    return fetch
+
+
+def test_first_fetch_skips_the_head_and_keeps_the_fetch_validators(site, store):
+    fetch = fetcher("# Acme", etag='"v1"')
+    assert store.fetch_if_changed("https://acme.com", fetch) == "# Acme"
+    assert site.requests == []
+    assert store.page("https://acme.com")["etag"] == '"v1"'
+
+
+def test_unchanged_page_is_served_from_the_snapshot(site, store):
+    store.fetch_if_changed("https://acme.com", fetcher("# Acme", etag='"v1"'))
+    fetch = fetcher("# Acme again")
+    assert store.fetch_if_changed("https://acme.com", fetch) == "# Acme"
+    assert fetch.calls == []
+    assert site.requests == [("HEAD", '"v1"')]
+
+
+def test_changed_page_is_fetched_and_its_new_validators_stored(site, store):
+    store.fetch_if_changed("https://acme.com", fetcher("# Acme", etag='"v1"'))
+    site.etag = '"v2"'
+    assert store.fetch_if_changed("https://acme.com", fetcher("# Acme v2", etag='"v2"')) == "# Acme v2"
+    assert store.page("https://acme.com") == {"etag": '"v2"', "last_modified": None, "markdown": "# Acme v2"}
+
+
+def test_head_validators_are_kept_when_the_fetch_has_none(site, store):
+    # Firecrawl doesn't expose the page's headers, so the HEAD's are stored instead
+    store.record_page("https://acme.com", "# Acme", {"etag": '"v0"'})
+    store.fetch_if_changed("https://acme.com", fetcher("# Acme v1"))
+    assert store.page("https://acme.com")["etag"] == '"v1"'
+
+
+def test_async_first_fetch_skips_the_head(site, store):
+    async def fetch(validators):
+        validators["last_modified"] = "Wed, 01 Oct 2025 00:00:00 GMT"
+        return "# Acme"
+
+    assert asyncio.run(store.afetch_if_changed("https://acme.com", fetch)) == "# Acme"
+    assert site.requests == []
+    assert store.page("https://acme.com")["last_modified"] == "Wed, 01 Oct 2025 00:00:00 GMT"
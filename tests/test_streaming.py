@@ -0,0 +1,137 @@
+import asyncio
+import json
+from typing import get_origin
+
+import pytest
+
+import streaming
+from models import AgentResponse, CompetitorSummary, StrategicAnalysis
+from streaming import _RESPONSE_FORMAT, _example, astream_analysis, stream_analysis
+
+
+def test_response_example_is_a_valid_agent_response():
+    assert AgentResponse.model_validate(_example(AgentResponse))
+
+
+def test_response_format_is_smaller_than_the_json_schema():
+    assert len(_RESPONSE_FORMAT) < len(json.dumps(AgentResponse.model_json_schema())) / 2
+
+
+def summary(name, **overrides):
+    fields = {key: f"{name} {key}" for key in CompetitorSummary.model_fields}
+    fields.update(name=name, key_features=["Pipelines"], strengths=["Simple"], weaknesses=["Pricey"], technology_stack=[])
+    return {**fields, **overrides}
+
+
+STRATEGY = {
+    field: ["..."] if get_origin(info.annotation) is list else "..."
+    for field, info in StrategicAnalysis.model_fields.items()
+}
+
+
+class Chunk:
+    """Stand-in message chunk."""
+
+    def __init__(self, content):
+        self.content = content
+
+
+class LLM:
+    """Stand-in chat model streaming a reply in small chunks and answering structured-output calls."""
+
+    def __init__(self, reply, structured=None):
+        self.reply = reply
+        self.structured = structured
+        self.chunks_sent = 0
+        self.schemas = []
+
+    def stream(self, prompt):
+        for start in range(0, len(self.reply), 7):
+            self.chunks_sent += 1
+            yield Chunk(self.reply[start:start + 7])
+
+    async def astream(self, prompt):
+        for chunk in self.stream(prompt):
+            yield chunk
+
+    def with_structured_output(self, schema, include_raw=False):
+        self.schemas.append(schema)
+        return self
+
+    def invoke(self, prompt):
+        parsed = self.schemas[-1].model_validate(self.structured.pop(0))
+        return {"parsed": parsed, "raw": None, "parsing_error": None} if self.schemas[-1] is AgentResponse else parsed
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+    monkeypatch.setattr(streaming, "emit", events.append)
+    return events
+
+
+def run(llm, use_async):
+    if use_async:
+        return asyncio.run(astream_analysis(llm, "Analyse the competitors."))
+    return stream_analysis(llm, "Analyse the competitors.")
+
+
+def reply(*summaries, strategy=STRATEGY):
+    data = {
+        "competitor_summaries": list(summaries),
+        "comparison_matrix": [{"Feature": "Pipelines", "Your Product": "✓", "Acme": "✓"}],
+        "strategic_analysis": strategy,
+    }
+    return "Here is the analysis:\n```json\n" + json.dumps(data) + "\n```"
+
+
+def labels(events):
+    return [event["competitor"]["name"] if "competitor" in event else next(iter(event["strategic"])) for event in events]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_parts_are_emitted_in_order_once_each_as_they_complete(events, monkeypatch, use_async):
+    llm = LLM(reply(summary("Acme"), summary("Globex")))
+    sent_at = []
+    monkeypatch.setattr(streaming, "emit", lambda event: (events.append(event), sent_at.append(llm.chunks_sent)))
+
+    analysis = run(llm, use_async)
+    assert [c.name for c in analysis.competitor_summaries] == ["Acme", "Globex"]
+    assert labels(events) == ["Acme", "Globex", *STRATEGY]
+    assert events[0]["competitor"] == summary("Acme")
+    # The first competitor is shown while the rest of the reply is still streaming
+    assert sent_at[0] < sent_at[1] < llm.chunks_sent
+    assert llm.schemas == []
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_invalid_parts_are_held_back_until_repaired(events, use_async):
+    broken = reply(summary("Acme"), summary("Globex", weaknesses=None), strategy={**STRATEGY, "areas_of_overlap": None})
+    patch = {
+        "competitor_summaries_2": {"weaknesses": ["Few integrations"]},
+        "strategic_analysis": {"areas_of_overlap": ["Pipelines"]},
+    }
+    llm = LLM(broken, structured=[patch])
+
+    analysis = run(llm, use_async)
+    assert len(llm.schemas) == 1
+    assert analysis.competitor_summaries[1].weaknesses == ["Few integrations"]
+    streamed = [field for field in STRATEGY if field not in ("areas_of_overlap", "next_steps")]
+    assert labels(events) == ["Acme", *streamed, "Globex", "areas_of_overlap", "next_steps"]
+    assert events[-2] == {"strategic": {"areas_of_overlap": ["Pipelines"]}}
+    globex = next(event["competitor"] for event in events if event.get("competitor", {}).get("name") == "Globex")
+    assert globex["weaknesses"] == ["Few integrations"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_reply_without_json_falls_back_to_structured_output(events, use_async):
+    complete = json.loads(reply(summary("Acme")).split("```json\n")[1].rstrip("`\n"))
+    llm = LLM("Sorry, I can't format that as JSON.", structured=[complete])
+
+    analysis = run(llm, use_async)
+    assert llm.schemas == [AgentResponse]
+    assert analysis.competitor_summaries[0].name == "Acme"
+    assert labels(events) == ["Acme", *STRATEGY]
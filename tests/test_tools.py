@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import tools
+
+QUERIES = tools._search_queries("CRM", "A CRM for agencies")[:3]
+
+
+class Searches:
+    """Stand-in Tavily searches answering each query with one hit, after `delays[query]` seconds."""
+
+    def __init__(self, delays, errors=()):
+        self.delays = delays
+        self.errors = set(errors)
+        self.release = threading.Event()
+
+    def hits(self, query):
+        if query in self.errors:
+            raise RuntimeError("rate limited")
+        return [{"url": f"https://competitor-{QUERIES.index(query)}.com/", "score": 0.5}]
+
+    def search_one(self, query, client):
+        self.release.wait(self.delays.get(query, 0))
+        return self.hits(query)
+
+    async def asearch_one(self, query):
+        await asyncio.sleep(self.delays.get(query, 0))
+        return self.hits(query)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    monkeypatch.setattr(tools, "SEARCH_QUERIES", len(QUERIES))
+    monkeypatch.setattr(tools, "SEARCH_BUDGET_SECONDS", 0.2)
+    monkeypatch.setattr(tools, "MAX_SEARCH_RESULTS", 5)
+    installed = []
+
+    def install(delays, errors=()):
+        searches = Searches(delays, errors)
+        monkeypatch.setattr(tools, "_search_one", searches.search_one)
+        monkeypatch.setattr(tools, "_asearch_one", searches.asearch_one)
+        installed.append(searches)
+
+    yield install
+    # Let the threads of searches dropped at the deadline finish
+    for searches in installed:
+        searches.release.set()
+
+
+def run_search(use_async):
+    if use_async:
+        return asyncio.run(tools._asearch("CRM", "A CRM for agencies"))
+    return tools._search("CRM", "A CRM for agencies", client=None)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_queries_past_the_budget_are_dropped(searches, use_async):
+    searches({QUERIES[1]: 5})
+    started = time.monotonic()
+    urls = run_search(use_async)
+    assert time.monotonic() - started < 1
+    assert sorted(urls) == ["https://competitor-0.com", "https://competitor-2.com"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_variants_are_skipped(searches, use_async):
+    searches({}, errors=[QUERIES[2]])
+    assert sorted(run_search(use_async)) == ["https://competitor-0.com", "https://competitor-1.com"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_primary_query_is_awaited_when_nothing_answers_in_time(searches, use_async):
+    searches({QUERIES[0]: 0.4, QUERIES[1]: 5, QUERIES[2]: 5})
+    assert run_search(use_async) == ["https://competitor-0.com"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_primary_query_error_is_raised_when_nothing_else_answered(searches, use_async):
+    searches({QUERIES[1]: 5, QUERIES[2]: 5}, errors=[QUERIES[0]])
+    with pytest.raises(RuntimeError, match="rate limited"):
+        run_search(use_async)
@@ -0,0 +1,139 @@
+import json
+import sys
+
+import pytest
+
+import tracing
+from tracing import load_spans, record_retry, record_usage, span, stage_report, start_trace, traced_analysis
+
+
+class Message:
+    """Stand-in chat message carrying token usage."""
+
+    usage_metadata = {"input_tokens": 120, "output_tokens": 30}
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def record_trace():
+    with start_trace("pipeline", industry="CRM") as trace:
+        with span("search", "crm competitors", cache_hit=False) as attributes:
+            attributes["bytes"] = 2048
+        with span("scrape", "https://acme.com"):
+            with span("llm:scrape", "llama-3.1-8b-instant") as attributes:
+                record_usage(attributes, Message())
+                record_retry()
+        with pytest.raises(TimeoutError):
+            with span("scrape", "https://globex.com"):
+                raise TimeoutError("page took too long")
+    return trace
+
+
+def test_traces_are_written_as_otlp_json(trace_dir):
+    trace = record_trace()
+    [path] = trace_dir.iterdir()
+    assert path.name == f"{trace.trace_id}.json"
+
+    [resource] = json.loads(path.read_text(encoding="utf-8"))["resourceSpans"]
+    assert resource["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "competitor-analyser"}}]
+    [scope] = resource["scopeSpans"]
+    assert scope["scope"] == {"name": "competitor-analyser"}
+    spans = {s["name"]: s for s in scope["spans"]}
+    assert set(spans) == {
+        "analysis pipeline",
+        "search crm competitors",
+        "scrape https://acme.com",
+        "llm:scrape llama-3.1-8b-instant",
+        "scrape https://globex.com",
+    }
+
+    root = spans["analysis pipeline"]
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert "parentSpanId" not in root
+    assert all(s["traceId"] == root["traceId"] for s in spans.values())
+    assert spans["search crm competitors"]["parentSpanId"] == root["spanId"]
+    assert spans["llm:scrape llama-3.1-8b-instant"]["parentSpanId"] == spans["scrape https://acme.com"]["spanId"]
+    for s in spans.values():
+        assert int(s["endTimeUnixNano"]) >= int(s["startTimeUnixNano"])
+
+    llm = {a["key"]: a["value"] for a in spans["llm:scrape llama-3.1-8b-instant"]["attributes"]}
+    assert llm == {
+        "stage": {"stringValue": "llm:scrape"},
+        "prompt_tokens": {"intValue": "120"},
+        "completion_tokens": {"intValue": "30"},
+        "retries": {"intValue": "1"},
+    }
+    search = {a["key"]: a["value"] for a in spans["search crm competitors"]["attributes"]}
+    assert search["cache_hit"] == {"boolValue": False}
+    assert spans["scrape https://globex.com"]["status"] == {"code": 2, "message": "TimeoutError: page took too long"}
+    assert root["status"] == {"code": 1}
+
+
+def test_spans_outside_a_trace_are_not_recorded(trace_dir):
+    with span("search", "crm", cache_hit=True) as attributes:
+        record_retry()
+    assert attributes == {"cache_hit": True}
+    assert list(trace_dir.iterdir()) == []
+
+
+def test_load_spans_reads_back_what_was_written(trace_dir):
+    record_trace()
+    (trace_dir / "notes.txt").write_text("not a trace", encoding="utf-8")
+    spans = load_spans(str(trace_dir))
+    assert sorted(s["stage"] for s in spans) == ["analysis", "llm:scrape", "scrape", "scrape", "search"]
+    scrapes = [s for s in spans if s["stage"] == "scrape"]
+    assert sorted(s["error"] for s in scrapes) == [False, True]
+    llm = next(s for s in spans if s["stage"] == "llm:scrape")
+    assert (llm["prompt_tokens"], llm["completion_tokens"], llm["retries"]) == (120, 30, 1)
+
+
+def test_stage_report_percentiles_and_totals():
+    spans = [{"stage": "scrape", "duration_ms": float(ms), "bytes": 10, "error": ms > 98} for ms in range(1, 101)]
+    spans.append({"stage": "search", "duration_ms": 7.0, "retries": 2})
+    report = stage_report(spans)
+    assert report["scrape"] == {
+        "count": 100,
+        "p50_ms": 50.0,
+        "p95_ms": 95.0,
+        "errors": 2,
+        "bytes": 1000,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "retries": 0,
+    }
+    assert (report["search"]["p50_ms"], report["search"]["p95_ms"], report["search"]["retries"]) == (7.0, 7.0, 2)
+
+
+def test_report_cli(trace_dir, monkeypatch, capsys):
+    record_trace()
+    monkeypatch.setattr(sys, "argv", ["tracing.py", "report", "--dir", str(trace_dir), "--json"])
+    tracing.main()
+    report = json.loads(capsys.readouterr().out)
+    assert report == stage_report(load_spans(str(trace_dir)))
+    assert report["scrape"]["count"] == 2
+
+    monkeypatch.setattr(sys, "argv", ["tracing.py", "report", "--dir", str(trace_dir)])
+    tracing.main()
+    header, *rows = capsys.readouterr().out.splitlines()
+    assert header.split() == [
+        "stage", "count", "p50_ms", "p95_ms", "errors", "bytes", "prompt_tokens", "completion_tokens", "retries",
+    ]
+    assert [row.split()[0] for row in rows] == ["analysis", "llm:scrape", "scrape", "search"]
+
+
+def test_traced_streams_end_with_their_timings(trace_dir):
+    @traced_analysis
+    def stream(industry, product_summary):
+        with span("search", "crm"):
+            yield ("step", "🔍 Searching...", "")
+        yield ("result", "{}", "")
+
+    *items, (kind, label, detail) = stream("CRM", "A CRM for agencies")
+    assert [item[0] for item in items] == ["step", "result"]
+    assert kind == "timings" and label.startswith("⏱️ Finished in")
+    assert [row["stage"] for row in json.loads(detail)] == ["search"]
+    assert len(list(trace_dir.iterdir())) == 1
@@ -0,0 +1,111 @@
+import pytest
+
+import triage as triage_module
+from triage import _score, canonicalize_url, fuse, registered_domain, triage
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.acme.com/pricing",
+        "https://www.acme.com/pricing/",
+        "HTTPS://WWW.Acme.com:443/pricing#plans",
+        "https://www.acme.com/pricing?utm_source=google&utm_medium=cpc&gclid=abc",
+        "https://www.acme.com/pricing/?ref=producthunt",
+    ],
+)
+def test_variants_of_a_url_canonicalize_to_one(url):
+    assert canonicalize_url(url) == "https://www.acme.com/pricing"
+
+
+def test_www_and_bare_hosts_count_as_one_competitor():
+    # The host is what gets scraped, so it is kept; the registered domain merges the two
+    hits = [{"url": "https://www.acme.com/?utm_source=x", "score": 0.5}, {"url": "https://acme.com/", "score": 0.4}]
+    assert canonicalize_url(hits[0]["url"]) == "https://www.acme.com"
+    assert triage(hits, k=5) == ["https://www.acme.com"]
+
+
+def test_canonicalize_keeps_meaningful_query_parameters():
+    assert canonicalize_url("https://acme.com/plans?tier=team&utm_campaign=x") == "https://acme.com/plans?tier=team"
+
+
+@pytest.mark.parametrize(
+    "url, domain",
+    [
+        ("https://acme.com/", "acme.com"),
+        ("https://app.eu.acme.com/login", "acme.com"),
+        ("https://app.acme.co.uk/x", "acme.co.uk"),
+        ("https://shop.acme.com.au", "acme.com.au"),
+        ("https://acme.io", "acme.io"),
+        # Only known second-level labels under a country code count as part of the suffix
+        ("https://acme.studio.uk", "studio.uk"),
+    ],
+)
+def test_registered_domain(url, domain):
+    assert registered_domain(url) == domain
+
+
+def test_homepages_and_pricing_outrank_content_pages():
+    homepage = _score("https://acme.com", {})
+    pricing = _score("https://acme.com/pricing", {})
+    features = _score("https://acme.com/features", {})
+    blog = _score("https://acme.com/blog/launch", {})
+    listicle = _score("https://acme.com/top-10-crm-tools", {"title": "Top 10 CRM tools for 2026"})
+    assert homepage > pricing > features > blog
+    assert listicle < features
+
+
+def test_triage_keeps_the_best_page_per_domain_and_drops_aggregators():
+    hits = [
+        {"url": "https://www.g2.com/categories/crm", "score": 0.9},
+        {"url": "https://acme.com/blog/launch?utm_source=x", "score": 0.9},
+        {"url": "https://www.acme.com/pricing", "score": 0.5},
+        {"url": "https://en.wikipedia.org/wiki/CRM", "score": 0.9},
+        {"url": "https://globex.co.uk/", "score": 0.2},
+        {"url": "https://app.globex.co.uk/features", "score": 0.2},
+        {"url": ""},
+    ]
+    assert triage(hits, k=5) == ["https://globex.co.uk", "https://www.acme.com/pricing"]
+    assert triage(hits, k=1) == ["https://globex.co.uk"]
+
+
+def test_allowlisted_domains_beat_the_blocklist_and_rank_first(monkeypatch):
+    monkeypatch.setattr(triage_module, "TRIAGE_ALLOWLIST", frozenset({"github.com"}))
+    hits = [
+        {"url": "https://acme.com/", "score": 1.0},
+        {"url": "https://github.com/acme/acme", "score": 0.1},
+        {"url": "https://www.linkedin.com/company/acme", "score": 1.0},
+    ]
+    assert triage(hits, k=5) == ["https://github.com/acme/acme", "https://acme.com"]
+
+
+def test_blocklist_matches_subdomains_only_on_label_boundaries(monkeypatch):
+    monkeypatch.setattr(triage_module, "TRIAGE_BLOCKLIST", frozenset({"x.com"}))
+    hits = [{"url": "https://blog.x.com/post"}, {"url": "https://box.com/"}]
+    assert triage(hits, k=5) == ["https://box.com"]
+
+
+def test_fuse_ranks_domains_found_by_several_queries_first():
+    results = [
+        [{"url": "https://solo.com/"}, {"url": "https://acme.com/"}, {"url": "https://globex.com/"}],
+        [{"url": "https://acme.com/pricing"}, {"url": "https://globex.com/"}],
+        [{"url": "https://globex.com/?utm_source=x"}, {"url": "https://acme.com/features"}],
+    ]
+    fused = fuse(results)
+    # Each distinct canonical URL is kept once, with its domain's fused score
+    assert [hit["url"] for hit in fused] == [
+        "https://acme.com",
+        "https://acme.com/pricing",
+        "https://acme.com/features",
+        "https://globex.com",
+        "https://solo.com",
+    ]
+    scores = {hit["url"]: hit["score"] for hit in fused}
+    assert scores["https://acme.com"] == scores["https://acme.com/features"] == 1.0
+    # Ranked first by one query, a domain still loses to one every query found
+    assert scores["https://acme.com"] > scores["https://globex.com"] > scores["https://solo.com"]
+    assert scores["https://solo.com"] == pytest.approx((1 / 61) / (1 / 62 + 1 / 61 + 1 / 62))
+
+
+def test_fuse_skips_hits_without_urls():
+    assert fuse([[{"url": ""}], []]) == []